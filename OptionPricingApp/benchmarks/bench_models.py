@@ -0,0 +1,290 @@
+"""
+Benchmark harness for the pricing models (and the workloads behind the Visualizations page).
+
+Usage (from the OptionPricingApp folder):
+python benchmarks/bench_models.py                                   -> run everything and print a table
+python benchmarks/bench_models.py --save benchmarks/baseline.json   -> also save the results as a JSON baseline
+python benchmarks/bench_models.py --compare benchmarks/baseline.json --threshold 0.2
+                                                                    -> flag anything more than 20% slower than the baseline
+python benchmarks/bench_models.py --filter binomial                 -> only run benchmarks whose name contains "binomial"
+
+Every benchmark is timed with timeit: one warm up call, then --repeat rounds of as many calls as fit in ~0.1 seconds.
+We report the best and the median time per call (the median is what gets compared, it is less noisy than the mean).
+Compare mode exits with status 1 if anything regressed, so it can be used as a check before merging an optimization.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import timeit
+from functools import lru_cache
+
+import numpy as np
+
+# Enable Python to find the models package (OptionPricingApp) no matter where this script is run from
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.black_scholes import call_price, put_price, greeks, batch_price
+from models.binomial import binomial_price, binomial_greeks, binomial_price_batch, binomial_american
+from models.finite_difference import fd_greeks
+from models.curves import discount_curve, DividendSchedule
+from models.profiling import Profiler
+from models.surface import VolSurface
+from models.refine import refine_grid
+from models.hedging import simulate_paths, hedge_backtest
+from models.store import ResultStore
+from models.exotics import exotic_price, Vanilla, Barrier
+from models.chain import price_chain
+
+# Same parameters as the default sliders on the pages
+S, K, r, T, sigma = 100.0, 100.0, 0.01, 1.0, 0.2
+BINOMIAL_STEPS = [100, 500, 1000, 5000]
+
+
+def _heatmap_scalar():
+    # The original 100x100 double loop from the Visualizations page
+    prices = np.zeros((100, 100))
+    for i, s in enumerate(np.linspace(sigma * 0.5, sigma * 1.5, 100)):
+        for j, k in enumerate(np.linspace(K * 0.5, K * 1.5, 100)):
+            prices[i, j] = call_price(S, k, r, T, s)
+    return prices
+
+def _heatmap_batch():
+    K_values = np.linspace(K * 0.5, K * 1.5, 100)
+    sigma_values = np.linspace(sigma * 0.5, sigma * 1.5, 100)
+    return batch_price(S, K_values[np.newaxis, :], r, T, sigma_values[:, np.newaxis])["price"]
+
+def _heatmap_refined():
+    # The progressive heatmap from the Visualizations page (17x17 coarse grid refined to 129x129 around the strike)
+    def price(K_values, sigma_values):
+        return batch_price(S, K_values, r, T, sigma_values, "Call", dtype = "float32")["price"]
+    return refine_grid(price, (K * 0.5, K * 1.5), (sigma * 0.5, sigma * 1.5))["values"]
+
+def _surface_1000x1000(dtype, out = None):
+    K_values = np.linspace(K * 0.5, K * 1.5, 1000)
+    sigma_values = np.linspace(sigma * 0.5, sigma * 1.5, 1000)
+    return batch_price(S, K_values[np.newaxis, :], r, T, sigma_values[:, np.newaxis], dtype = dtype, out = out)["price"]
+
+def _greeks_curve_scalar():
+    return [greeks(s, K, r, T, sigma) for s in np.linspace(0.5 * K, 1.5 * K, 200)]
+
+def _greeks_curve_batch():
+    return batch_price(np.linspace(0.5 * K, 1.5 * K, 200), K, r, T, sigma)
+
+def _greeks_curve_american_binomial():
+    return binomial_greeks(np.linspace(0.5 * K, 1.5 * K, 200), K, r, T, sigma, 200, "Put", american = True)
+
+def _greeks_curve_american_fd():
+    return fd_greeks(np.linspace(0.5 * K, 1.5 * K, 200), K, r, T, sigma, "Put", american = True)
+
+def _binomial_american_profiled():
+    # Same as binomial_price_american_1000 but with profiling on (the difference is the cost of the instrumentation)
+    with Profiler():
+        return binomial_price(S, K, r, T, sigma, 1000, "Put", True)
+
+def _expiry_ladder_curve():
+    # A chain of 8 expiries x 250 strikes on a rate curve with quarterly dividends (one discount factor per expiry)
+    curve = discount_curve([0.25, 0.5, 1.0, 2.0], [0.03, 0.035, 0.04, 0.045])
+    dividends = DividendSchedule([0.2, 0.45, 0.7, 0.95, 1.2, 1.45, 1.7, 1.95], [0.5] * 8)
+    expiries = np.repeat(np.linspace(0.25, 2.0, 8), 250)
+    strikes = np.tile(np.linspace(0.5 * K, 1.5 * K, 250), 8)
+    return batch_price(S, strikes, curve, expiries, sigma, "Call", 0.0, dividends)
+
+def _vol_quotes(shift = 0.0):
+    # Sample smiles for 5 expiries x 17 strikes (like the Volatility Surface chart on the Visualizations page)
+    strikes = np.linspace(0.6 * S, 1.4 * S, 17)
+    quotes = {}
+    for t in [0.1, 0.25, 0.5, 1.0, 2.0]:
+        k = np.log(strikes / (S * np.exp(r * t)))
+        quotes[t] = (strikes, np.maximum(sigma + shift - 0.15 * k + 0.3 * k ** 2, 0.01))
+    return quotes
+
+def _vol_surface_fit():
+    return VolSurface(S, r).update(_vol_quotes())
+
+def _vol_surface_refresh(surface, quotes):
+    # An intraday refresh: one expiry's quotes moved, the other 4 slices are kept
+    return surface.update(quotes)
+
+def _vol_surface_ladder(surface):
+    expiries = np.repeat(np.linspace(0.25, 2.0, 8), 250)
+    strikes = np.tile(np.linspace(0.6 * S, 1.4 * S, 250), 8)
+    return batch_price(S, strikes, r, expiries, surface)
+
+# Fixtures shared by several benchmarks, built the first time one of those benchmarks runs (so --filter only pays for
+# the fixtures of what it actually runs)
+@lru_cache(maxsize = None)
+def _daily_paths():
+    return simulate_paths(S, r, T, sigma, 5000, 252, seed = 1)
+
+@lru_cache(maxsize = None)
+def _stored_american():
+    # The on-disk result store with an American price + exercise boundary already in it
+    store = ResultStore(os.path.join(tempfile.gettempdir(), "option_pricer_bench_store"))
+    store_key = store.key("binomial_american", (S, K, r, T, sigma, 2000, "Put"))
+    store.put(store_key, binomial_american(S, K, r, T, sigma, 2000, "Put"))
+    return store, store_key
+
+@lru_cache(maxsize = None)
+def _fitted_surface():
+    surface = VolSurface(S, r)
+    surface.update(_vol_quotes())
+    return surface
+
+# A benchmark with a fixture: make() builds it (when the benchmark runs, not when the list is built) and returns the
+# function to time
+class _Setup:
+    def __init__(self, make):
+        self.make = make
+
+# Name -> function with no arguments (or a _Setup that returns one)
+def build_benchmarks():
+    benchmarks = {
+        "call_price": lambda: call_price(S, K, r, T, sigma),
+        "put_price": lambda: put_price(S, K, r, T, sigma),
+        "greeks": lambda: greeks(S, K, r, T, sigma),
+    }
+    for steps in BINOMIAL_STEPS:
+        benchmarks[f"binomial_price_european_{steps}"] = lambda steps = steps: binomial_price(S, K, r, T, sigma, steps, "Put", False)
+        benchmarks[f"binomial_price_american_{steps}"] = lambda steps = steps: binomial_price(S, K, r, T, sigma, steps, "Put", True)
+    benchmarks["binomial_price_american_1000_profiled"] = _binomial_american_profiled
+    benchmarks["heatmap_100x100_scalar"] = _heatmap_scalar
+    benchmarks["heatmap_100x100_batch"] = _heatmap_batch
+    benchmarks["heatmap_129x129_refined"] = _heatmap_refined
+    benchmarks["surface_1000x1000_float64"] = lambda: _surface_1000x1000("float64")
+    # Same surface in float32, writing into the same buffers every time (like redrawing a chart)
+    def float32_out():
+        buffers = {name: np.empty((1000, 1000), dtype = np.float32) for name in ["price", "delta", "gamma", "vega", "theta", "rho"]}
+        return lambda: _surface_1000x1000("float32", buffers)
+    benchmarks["surface_1000x1000_float32_out"] = _Setup(float32_out)
+    chain = np.linspace(0.8 * S, 1.2 * S, 200)
+    benchmarks["binomial_batch_200x1000_amer_float64"] = lambda: binomial_price_batch(chain, K, r, T, sigma, 1000, "Put", True)
+    benchmarks["binomial_batch_200x1000_amer_float32"] = lambda: binomial_price_batch(
+        chain, K, r, T, sigma, 1000, "Put", True, dtype = "float32"
+    )
+    benchmarks["greeks_curve_200_scalar"] = _greeks_curve_scalar
+    benchmarks["greeks_curve_200_batch"] = _greeks_curve_batch
+    benchmarks["greeks_curve_200_american_binomial"] = _greeks_curve_american_binomial
+    benchmarks["greeks_curve_200_american_fd"] = _greeks_curve_american_fd
+    benchmarks["expiry_ladder_2000_curve_dividends"] = _expiry_ladder_curve
+    # Delta-hedging backtests (paths simulated once, the timing is the hedge itself)
+    def hedge_daily():
+        daily_paths = _daily_paths()
+        return lambda: hedge_backtest(daily_paths, K, r, T, sigma)
+    def hedge_weekly():
+        weekly_paths = _daily_paths()[:1000, ::5]
+        return lambda: hedge_backtest(weekly_paths, K, r, T, sigma, "Put", model = "binomial", american = True)
+    benchmarks["hedge_5000x252_black_scholes"] = _Setup(hedge_daily)
+    benchmarks["hedge_1000x50_binomial_american"] = _Setup(hedge_weekly)
+    # The on-disk result store: loading an American price + exercise boundary vs computing it again
+    def store_get():
+        store, store_key = _stored_american()
+        return lambda: store.get(store_key)
+    benchmarks["binomial_american_2000_compute"] = lambda: binomial_american(S, K, r, T, sigma, 2000, "Put")
+    benchmarks["binomial_american_2000_store_get"] = _Setup(store_get)
+    # Exotic payoffs on the same trees (the vanilla one is the overhead of the adjust hook over binomial_price)
+    benchmarks["exotic_vanilla_american_1000"] = lambda: exotic_price(S, r, T, sigma, 1000, Vanilla(K, "Put"), "american")
+    benchmarks["exotic_up_and_in_american_1000"] = lambda: exotic_price(
+        S, r, T, sigma, 1000, Vanilla(K, "Put"), "american", Barrier(120, "up-and-in")
+    )
+    benchmarks["exotic_bermudan_down_and_out_chain_200x500"] = lambda: exotic_price(
+        chain, r, T, sigma, 500, Vanilla(K, "Put"), [0.25, 0.5, 0.75], Barrier(70, "down-and-out")
+    )
+    # Chain of 8 expiries x 50 strikes (American puts): one process vs one worker per CPU with shared memory
+    def option_chain(workers):
+        chain_strikes, chain_expiries = np.linspace(0.8 * S, 1.2 * S, 50), np.linspace(0.25, 2.0, 8)
+        return lambda: price_chain(S, chain_strikes, chain_expiries, r, sigma, 500, workers = workers)
+    benchmarks["chain_8x50x500_amer_1_process"] = _Setup(lambda: option_chain(1))
+    benchmarks["chain_8x50x500_amer_all_cpus"] = _Setup(lambda: option_chain(None))
+    def surface_refresh():
+        surface, moved = _fitted_surface(), {0.5: _vol_quotes(0.01)[0.5]}
+        return lambda: _vol_surface_refresh(surface, moved)
+    def surface_ladder():
+        surface = _fitted_surface()
+        return lambda: _vol_surface_ladder(surface)
+    benchmarks["vol_surface_fit_5x17"] = _vol_surface_fit
+    benchmarks["vol_surface_refresh_1_expiry"] = _Setup(surface_refresh)
+    benchmarks["vol_surface_ladder_2000"] = _Setup(surface_ladder)
+    return benchmarks
+
+def time_function(fn, repeat = 5, min_time = 0.1):
+    fn()
+    timer = timeit.Timer(fn)
+    # Find how many calls fit in min_time (same idea as timeit.autorange, just with a configurable budget)
+    number = 1
+    while timer.timeit(number) < min_time and number < 1_000_000:
+        number *= 10
+    per_call = np.array(timer.repeat(repeat = repeat, number = number)) / number
+    return {"best": float(per_call.min()), "median": float(np.median(per_call)), "number": number, "repeat": repeat}
+
+def run_benchmarks(name_filter = None, repeat = 5, min_time = 0.1):
+    results = {}
+    for name, fn in build_benchmarks().items():
+        if name_filter and name_filter not in name:
+            continue
+        if isinstance(fn, _Setup):
+            fn = fn.make()
+        results[name] = time_function(fn, repeat, min_time)
+        print(f"{name:<38} median {_format(results[name]['median'])}   best {_format(results[name]['best'])}")
+    return results
+
+def _format(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.1f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:9.2f} ms"
+    return f"{seconds:9.3f} s "
+
+def save_results(results, path):
+    payload = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent = 2)
+
+# Returns a list of (name, baseline median, current median, ratio) for every benchmark more than threshold slower
+def compare(results, baseline, threshold = 0.2):
+    regressions = []
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+        ratio = current["median"] / baseline[name]["median"]
+        if ratio > 1 + threshold:
+            regressions.append((name, baseline[name]["median"], current["median"], ratio))
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark the option pricing models.")
+    parser.add_argument("--save", help = "save the results as a JSON baseline at this path")
+    parser.add_argument("--compare", help = "compare the results against the JSON baseline at this path")
+    parser.add_argument("--threshold", type = float, default = 0.2, help = "allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--filter", help = "only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type = int, default = 5)
+    parser.add_argument("--min-time", type = float, default = 0.1, help = "minimum seconds per timing round")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, args.repeat, args.min_time)
+    if args.save:
+        save_results(results, args.save)
+        print(f"Saved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"SLOWER: {name}: {_format(before)} -> {_format(after)} ({ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
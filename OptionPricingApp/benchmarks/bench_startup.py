@@ -0,0 +1,71 @@
+"""
+Cold start benchmark: how long a fresh Python process takes to import the models and price its first option.
+
+This is what matters for short-lived batch workers (and the first page load of the app), where importing NumPy/SciPy
+used to take longer than the pricing itself. Every case runs in a brand new interpreter (so nothing is cached in
+sys.modules) and is timed from inside that interpreter, so the interpreter's own startup isn't counted.
+
+Usage (from the OptionPricingApp folder):
+python benchmarks/bench_startup.py                  -> print the timings (median of --repeat fresh processes)
+python benchmarks/bench_startup.py --budget 0.03    -> exit with status 1 if the scalar Black-Scholes case takes longer
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APP_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Name -> code that imports what it needs and prices one option
+CASES = {
+    "black_scholes_scalar": "from models.black_scholes import call_price\ncall_price(100.0, 100.0, 0.01, 1.0, 0.2)",
+    "package_scalar": "from models import put_price\nput_price(100.0, 100.0, 0.01, 1.0, 0.2)",
+    "binomial_scalar": "from models.binomial import binomial_price\nbinomial_price(100.0, 100.0, 0.01, 1.0, 0.2, 100, 'Put', True)",
+    "batch_price": "from models.black_scholes import batch_price\nbatch_price([100.0, 110.0], 100.0, 0.01, 1.0, 0.2)",
+}
+# The case the budget applies to (a worker pricing single options)
+BUDGET_CASE = "black_scholes_scalar"
+
+# Wrapper that runs one case and reports the elapsed time and which heavy modules ended up loaded
+_TEMPLATE = """
+import sys, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+heavy = [name for name in ("numpy", "scipy", "scipy.special", "scipy.stats", "pandas", "matplotlib")
+         if name in sys.modules and type(sys.modules[name]).__name__ == "module"]
+print(json.dumps({{"elapsed": elapsed, "loaded": heavy}}))
+"""
+
+def time_cold_start(code, repeat = 5):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _TEMPLATE.format(code = code)],
+            cwd = APP_FOLDER, capture_output = True, text = True, check = True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {"median": statistics.median(run["elapsed"] for run in runs), "loaded": runs[-1]["loaded"]}
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Measure the cold start time of the option pricing models.")
+    parser.add_argument("--budget", type = float, default = 0.03, help = f"seconds allowed for {BUDGET_CASE}")
+    parser.add_argument("--repeat", type = int, default = 5, help = "fresh processes per case")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name, code in CASES.items():
+        results[name] = time_cold_start(code, args.repeat)
+        loaded = ", ".join(results[name]["loaded"]) or "-"
+        print(f"{name:<22} {results[name]['median'] * 1e3:8.1f} ms   heavy modules loaded: {loaded}")
+
+    if results[BUDGET_CASE]["median"] > args.budget:
+        print(f"OVER BUDGET: {BUDGET_CASE} took {results[BUDGET_CASE]['median'] * 1e3:.1f} ms (budget {args.budget * 1e3:.0f} ms)")
+        return 1
+    print(f"{BUDGET_CASE} is within the {args.budget * 1e3:.0f} ms budget")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import importlib
+import importlib.util
+import sys
+import types
+
+"""
+The pricing models.
+
+Importing NumPy takes ~0.1 seconds, scipy.special ~0.3 seconds and scipy.stats more than a second, which is most of the
+run time of a short-lived batch worker that only prices a handful of options. So the model modules import their heavy
+dependencies lazily: NumPy through lazy_import below (a stand-in module is created right away, but the actual import
+only happens the first time one of its attributes is used) and SciPy inside the functions that need it. On top of that, the
+scalar Black-Scholes functions use math.erfc for the normal CDF, so pricing a single option needs neither NumPy nor SciPy.
+
+The main functions can also be imported straight from the package (from models import call_price), which only loads
+the module that defines them.
+
+benchmarks/bench_startup.py measures the cold start (fresh interpreter -> first price) against a time budget.
+"""
+
+# Stand-in for a module that hasn't been imported yet. The first attribute that is looked up imports the real module
+# (importlib's import lock makes that safe when several threads get there at once, unlike importlib.util.LazyLoader on
+# Python 3.11) and copies its attributes over, so every later lookup is a plain attribute access with no overhead.
+class _DeferredModule(types.ModuleType):
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+# Import a top level module lazily. Submodules like scipy.special would import their parent package as soon as they
+# are loaded anyway, so import those inside the functions that use them instead.
+def lazy_import(name):
+    # Already imported (by us or by someone else), so there is nothing to save
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named '{name}'")
+    return _DeferredModule(name)
+
+# Function name -> module that defines it
+_EXPORTS = {
+    "call_price": "models.black_scholes",
+    "put_price": "models.black_scholes",
+    "greeks": "models.black_scholes",
+    "batch_price": "models.black_scholes",
+    "binomial_price": "models.binomial",
+    "binomial_price_batch": "models.binomial",
+    "binomial_american": "models.binomial",
+    "binomial_greeks": "models.binomial",
+    "binomial_convergence": "models.binomial",
+    "fd_greeks": "models.finite_difference",
+    "DiscountCurve": "models.curves",
+    "DividendSchedule": "models.curves",
+    "discount_curve": "models.curves",
+    "VolSurface": "models.surface",
+    "implied_vol": "models.implied_vol",
+    "implied_vol_american": "models.implied_vol",
+    "monte_carlo_price": "models.monte_carlo",
+    "exotic_price": "models.exotics",
+    "price_chain": "models.chain",
+    "hedge_backtest": "models.hedging",
+    "simulate_paths": "models.hedging",
+}
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module 'models' has no attribute '{name}'")
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -1,11 +1,20 @@
-import numpy as np
+import time
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.curves import flat_inputs
+from models.surface import volatility
+from models.profiling import profiled, section, count, active_profiler
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
 
 """ 
 Note: For the Black Scholes model, I created two separate functions (one for call options and one for put options) to reduce the number
 of parameters. For the Binomial model, however, given that there are already additional parameters, I will be creating just one function
 that also incorporates an additional argument and checks if the option type is a call or a put.
 
-Accepts 9 parameters, with the first five being the same as the Black Scholes Model:
+Accepts 10 parameters, with the first five being the same as the Black Scholes Model:
 S -> Underlying price (spot price)
 K -> Strike price
 r -> Risk-free interest rate
@@ -16,14 +25,23 @@ type -> Either "call" or "put" (self-explanatory)
 american -> If True, then early exercise (prior to maturity/expiration date) is allowed at any point; if False, 
 it is a European option and must be exercised at expiration
 div_yield -> continuous dividend yield (usually denoted as q)
+lattice -> "crr" (Cox-Ross-Rubinstein, the default and the one written out below), "tian", "lr" (Leisen-Reimer) or
+"trinomial"; the other lattices are described further down and run through the shared batched backwards induction
+dividends -> DividendSchedule of discrete cash dividends (optional, see models/curves.py)
+
+r and div_yield can also be DiscountCurves; the trees use their zero rates to expiration as flat rates. sigma can also be
+a VolSurface (see models/surface.py); each tree uses the surface's vol at its own strike and expiration.
 
 This was one of the most challenging parts of the project to code so I added lots of comments to help you all (and myself) follow along
 """
+@profiled
 def binomial_price(
     S, K, r, T, sigma, steps,
     type = "Call",
     american = False,
-    div_yield = 0.0
+    div_yield = 0.0,
+    lattice = "crr",
+    dividends = None
 ):
     # Check if the call option is expired (if so, the call is worth the larger value of S - K and 0)
     if T <= 0:
@@ -37,6 +55,15 @@ def binomial_price(
     # Ensure that there is at least 1 time step! 
     if steps < 1:
         raise ValueError("steps must be >= 1")
+    sigma = volatility(sigma, K, T)
+
+    # Every lattice other than Cox-Ross-Rubinstein (and trees with discrete dividends) goes through the batched version
+    # (with a batch of one contract)
+    if lattice != "crr" or dividends is not None:
+        return float(binomial_price_batch(S, K, r, T, sigma, steps, type, american, div_yield, lattice, dividends))
+
+    # Rate and dividend yield curves become their zero rates to expiration (see models/curves.py)
+    _, r, div_yield = flat_inputs(S, r, T, div_yield)
 
     # If the volatility is zero, then the stock price is deterministic (no randomness) and the option payoff is simply discounted back
     if sigma <= 0:
@@ -44,10 +71,12 @@ def binomial_price(
         ST = S * np.exp((r - div_yield) * T)
         # Calculate the discount rate (we will discount the expected payoff at maturity back to present value!)
         disc = np.exp(-r * T)
-        if type == "Call":
-            return disc * max(ST - K, 0.0)
-        else:
-            return disc * max(K - ST, 0.0)
+        sign = 1.0 if type == "Call" else -1.0
+        price = disc * max(sign * (ST - K), 0.0)
+        # An American option can also be exercised right away (same as binomial_american)
+        if american:
+            price = max(price, max(sign * (S - K), 0.0))
+        return price
 
     # Parameters :)
     # Store time per each step in the variable dt (discrete time step)
@@ -65,33 +94,593 @@ def binomial_price(
     if not (0.0 < p < 1.0):
         raise ValueError(f"Invalid probability p = {p:.6f}")
 
+    # American options take their own path (see binomial_american below): it precomputes every node price once and
+    # updates the values in place, instead of rebuilding the stock prices at every single step
+    if american:
+        return binomial_american(S, K, r, T, sigma, steps, type, div_yield)["price"]
+
     # Calculate the option's terminal value (value at maturity before we work backwards)
-    # Create an array of possible number of "up" moves (from 0 to the total number of steps)
-    j = np.arange(steps + 1)
-    # Compute the stock price at maturity for all possible paths; recall j represents # of up moves, and steps - j represents # of down moves
-    ST = S * (u ** j) * (d ** (steps - j))
-    # Store all the possible options payoffs in the variable values
-    if type == "Call":
-        values = np.maximum(ST - K, 0)
-    else:
-        values = np.maximum(K - ST, 0)
+    with section("binomial_price.payoff_setup"):
+        # Create an array of possible number of "up" moves (from 0 to the total number of steps)
+        j = np.arange(steps + 1)
+        # Compute the stock price at maturity for all possible paths; recall j represents # of up moves, and steps - j represents # of down moves
+        ST = S * (u ** j) * (d ** (steps - j))
+        # Store all the possible options payoffs in the variable values
+        if type == "Call":
+            values = np.maximum(ST - K, 0)
+        else:
+            values = np.maximum(K - ST, 0)
 
     # Backwards Induction. Probably the most confusing part of the entire project (took me several times to wrap my head around this)!
     # Loop through each step BACKWARDS in time, starting at the second-to-last time stamp
-    for i in range(steps - 1, -1, -1):
-        # Recall that values currently holds the options payoffs at time step i+1 (before starting the loop)
-        # For each time step, we want to discount each possible expected value
-        values = disc * (p * values[1:] + (1 - p) * values[:-1])
-        # Find the optimal time to exercise the option if the option is American
-        if american:
-            # Create a vector that contains the stock prices for every single time stamp (in this case for time i)
-            Sj = S * (u ** np.arange(i + 1)) * (d ** (i - np.arange(i + 1)))
-            # Immediate exercise payoffs for each time stamp (considering the type of option of course)
-            if type == "Call":
-                exercise = np.maximum(Sj - K, 0.0)
-            else:
-                exercise = np.maximum(K - Sj, 0.0)
-            values = np.maximum(values, exercise)
+    with section("binomial_price.backward_induction"):
+        # The discounted probabilities, and one scratch array that is reused at every step (so no new arrays in the loop)
+        pu, pd = disc * p, disc * (1 - p)
+        scratch = np.empty_like(values)
+        for i in range(steps - 1, -1, -1):
+            # Recall that values currently holds the options payoffs at time step i+1 (before starting the loop)
+            # For each time step, we want to discount each possible expected value:
+            # values[:i + 1] = disc * (p * values[1:i + 2] + (1 - p) * values[:i + 1]), written in place
+            up = np.multiply(values[1:i + 2], pu, out = scratch[:i + 1])
+            now = values[:i + 1]
+            np.multiply(now, pd, out = now)
+            np.add(now, up, out = now)
+    count("tree_steps", steps)
+    count("array_bytes", ST.nbytes + values.nbytes + scratch.nbytes)
     # Once the backwards loop, values has been collapsed down to just one value: the option's fair price
     price = float(values[0])
-    return price
\ No newline at end of file
+    return price
+
+# Helper that runs the backwards induction for a whole batch of trees at once, updating values IN PLACE.
+# values has shape (contracts, terminal nodes) and holds the terminal payoffs. probs holds the DISCOUNTED branch
+# probabilities from the lowest branch to the highest, each with shape (contracts, 1): [pd, pu] for a binomial tree
+# (level i has i + 1 nodes) and [pd, pm, pu] for a trinomial tree (level i has 2i + 1 nodes).
+# If level_prices is given (a function returning the stock prices of the nodes at level i), then early exercise is
+# checked against sign * (node price - K) at every level, and if boundary is given (shape (contracts, steps + 1)),
+# the critical stock price at each level is written into it (NaN where nobody exercises).
+# If levels is given (a dictionary like {1: None, 2: None}), a copy of the values at those levels is stored in it.
+# If adjust is given, adjust(i, values at level i) is called at every level after the rest of the step, and can change
+# the values in place (barriers, Bermudan exercise dates and other payoffs, see models/exotics.py).
+# Note: the arrays are stored column by column (Fortran order) so that each level's slice is one contiguous block,
+# which makes the loop about twice as fast as the default row by row layout.
+def _backward_induction(values, probs, level_prices = None, K = None, sign = None, boundary = None, levels = None, adjust = None):
+    width = len(probs) - 1
+    steps = (values.shape[1] - 1) // width
+    # Scratch buffers that get reused at every level (instead of allocating new arrays each step)
+    scratch = np.empty_like(values)
+    extra = np.empty_like(values) if width > 1 else None
+
+    # With a profiler running, the early exercise checks are timed separately from the rest of each step
+    profiler = active_profiler()
+    if profiler is not None:
+        start = time.perf_counter()
+        exercise_time = 0.0
+        profiler.add("tree_steps", steps)
+        profiler.add("tree_nodes", values.shape[0] * (width * steps * (steps - 1) // 2 + steps))
+        profiler.add("array_bytes", values.nbytes + scratch.nbytes + (extra.nbytes if extra is not None else 0))
+
+    for i in range(steps - 1, -1, -1):
+        # Level i has width * i + 1 nodes, built from the nodes one level later
+        m = width * i + 1
+        acc = scratch[:, :m]
+        now = values[:, :m]
+        # Add up the higher branches first (they read values that "now" is about to overwrite)
+        np.multiply(values[:, width:width + m], probs[width], out = acc)
+        for k in range(1, width):
+            np.multiply(values[:, k:k + m], probs[k], out = extra[:, :m])
+            np.add(acc, extra[:, :m], out = acc)
+        np.multiply(now, probs[0], out = now)
+        np.add(now, acc, out = now)
+        if level_prices is not None:
+            if profiler is not None:
+                exercise_start = time.perf_counter()
+            # The node prices at level i come from the precomputed lattice (no power calls needed)
+            nodes = level_prices(i)
+            np.subtract(nodes, K, out = acc)
+            np.multiply(acc, sign, out = acc)
+            if boundary is not None:
+                # Exercising is optimal wherever the payoff beats holding on. Puts are exercised BELOW the boundary
+                # (so it is the highest such node price) and calls ABOVE it (the lowest such node price)
+                # Since the exercise region is one contiguous block of nodes, counting it tells us where it ends
+                count = np.count_nonzero((acc >= now) & (acc > 0), axis = 1)
+                edge = np.clip(np.where(sign[:, 0] < 0, count - 1, m - count), 0, m - 1)
+                boundary[:, i] = np.where(count > 0, nodes[np.arange(nodes.shape[0]), edge], np.nan)
+            np.maximum(now, acc, out = now)
+            if profiler is not None:
+                exercise_time += time.perf_counter() - exercise_start
+        if adjust is not None:
+            adjust(i, now)
+        if levels is not None and i in levels:
+            levels[i] = now.copy()
+
+    if profiler is not None:
+        total = time.perf_counter() - start
+        profiler.record("backward_induction.continuation", total - exercise_time)
+        if level_prices is not None:
+            profiler.record("backward_induction.exercise_checks", exercise_time)
+    return values[:, 0]
+
+"""
+American options with O(steps) memory and the early exercise boundary.
+
+Every node price is computed ONCE up front (one row of S * u^k, since d = 1/u), and the option values are updated in place
+level by level, so the whole tree only ever needs two arrays of about 2 * steps + 1 numbers. Along the way we record the
+early exercise boundary: the critical stock price at each time step where exercising becomes better than holding on.
+
+Shortcut: an American call on a stock that pays no dividends (with r >= 0) should never be exercised early, so it is worth
+exactly as much as the European call and we skip the backwards induction entirely (see _european_expectation below).
+
+Discrete dividends (escrowed model): the tree is built on the stock price minus the PV of the dividends paid before
+expiration, and the PV of the dividends still to come is added back to the node prices at each level before comparing
+holding on with exercising (so the boundary comes out in actual stock prices).
+"""
+@profiled
+def binomial_american(S, K, r, T, sigma, steps, type = "Put", div_yield = 0.0, dividends = None):
+    """
+    Same parameters as binomial_price (minus american, which is always True here, and lattice, which is always CRR).
+
+    Returns a dictionary with:
+    price -> the American option price
+    boundary_times -> the time (in years) of each level of the tree, from 0 to T
+    boundary_prices -> the critical stock price at each of those times (NaN where early exercise is never optimal)
+    """
+
+    # Ensure that there is at least 1 time step!
+    if steps < 1:
+        raise ValueError("steps must be >= 1")
+    sigma = volatility(sigma, K, T)
+    sign = 1.0 if type == "Call" else -1.0
+    times = np.linspace(0.0, max(T, 0.0), steps + 1)
+    no_boundary = np.full(steps + 1, np.nan)
+
+    # Expired or deterministic options: same answers as binomial_price (and no boundary to speak of)
+    if T <= 0 or sigma <= 0:
+        price = binomial_price(S, K, r, T, sigma, steps, type, True, div_yield, dividends = dividends)
+        return {"price": price, "boundary_times": times, "boundary_prices": no_boundary}
+
+    # The tree runs on flat rates and the stock price net of the dividends paid before expiration
+    S_tree, r, div_yield = flat_inputs(S, r, T, div_yield, dividends)
+    dt = T / steps
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1.0 / u
+    disc = np.exp(-r * dt)
+    p = (np.exp((r - div_yield) * dt) - d) / (u - d)
+    # Ensure that the probability is from 0 to 1 (tree breaks if not)
+    if not (0.0 < p < 1.0):
+        raise ValueError(f"Invalid probability p = {p:.6f}")
+
+    # Early exercise never pays for a call without dividends, so this is just the European price (O(steps) work)
+    if type == "Call" and div_yield == 0 and dividends is None and r >= 0:
+        price = _european_expectation(S, K, r, T, steps, sign, u, d, p)
+        return {"price": price, "boundary_times": times, "boundary_prices": no_boundary}
+
+    # Every node price in the tree (level i uses every other entry, starting at index steps - i)
+    with section("binomial_american.payoff_setup"):
+        lattice = (S_tree * u ** np.arange(-steps, steps + 1))[np.newaxis, :]
+        values = np.maximum(sign * (lattice[:, ::2] - K), 0)
+        boundary = np.empty((1, steps + 1))
+    count("array_bytes", lattice.nbytes + boundary.nbytes)
+    # At expiration the boundary is the strike itself
+    boundary[0, steps] = K
+
+    def level_prices(i):
+        return lattice[:, steps - i:steps + i + 1:2]
+    if dividends is not None:
+        level_prices = _with_dividends(level_prices, dividends, r, T, dt)
+
+    probs = [np.array([[disc * (1 - p)]]), np.array([[disc * p]])]
+    price = _backward_induction(values, probs, level_prices, K, np.array([[sign]]), boundary)
+    return {"price": float(price[0]), "boundary_times": times, "boundary_prices": boundary[0]}
+
+# Define a batched version of binomial_price that walks N contracts (with the same number of steps) through one backward induction
+@profiled
+def binomial_price_batch(
+    S, K, r, T, sigma, steps,
+    type = "Call",
+    american = False,
+    div_yield = 0.0,
+    lattice = "crr",
+    dividends = None,
+    dtype = "float64",
+    out = None
+):
+    """
+    Parameters (same as binomial_price, except S, K, r, T, sigma, type and div_yield can be NumPy arrays that broadcast together):
+    steps -> Number of time steps (shared by every contract in the batch)
+    american -> If True, every contract in the batch can be exercised early
+    lattice -> "crr", "tian", "lr" or "trinomial" (see LATTICES below)
+    dividends -> DividendSchedule of discrete cash dividends, shared by every contract (r and div_yield can be DiscountCurves)
+    dtype -> "float64" (default) or "float32" for the trees (half the memory, see the note on precision further down)
+    out -> optional preallocated array for the prices (broadcast shape of the inputs, given dtype)
+
+    Returns a NumPy array of prices with the broadcast shape of the inputs.
+    """
+
+    # Ensure that there is at least 1 time step!
+    if steps < 1:
+        raise ValueError("steps must be >= 1")
+
+    # Flat rates to each contract's expiration, and the stock price net of the dividends paid before it (and each
+    # contract's vol from a vol surface)
+    sigma = volatility(sigma, K, T)
+    spot = S
+    S, r, div_yield = flat_inputs(np.asarray(S, dtype = float), r, np.asarray(T, dtype = float), div_yield, dividends)
+    shape, (S, K, r, T, sigma, div_yield, sign) = _batch_inputs(S, K, r, T, sigma, div_yield, type)
+    dtype = np.dtype(dtype)
+    if out is None:
+        out = np.empty(shape, dtype = dtype)
+    elif out.shape != shape or out.dtype != dtype:
+        raise ValueError(f"out must be a {dtype} array of shape {shape}")
+    # Flat view of out (a copy if out isn't contiguous, which gets copied back at the end)
+    prices = out.reshape(-1)
+
+    # Expired contracts are worth their payoff, and zero volatility contracts their discounted (deterministic) payoff
+    expired = T <= 0
+    flat = ~expired & (sigma <= 0)
+    live = ~expired & ~flat
+    prices[expired] = np.maximum(sign[expired] * (S[expired] - K[expired]), 0)
+    ST = S[flat] * np.exp((r[flat] - div_yield[flat]) * T[flat])
+    prices[flat] = np.exp(-r[flat] * T[flat]) * np.maximum(sign[flat] * (ST - K[flat]), 0)
+    if american and flat.any():
+        # (or exercised right away, at the actual stock price)
+        spot = np.broadcast_to(np.asarray(spot, dtype = float), shape).ravel()
+        prices[flat] = np.maximum(prices[flat], np.maximum(sign[flat] * (spot[flat] - K[flat]), 0))
+
+    if live.any():
+        prices[live] = _batch_tree(
+            *(x[live][:, np.newaxis] for x in (S, K, r, T, sigma, div_yield, sign)), steps, american, lattice,
+            dividends = dividends, dtype = dtype
+        )
+
+    if not np.shares_memory(prices, out):
+        out[...] = prices.reshape(shape)
+    return out
+
+# Broadcast the batch inputs together and flatten them (the option type becomes +1 for calls and -1 for puts,
+# so that every payoff can be written as max(sign * (S - K), 0))
+def _batch_inputs(S, K, r, T, sigma, div_yield, type):
+    S, K, r, T, sigma, div_yield, type = np.broadcast_arrays(
+        np.asarray(S, dtype = float), np.asarray(K, dtype = float), np.asarray(r, dtype = float),
+        np.asarray(T, dtype = float), np.asarray(sigma, dtype = float), np.asarray(div_yield, dtype = float),
+        np.asarray(type)
+    )
+    sign = np.where(type == "Call", 1.0, -1.0)
+    return S.shape, [x.ravel() for x in (S, K, r, T, sigma, div_yield, sign)]
+
+"""
+Lattices: how the stock moves from one level of the tree to the next.
+
+crr -> Cox-Ross-Rubinstein (the classic): u = exp(sigma * sqrt(dt)), d = 1/u. Converges slowly and oscillates between
+       even and odd step counts (that's the zig-zag on the convergence chart).
+tian -> Tian (1993): u and d chosen so the tree matches the first THREE moments of the stock price (smoother convergence).
+lr -> Leisen-Reimer (1996): centres the tree on the strike using the Peizer-Pratt inversion of the normal CDF. Converges
+      about as fast as 1/n^2 (instead of 1/n), so for European options ~50 steps is about as accurate as ~500 CRR steps. Needs an odd number
+      of steps, so an even steps argument is bumped up by one.
+trinomial -> three branches per node (up, middle, down) with u = exp(sigma * sqrt(2 * dt)). Level i has 2i + 1 nodes.
+
+All four share the same backwards induction (_backward_induction above); only the node prices and probabilities differ.
+"""
+LATTICES = ("crr", "tian", "lr", "trinomial")
+
+"""
+Precision: binomial_price_batch(..., dtype = "float32") runs the trees in single precision. The backwards induction
+already works in place (no new arrays per level), so float32 halves its memory traffic and the trees run about 1.7x
+faster. Every level adds a little rounding error, so the error grows (about in proportion) with the number of steps.
+Largest differences against float64, relative to the price (or to 1 for prices below 1), over S from 50 to 150, K = 100,
+r = 3%, sigma from 10% to 50%, T from 0.1 to 2 years, calls and puts:
+
+              100 steps   500 steps   1000 steps
+crr           4.1e-6      1.9e-5      4.0e-5
+tian          4.2e-6      1.3e-5      4.0e-5
+lr            4.3e-6      2.1e-5      4.3e-5
+trinomial     2.8e-6      1.1e-5      2.2e-5
+
+American and European trees came out the same (to two digits). In absolute terms that is at most 2e-4 at 100 steps,
+1e-3 at 500 steps and 2.5e-3 at 1000 steps (for deep in the money contracts worth about 50; around the money it is
+well under a cent). That is fine for charts, but binomial_greeks (which divides differences of bumped prices by bumps
+as small as 1e-4) always runs in float64.
+"""
+
+# Peizer-Pratt inversion (method 2), used by Leisen-Reimer to turn d1/d2 into probabilities
+def _peizer_pratt(z, n):
+    return 0.5 + np.sign(z) * 0.5 * np.sqrt(1.0 - np.exp(-(z / (n + 1.0 / 3.0 + 0.1 / (n + 1))) ** 2 * (n + 1.0 / 6.0)))
+
+# Up factor, down factor and up probability of the binomial lattices (steps must already be odd for Leisen-Reimer)
+def _binomial_factors(lattice, S, K, r, T, sigma, div_yield, steps):
+    dt = T / steps
+    growth = np.exp((r - div_yield) * dt)
+    if lattice == "crr":
+        u = np.exp(sigma * np.sqrt(dt))
+        d = 1.0 / u
+    elif lattice == "tian":
+        v = np.exp(sigma ** 2 * dt)
+        root = np.sqrt(v ** 2 + 2 * v - 3)
+        u = 0.5 * growth * v * (v + 1 + root)
+        d = 0.5 * growth * v * (v + 1 - root)
+    else:
+        d1 = (np.log(S / K) + (r - div_yield + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
+        d2 = d1 - sigma * np.sqrt(T)
+        p = _peizer_pratt(d2, steps)
+        u = growth * _peizer_pratt(d1, steps) / p
+        d = (growth - p * u) / (1 - p)
+        return u, d, p
+    return u, d, (growth - d) / (u - d)
+
+# Set up a lattice for a batch of contracts (column vectors).
+# Returns the discounted branch probabilities, the terminal node prices, a function giving the node prices at level i
+# and the number of steps actually used (Leisen-Reimer may add one).
+def _lattice_setup(lattice, S, K, r, T, sigma, div_yield, steps, dtype = "float64"):
+    if lattice not in LATTICES:
+        raise ValueError(f"lattice must be one of {LATTICES}")
+    if lattice == "lr" and steps % 2 == 0:
+        steps += 1
+    dt = T / steps
+    disc = np.exp(-r * dt)
+
+    if lattice == "trinomial":
+        half_up = np.exp(sigma * np.sqrt(dt / 2))
+        half_growth = np.exp((r - div_yield) * dt / 2)
+        pu = ((half_growth - 1 / half_up) / (half_up - 1 / half_up)) ** 2
+        pd = ((half_up - half_growth) / (half_up - 1 / half_up)) ** 2
+        probs = [pd, 1 - pu - pd, pu]
+        # Nodes at level i are S * u^k for k = -i, ..., i (a contiguous slice of one precomputed row)
+        row = np.asfortranarray(S * (half_up ** 2) ** np.arange(-steps, steps + 1), dtype = dtype)
+        terminal = row
+
+        def level_prices(i):
+            return row[:, steps - i:steps + i + 1]
+    else:
+        u, d, p = _binomial_factors(lattice, S, K, r, T, sigma, div_yield, steps)
+        probs = [1 - p, p]
+
+        if lattice == "crr":
+            # Since d = 1/u, the nodes at level i are S * u^k for k = -i, -i + 2, ..., i,
+            # so one row of S * u^k for k = -steps, ..., steps covers the entire tree
+            row = np.asfortranarray(S * u ** np.arange(-steps, steps + 1), dtype = dtype)
+            terminal = row[:, ::2]
+
+            def level_prices(i):
+                return row[:, steps - i:steps + i + 1:2]
+        else:
+            # In general the nodes at level i are S * d^i * (u/d)^j for j = 0, ..., i, so we keep one row of S * d^i
+            # and one row of (u/d)^j, and each level costs a single multiplication into a reused buffer
+            base = (S * d ** np.arange(steps + 1)).astype(dtype)
+            ratio = np.asfortranarray((u / d) ** np.arange(steps + 1), dtype = dtype)
+            terminal = base[:, steps:] * ratio
+            buffer = np.empty_like(ratio)
+
+            def level_prices(i):
+                return np.multiply(base[:, i:i + 1], ratio[:, :i + 1], out = buffer[:, :i + 1])
+
+    # Ensure that every probability is from 0 to 1 (tree breaks if not)
+    valid = (probs[0] > 0.0) & (probs[-1] > 0.0)
+    for q in probs:
+        valid &= (q >= 0.0) & (q <= 1.0)
+    if not valid.all():
+        raise ValueError(f"Invalid probability p for {int(np.sum(~valid))} contract(s) in the {lattice} lattice")
+    return [(disc * q).astype(dtype) for q in probs], terminal, level_prices, steps
+
+# Add the PV of the dividends still to come to the node prices of an escrowed dividend tree (r and T are numbers or
+# column vectors, dt is the time step)
+def _with_dividends(level_prices, dividends, r, T, dt):
+    def with_dividends(i):
+        return level_prices(i) + dividends.present_value(T, r, start = i * dt)
+    return with_dividends
+
+# Run the trees of a batch of (live) contracts. Every input is a column vector with one row per contract.
+# levels is passed straight to _backward_induction (used by binomial_greeks to read the first few levels of the tree).
+# With dividends, S must already be net of the dividends paid before expiration (they only matter for early exercise here).
+def _batch_tree(
+    S, K, r, T, sigma, div_yield, sign, steps, american, lattice = "crr", levels = None, dividends = None, dtype = "float64"
+):
+    with section("binomial_price_batch.payoff_setup"):
+        probs, terminal, level_prices, steps = _lattice_setup(lattice, S, K, r, T, sigma, div_yield, steps, dtype)
+        # Terminal payoffs
+        values = np.asfortranarray(np.maximum(sign * (terminal - K), 0), dtype = dtype)
+    if american and dividends is not None:
+        level_prices = _with_dividends(level_prices, dividends, r, T, T / steps)
+    return _backward_induction(
+        values, probs, level_prices if american else None, K.astype(dtype), sign.astype(dtype), levels = levels
+    )
+
+
+"""
+Greeks for the Binomial model, WITHOUT running a separate tree for every bumped input.
+
+Delta, gamma and theta can be read straight off the first few levels of the tree we already built for the price:
+delta -> (V_up - V_down) / (S_up - S_down) using the two nodes at level 1
+gamma -> change in delta between the upper and lower pairs of the three nodes at level 2
+theta -> (V_middle at level 2 - V_0) / (2 * dt), since the middle node at level 2 has the same stock price as today
+
+Vega and rho need the tree to be rebuilt (the volatility moves the nodes, the rate changes p and the discounting), so all
+four bumped trees (sigma +/- bump, r +/- bump) for every contract go through ONE batched run of binomial_price_batch.
+The units match greeks() from black_scholes (vega and rho are per 1.00 change, theta is per year).
+"""
+@profiled
+def binomial_greeks(
+    S, K, r, T, sigma, steps,
+    type = "Call",
+    american = False,
+    div_yield = 0.0,
+    vol_bump = 0.01,
+    rate_bump = 1e-4,
+    dividends = None
+):
+    """
+    Same parameters as binomial_price_batch (so every input can also be an array), plus the bump sizes used for vega and rho.
+    Rate curves are turned into their zero rates to each expiration first, and rho bumps those.
+
+    Returns a dictionary with "price", "delta", "gamma", "vega", "theta" and "rho" (floats if every input was a number).
+    Contracts that are expired or have zero volatility have no tree, so they get their Black-Scholes (European) values,
+    or for American options exercised right away (like binomial_price) the intrinsic value with delta = +-1 and the other
+    Greeks 0, wherever that is worth more.
+    """
+
+    # We need at least two levels in the tree for gamma and theta
+    if steps < 2:
+        raise ValueError("steps must be >= 2 for binomial_greeks")
+
+    sigma = volatility(sigma, K, T)
+    _, r, div_yield = flat_inputs(S, r, np.asarray(T, dtype = float), div_yield)
+    shape, (S, K, r, T, sigma, div_yield, sign) = _batch_inputs(S, K, r, T, sigma, div_yield, type)
+    names = ["price", "delta", "gamma", "vega", "theta", "rho"]
+    result = {name: np.empty(S.shape) for name in names}
+
+    live = (T > 0) & (sigma > 0)
+    if not live.all():
+        dead = ~live
+        fallback = batch_price(
+            S[dead], K[dead], r[dead], T[dead], sigma[dead], np.where(sign[dead] > 0, "Call", "Put"), div_yield[dead], dividends
+        )
+        if american:
+            # Same as binomial_price: with nothing left to wait for, exercising right away can beat the discounted payoff
+            intrinsic = np.maximum(sign[dead] * (S[dead] - K[dead]), 0)
+            exercise = intrinsic > fallback["price"]
+            exercised = {name: np.zeros(intrinsic.shape) for name in names}
+            exercised["price"] = intrinsic
+            exercised["delta"] = sign[dead]
+            fallback = {name: np.where(exercise, exercised[name], fallback[name]) for name in names}
+        for name in names:
+            result[name][dead] = fallback[name]
+
+    if live.any():
+        S, K, r, T, sigma, div_yield, sign = (x[live] for x in (S, K, r, T, sigma, div_yield, sign))
+        def column(x):
+            return x[:, np.newaxis]
+
+        # ONE tree for the price, keeping the values at levels 1 and 2 (built on the stock price net of dividends,
+        # which moves one for one with S)
+        S_tree = S - dividends.present_value(T, r) if dividends is not None else S
+        levels = {1: None, 2: None}
+        price = _batch_tree(*map(column, (S_tree, K, r, T, sigma, div_yield, sign)), steps, american, "crr", levels, dividends)
+        dt = T / steps
+        u = np.exp(sigma * np.sqrt(dt))
+        d = 1.0 / u
+        V1, V2 = levels[1], levels[2]
+
+        delta = (V1[:, 1] - V1[:, 0]) / (S_tree * u - S_tree * d)
+        delta_up = (V2[:, 2] - V2[:, 1]) / (S_tree * u * u - S_tree)
+        delta_down = (V2[:, 1] - V2[:, 0]) / (S_tree - S_tree * d * d)
+        gamma = (delta_up - delta_down) / (0.5 * (S_tree * u * u - S_tree * d * d))
+        theta = (V2[:, 1] - price) / (2 * dt)
+
+        # ONE batched run for all the bumped trees: [sigma + h, sigma - h, r + h, r - h]
+        n = S.size
+        def stack(x):
+            return np.tile(x, 4)
+        sigma_down = np.maximum(sigma - vol_bump, 0.5 * sigma)
+        bumped = binomial_price_batch(
+            stack(S), stack(K),
+            np.concatenate([r, r, r + rate_bump, r - rate_bump]), stack(T),
+            np.concatenate([sigma + vol_bump, sigma_down, sigma, sigma]),
+            steps, np.where(stack(sign) > 0, "Call", "Put"), american, stack(div_yield), dividends = dividends
+        ).reshape(4, n)
+        vega = (bumped[0] - bumped[1]) / (sigma + vol_bump - sigma_down)
+        rho = (bumped[2] - bumped[3]) / (2 * rate_bump)
+
+        for name, values in zip(names, [price, delta, gamma, vega, theta, rho]):
+            result[name][live] = values
+
+    if shape == ():
+        return {name: float(values[0]) for name, values in result.items()}
+    return {name: values.reshape(shape) for name, values in result.items()}
+
+
+"""
+Convergence of the Binomial price as the number of steps grows (what the convergence charts on both model pages show).
+
+Calling binomial_price once per step count starts every tree from scratch. For European options we don't need the
+backwards induction at all: the price of an n-step tree is the discounted expected payoff over the terminal nodes,
+sum over j of C(n, j) * p^j * (1 - p)^(n - j) * payoff(S * u^j * d^(n - j)), which costs O(n) instead of O(n^2).
+The log-factorials behind C(n, j) are the same for every step count, so they are computed once and shared by the whole
+series. American options still need the backwards induction (early exercise).
+
+Richardson extrapolation: the Binomial error shrinks roughly like c / n, so two step counts n1 < n2 can be combined as
+(n2 * P(n2) - n1 * P(n1)) / (n2 - n1) to cancel most of it out.
+"""
+# European price of an n-step tree WITHOUT the backwards induction (the discounted expected payoff over the terminal nodes).
+# log_factorial must hold log(k!) for k = 0, ..., n (it can be longer, so it can be shared by several trees).
+def _european_expectation(S, K, r, T, n, sign, u, d, p, log_factorial = None):
+    if log_factorial is None:
+        from scipy.special import gammaln
+        log_factorial = gammaln(np.arange(n + 1) + 1.0)
+    j = np.arange(n + 1)
+    # Terminal stock prices and the (log) probability of ending up at each of them
+    ST = np.exp(np.log(S) + j * np.log(u) + (n - j) * np.log(d))
+    log_prob = log_factorial[n] - log_factorial[j] - log_factorial[n - j] + j * np.log(p) + (n - j) * np.log1p(-p)
+    return float(np.exp(-r * T) * np.sum(np.exp(log_prob) * np.maximum(sign * (ST - K), 0)))
+
+# Stream (steps, price) pairs as each step count finishes
+def iter_binomial_convergence(
+    S, K, r, T, sigma, steps_list,
+    type = "Call",
+    american = False,
+    div_yield = 0.0,
+    lattice = "crr"
+):
+    if lattice not in LATTICES:
+        raise ValueError(f"lattice must be one of {LATTICES}")
+    steps_list = [int(n) for n in steps_list]
+    if min(steps_list) < 1:
+        raise ValueError("steps must be >= 1")
+
+    # Expired or deterministic options don't depend on the number of steps at all
+    if T <= 0 or sigma <= 0:
+        price = binomial_price(S, K, r, T, sigma, 1, type, american, div_yield)
+        for n in steps_list:
+            yield n, price
+        return
+
+    sign = 1.0 if type == "Call" else -1.0
+    # Shared precomputation: log-factorials up to the largest tree
+    from scipy.special import gammaln
+    log_factorial = gammaln(np.arange(max(steps_list) + 2) + 1.0)
+
+    for n in steps_list:
+        # Leisen-Reimer trees need an odd number of steps
+        if lattice == "lr" and n % 2 == 0:
+            n += 1
+
+        # American options (and the trinomial lattice, which has no simple closed form) need the backwards induction
+        if american or lattice == "trinomial":
+            yield n, binomial_price(S, K, r, T, sigma, n, type, american, div_yield, lattice)
+            continue
+
+        u, d, p = _binomial_factors(lattice, S, K, r, T, sigma, div_yield, n)
+        if not (0.0 < p < 1.0):
+            raise ValueError(f"Invalid probability p = {p:.6f}")
+        yield n, _european_expectation(S, K, r, T, n, sign, u, d, p, log_factorial)
+
+# Define the method that returns the whole price vs steps series in one call
+@profiled
+def binomial_convergence(
+    S, K, r, T, sigma,
+    steps_list = (2, 4, 8, 16, 32, 64, 128, 256, 512),
+    type = "Call",
+    american = False,
+    div_yield = 0.0,
+    richardson = False,
+    lattice = "crr"
+):
+    """
+    Same parameters as binomial_price, except steps_list (the step counts to price, in increasing order) replaces steps.
+    richardson -> If True, also return the Richardson extrapolation of each pair of consecutive step counts
+    lattice -> which lattice to use (so several lattices can be compared on the same chart)
+
+    Returns a dictionary with the arrays "steps" and "prices" (and "richardson", with NaN for the first step count).
+    The returned steps are the ones actually used (Leisen-Reimer bumps even step counts up by one).
+    """
+    series = list(iter_binomial_convergence(S, K, r, T, sigma, steps_list, type, american, div_yield, lattice))
+    steps = np.array([n for n, _ in series])
+    prices = np.array([price for _, price in series])
+    result = {"steps": steps, "prices": prices}
+
+    if richardson:
+        # The Leisen-Reimer error shrinks like c / n^2 instead of c / n
+        order = 2 if lattice == "lr" else 1
+        extrapolated = np.full(len(steps), np.nan)
+        n1, n2 = steps[:-1] ** order, steps[1:] ** order
+        extrapolated[1:] = (n2 * prices[1:] - n1 * prices[:-1]) / (n2 - n1)
+        result["richardson"] = extrapolated
+
+    return result
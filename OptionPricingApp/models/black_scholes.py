@@ -1,73 +1,137 @@
-import numpy as np
+import math
 
-# Import normal distribution methods through scipy (like cumulative distribution functions)
-from scipy.stats import norm
+from models import lazy_import
+from models.profiling import profiled
+from models.curves import flat_inputs
+from models.surface import volatility
 
-# Define the method for determining call option price given the 5 main arguments 
-def call_price(S, K, r, T, sigma):
+# NumPy is only loaded the first time it is actually used (see models/__init__.py)
+np = lazy_import("numpy")
+
+# Normal distribution methods. For plain numbers math.erfc does the job (so NumPy and SciPy aren't even loaded),
+# arrays go through scipy's ndtr (the same standard normal CDF as scipy.stats.norm.cdf, without importing all of scipy.stats)
+# (out is an optional array to write the result into, like NumPy's own out=)
+def _norm_cdf(x, out = None):
+    if isinstance(x, float):
+        return 0.5 * math.erfc(-x / math.sqrt(2))
+    from scipy.special import ndtr
+    return ndtr(x, out = out)
+
+def _norm_pdf(x, out = None):
+    if isinstance(x, float):
+        return math.exp(-0.5 * x * x) / math.sqrt(2 * math.pi)
+    out = np.square(x, out = out)
+    np.multiply(out, -0.5, out = out)
+    np.exp(out, out = out)
+    return np.multiply(out, 1 / math.sqrt(2 * math.pi), out = out)
+
+# Plain numbers get the math module (much faster for one option), anything else gets NumPy
+def _math_for(*args):
+    return math if all(isinstance(a, (int, float)) for a in args) else np
+
+# The math module raises where NumPy just returns inf (log(0), dividing by zero), so for plain numbers a worthless stock
+# (S <= 0) or a zero strike goes through the deterministic case too: that is where the formula ends up in the limit
+# (same as the flat contracts in batch_price)
+def _deterministic(m, S, K, sigma):
+    return sigma == 0 or (m is math and (S <= 0 or K <= 0))
+
+# Define the method for determining call option price given the 5 main arguments (plus optional dividends)
+def call_price(S, K, r, T, sigma, div_yield = 0.0, dividends = None):
     """
     Parameters:
     S: current stock price (in USD)
     K: strike price (in USD)
-    r: risk-free rate (as a decimal, not a percentage)
+    r: risk-free rate (as a decimal, not a percentage), or a DiscountCurve (see models/curves.py)
     T: time to expiration (in years)
-    sigma: volatility (as a decimal)
+    sigma: volatility (as a decimal), or a VolSurface (see models/surface.py)
+    div_yield: continuous dividend yield (as a decimal), or a DiscountCurve of dividend yields
+    dividends: DividendSchedule of discrete cash dividends (optional)
     """
 
     # Check if the call option is expired (if so, the call is worth the larger value of S - K and 0
     if T <= 0: 
         price = max(S - K, 0)
         return price
-    
+
+    # Curves and discrete dividends turn into the equivalent flat inputs for this expiration (see models/curves.py),
+    # and a vol surface into the vol at this strike and expiration
+    sigma = volatility(sigma, K, T)
+    S, r, q = flat_inputs(S, r, T, div_yield, dividends)
+    m = _math_for(S, K, r, T, sigma, q)
+
     # Deterministic case (if no volatility, then same as if the call was expired except must discount strike)
-    if sigma == 0:
-        price = max(S - K * np.exp(-r*T), 0)
+    if _deterministic(m, S, K, sigma):
+        price = max(S * m.exp(-q*T) - K * m.exp(-r*T), 0)
         return price
     
-    # Black Scholes Formula, using mathematical methods from numpy and scipy libraries
-    d1 = (np.log(S / K) + (r + 0.5 * (sigma ** 2)) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    price = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    # Black Scholes Formula, using mathematical methods from the math (or numpy) and scipy libraries
+    d1 = (m.log(S / K) + (r - q + 0.5 * (sigma ** 2)) * T) / (sigma * m.sqrt(T))
+    d2 = d1 - sigma * m.sqrt(T)
+    price = S * m.exp(-q * T) * _norm_cdf(d1) - K * m.exp(-r * T) * _norm_cdf(d2)
     return price
 
-# Define the method for determining put option price given the 5 main arguments 
-def put_price(S, K, r, T, sigma):
+# Define the method for determining put option price given the 5 main arguments (plus optional dividends)
+def put_price(S, K, r, T, sigma, div_yield = 0.0, dividends = None):
     """
     (Same as above but displayed here again)
     Parameters:
     S: current stock price (in USD)
     K: strike price (in USD)
-    r: risk-free rate (as a decimal, not a percentage)
+    r: risk-free rate (as a decimal, not a percentage), or a DiscountCurve (see models/curves.py)
     T: time to expiration (in years)
-    sigma: volatility (as a decimal)
+    sigma: volatility (as a decimal), or a VolSurface (see models/surface.py)
+    div_yield: continuous dividend yield (as a decimal), or a DiscountCurve of dividend yields
+    dividends: DividendSchedule of discrete cash dividends (optional)
     """
 
     # Check if the put option is expired (if so, the put is worth the larger value of K - S and 0)
     if T <= 0:
         price = max(K - S, 0)
         return price
-    
+
+    # Curves and discrete dividends turn into the equivalent flat inputs for this expiration (see models/curves.py),
+    # and a vol surface into the vol at this strike and expiration
+    sigma = volatility(sigma, K, T)
+    S, r, q = flat_inputs(S, r, T, div_yield, dividends)
+    m = _math_for(S, K, r, T, sigma, q)
+
     # Deterministic case (if no volatility, then same as if the put was expired except must discount strike)
-    if sigma == 0:
-        price = max(K * np.exp(-r*T) - S, 0)
+    if _deterministic(m, S, K, sigma):
+        price = max(K * m.exp(-r*T) - S * m.exp(-q*T), 0)
         return price
     
     # Black Scholes Formula, exact same as for the call except flip the signs!
-    d1 = (np.log(S / K) + (r + 0.5 * sigma**2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    price = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    d1 = (m.log(S / K) + (r - q + 0.5 * sigma**2) * T) / (sigma * m.sqrt(T))
+    d2 = d1 - sigma * m.sqrt(T)
+    price = K * m.exp(-r * T) * _norm_cdf(-d2) - S * m.exp(-q * T) * _norm_cdf(-d1)
     return price
 
-# Define a method that returns the Greeks (in a dictionary)
-def greeks(S, K, r, T, sigma):
+# Define a method that returns the Greeks (in a dictionary); same parameters as call_price
+def greeks(S, K, r, T, sigma, div_yield = 0.0, dividends = None):
 
     # If the option is expired, then all the Greeks = 0
     if T <= 0:
         return {"delta": 0, "gamma": 0, "vega": 0, "theta": 0, "rho": 0}
     
-    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
-    d2 = d1 - sigma * np.sqrt(T)
-    pdf_d1 = norm.pdf(d1)
+    rate = r
+    sigma = volatility(sigma, K, T)
+    S, r, q = flat_inputs(S, r, T, div_yield, dividends)
+    m = _math_for(S, K, r, T, sigma, q)
+
+    # Deterministic case: a call that ends up in the money moves one for one with the (dividend adjusted) stock, and
+    # has no gamma or vega (same as the flat contracts in batch_price)
+    if _deterministic(m, S, K, sigma):
+        S_div, K_disc = S * m.exp(-q * T), K * m.exp(-r * T)
+        if S_div - K_disc <= 0:
+            return {"delta": 0.0, "gamma": 0.0, "vega": 0.0, "theta": 0.0, "rho": 0.0}
+        rho = T * K_disc
+        if dividends is not None:
+            rho += m.exp(-q * T) * dividends.rate_exposure(T, rate)
+        return {"delta": m.exp(-q * T), "gamma": 0.0, "vega": 0.0, "theta": q * S_div - r * K_disc, "rho": rho}
+
+    d1 = (m.log(S / K) + (r - q + 0.5 * sigma ** 2) * T) / (sigma * m.sqrt(T))
+    d2 = d1 - sigma * m.sqrt(T)
+    pdf_d1 = _norm_pdf(d1)
 
     """ 
     Making sense of the Greeks (I recommend referring to Investopedia if you want more clarity)
@@ -77,10 +141,184 @@ def greeks(S, K, r, T, sigma):
     Theta: Represents the time sensitivity of the option (sometimes known as time decay)
     Rho: Represents the rate of change between an option's value and a 1% change in the interest rate
     """
-    delta = norm.cdf(d1)
-    gamma = pdf_d1 / (S * sigma * np.sqrt(T))
-    vega = S * pdf_d1 * np.sqrt(T)
-    theta = -(S * pdf_d1 * sigma) / (2 * np.sqrt(T)) - r * K * np.exp(-r*T) * norm.cdf(d2)
-    rho = K * T * np.exp(-r * T) * norm.cdf(d2)
+    # Dividends: the stock is worth S * e^(-qT) at expiration in today's money
+    carry = m.exp(-q * T)
+    delta = carry * _norm_cdf(d1)
+    gamma = carry * pdf_d1 / (S * sigma * m.sqrt(T))
+    vega = carry * S * pdf_d1 * m.sqrt(T)
+    theta = -(carry * S * pdf_d1 * sigma) / (2 * m.sqrt(T)) - r * K * m.exp(-r*T) * _norm_cdf(d2) + q * carry * S * _norm_cdf(d1)
+    rho = K * T * m.exp(-r * T) * _norm_cdf(d2)
+    # A higher rate also lowers the PV of the dividends (so the stock price net of them goes up)
+    if dividends is not None:
+        rho += delta * dividends.rate_exposure(T, rate)
 
     return {"delta": delta, "gamma": gamma, "vega": vega, "theta": theta, "rho": rho}
+
+
+"""
+Memory and precision for big chains and surfaces (batch_price).
+
+The vectorized formulas used to create a new array for almost every operation (30-odd temporaries the size of the whole
+chain). Now every step writes into one of a handful of work arrays (or straight into the result arrays) with NumPy's out=
+argument, and the results can go into buffers the caller already has (out = {"price": buffer, ...}), e.g. one set of
+buffers reused for every frame of a chart. That alone makes a 1000 x 1000 surface about twice as fast.
+
+dtype = "float32" halves the memory (and the memory bandwidth, which is what these formulas are limited by). The price of
+that is precision: float32 carries about 7 significant digits. Against float64, over 2 million random contracts with S
+and K from 50 to 150, r from 0 to 10%, sigma from 5% to 100% and T from 1 day to 2 years, the largest differences were
+(absolute, and relative to the float64 value or to 1 when it is smaller than 1):
+price -> 4e-5 (2.6e-5 relative, well below a cent)
+delta -> 8.5e-6
+gamma -> 3.7e-5 (under 1e-6 from one month to expiration on; it blows up like 1/sqrt(T) in the last days)
+vega -> 7.8e-5 (4e-5 relative)
+theta -> 8.6e-4 (1.2e-4 relative; 3.3e-5 from one month to expiration on, for the same reason as gamma)
+rho -> 1.2e-4 (1.1e-5 relative)
+Good enough for charts and heatmaps, but not for anything that takes differences of nearby prices (bumped Greeks,
+implied volatility solvers), so float64 stays the default.
+"""
+OUTPUTS = ("price", "delta", "gamma", "vega", "theta", "rho")
+
+# Result arrays for batch_price: the caller's buffers where given, new ones for the rest
+def _output_buffers(out, shape, dtype):
+    buffers = {}
+    for name in OUTPUTS:
+        buffer = None if out is None else out.get(name)
+        if buffer is None:
+            buffer = np.empty(shape, dtype = dtype)
+        elif buffer.shape != shape or buffer.dtype != dtype:
+            raise ValueError(f"out['{name}'] must be a {dtype} array of shape {shape}")
+        buffers[name] = buffer
+    return buffers
+
+# Helper that turns the option type (either one string or an array of strings) into a boolean mask of calls
+def _call_mask(type):
+    return np.asarray(type) == "Call"
+
+# Define a vectorized method that prices a whole option chain (and all five Greeks) in one pass
+@profiled
+def batch_price(S, K, r, T, sigma, type = "Call", div_yield = 0.0, dividends = None, dtype = "float64", out = None):
+    """
+    Parameters (any of these can be a NumPy array, as long as they broadcast together):
+    S: current stock price (in USD)
+    K: strike price (in USD)
+    r: risk-free rate (as a decimal, not a percentage), or a DiscountCurve shared by the whole chain
+    T: time to expiration (in years)
+    sigma: volatility (as a decimal), or a VolSurface (one vol per strike and expiration)
+    type: either "Call" or "Put", or an array of them (one per contract)
+    div_yield: continuous dividend yield, or a DiscountCurve of dividend yields
+    dividends: DividendSchedule of discrete cash dividends on the underlying (shared by the whole chain)
+    dtype: "float64" (default) or "float32" (half the memory, see the note on precision above)
+    out: optional dictionary of preallocated result arrays (e.g. {"price": buffer}), each with the broadcast shape of the
+    inputs and the given dtype; results without a buffer get new arrays
+
+    Returns a dictionary of arrays with the keys "price", "delta", "gamma", "vega", "theta" and "rho".
+    Unlike greeks() above, the Greeks of puts are the put Greeks (delta = N(d1) - 1 and so on).
+    """
+
+    is_call = _call_mask(type)
+    dtype = np.dtype(dtype)
+    # Curves and discrete dividends turn into flat inputs per contract. A curve only works out one discount factor per
+    # distinct expiration, so a whole expiry ladder shares them (see models/curves.py)
+    T = np.asarray(T, dtype = float)
+    rate = r
+    sigma = volatility(sigma, K, T)
+    S, r, div_yield = flat_inputs(np.asarray(S, dtype = float), r, T, div_yield, dividends)
+    S, K, r, T, sigma, div_yield, is_call = np.broadcast_arrays(
+        *(np.asarray(x, dtype = dtype) for x in (S, K, r, T, sigma, div_yield)), is_call
+    )
+    result = _output_buffers(out, S.shape, dtype)
+    price, delta, gamma, vega, theta, rho = (result[name] for name in OUTPUTS)
+
+    # Instead of the if statements in call_price/put_price, the edge cases are handled with masks
+    expired = T <= 0
+    flat = ~expired & (sigma == 0)
+    live = ~expired & ~flat
+
+    # Swap in harmless values for the masked out contracts so we never divide by zero (they get overwritten below).
+    # From here on every step writes into one of a handful of work arrays (or the result arrays) with out=, instead of
+    # allocating a new temporary for every single operation
+    one = dtype.type(1.0)
+    def work_array():
+        return np.empty(S.shape, dtype = dtype)
+    T_safe = np.where(live, T, one)
+    sqrt_T = np.sqrt(T_safe, out = work_array())
+    # vol = sigma * sqrt(T)
+    vol = np.where(live, sigma, one)
+    np.multiply(vol, sqrt_T, out = vol)
+    # disc_K = K * e^(-rT), and carry = e^(-qT) since with dividends the stock is worth S_div = S * e^(-qT) at expiration
+    # in today's money (expired contracts get T = 0)
+    T_now = np.where(expired, dtype.type(0.0), T)
+    disc_K = np.multiply(r, T_now, out = work_array())
+    np.negative(disc_K, out = disc_K)
+    np.exp(disc_K, out = disc_K)
+    np.multiply(disc_K, K, out = disc_K)
+    carry = np.multiply(div_yield, T_now, out = T_now)
+    np.negative(carry, out = carry)
+    np.exp(carry, out = carry)
+    S_div = np.multiply(S, carry, out = work_array())
+
+    # d1 = (log(S / K) + (r - q) * T + vol^2 / 2) / vol and d2 = d1 - vol
+    d1 = np.divide(S, K, out = work_array())
+    np.log(d1, out = d1)
+    work = np.subtract(r, div_yield, out = work_array())
+    np.multiply(work, T_safe, out = work)
+    np.add(d1, work, out = d1)
+    np.square(vol, out = work)
+    np.multiply(work, 0.5, out = work)
+    np.add(d1, work, out = d1)
+    np.divide(d1, vol, out = d1)
+    d2 = np.subtract(d1, vol, out = work)
+
+    # N(d1) goes into delta and N(d2) into rho for now, and d1 is turned into the normal pdf in place
+    _norm_cdf(d1, out = delta)
+    _norm_cdf(d2, out = rho)
+    pdf_d1 = _norm_pdf(d1, out = d1)
+    # Put-call parity: with N(d) - 1 in place of N(d), every call formula below becomes the put formula
+    puts = ~is_call
+    np.subtract(delta, puts, out = delta)
+    np.subtract(rho, puts, out = rho)
+
+    # rho holds K * e^(-rT) * N(d2) for now (it shows up in the price and theta too)
+    np.multiply(rho, disc_K, out = rho)
+    np.multiply(S_div, delta, out = price)
+    np.subtract(price, rho, out = price)
+    # vega starts out as S_div * pdf(d1) (theta needs that too)
+    np.multiply(S_div, pdf_d1, out = vega)
+    # theta = -S_div * pdf(d1) * sigma / (2 * sqrt(T)) - r * K * e^(-rT) * N(d2) + q * S_div * N(d1); gamma is scratch space
+    np.multiply(vega, vol, out = theta)
+    np.divide(theta, T_safe, out = theta)
+    np.multiply(theta, -0.5, out = theta)
+    np.multiply(r, rho, out = gamma)
+    np.subtract(theta, gamma, out = theta)
+    np.multiply(S_div, delta, out = gamma)
+    np.multiply(gamma, div_yield, out = gamma)
+    np.add(theta, gamma, out = theta)
+    np.multiply(rho, T_safe, out = rho)
+    np.multiply(vega, sqrt_T, out = vega)
+    # gamma = e^(-qT) * pdf(d1) / (S * vol) and delta = e^(-qT) * N(d1)
+    np.multiply(S, vol, out = gamma)
+    np.divide(pdf_d1, gamma, out = gamma)
+    np.multiply(gamma, carry, out = gamma)
+    np.multiply(delta, carry, out = delta)
+
+    if not live.all():
+        # Expired case: worth the payoff, and all the Greeks = 0 (same convention as greeks() above)
+        sign = np.where(is_call, one, -one)
+        for greek in (delta, gamma, vega, theta, rho):
+            greek[~live] = 0.0
+        price[expired] = np.maximum(sign[expired] * (S[expired] - K[expired]), 0)
+
+        # Deterministic case (no volatility): the option is either worth its discounted intrinsic value or nothing
+        if flat.any():
+            sign, S_flat, K_flat = sign[flat], S_div[flat], disc_K[flat]
+            in_the_money = sign * (S_flat - K_flat) > 0
+            price[flat] = np.maximum(sign * (S_flat - K_flat), 0)
+            delta[flat] = np.where(in_the_money, sign * carry[flat], 0.0)
+            theta[flat] = np.where(in_the_money, sign * (div_yield[flat] * S_flat - r[flat] * K_flat), 0.0)
+            rho[flat] = np.where(in_the_money, sign * T[flat] * K_flat, 0.0)
+
+    # A higher rate also lowers the PV of the dividends (so the stock price net of them goes up)
+    if dividends is not None:
+        rho += delta * dividends.rate_exposure(T, rate)
+
+    return result
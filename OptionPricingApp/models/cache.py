@@ -0,0 +1,188 @@
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from models import lazy_import
+from models.store import default_store, code_version, _feed
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+A small shared pricing cache for the Streamlit pages.
+
+Streamlit reruns the whole page script every time a widget changes, even if the widget (like the "Position" selectbox)
+has nothing to do with the prices on the page. Modules are only imported once per server process though, so a cache
+that lives in this module survives the reruns AND is shared by every analyst connected to the same server.
+
+The cache is keyed on the function name plus its arguments rounded to a fixed number of decimals (so 0.1 + 0.2 and 0.3
+land on the same entry). The arguments are first bound to the function's signature with the defaults filled in, so
+f(S, K, r, T, sigma, "Put"), f(S, K, r, T, sigma, type = "Put") and (if "Put" is the default) f(S, K, r, T, sigma) all
+share one entry. The cache holds at most maxsize results and evicts the least recently used entry when it is full.
+Objects like vol surfaces and curves are keyed on a hash of their cache_state() (for a surface, its fitted smiles), so a
+surface that update() refitted in place gets new entries instead of the stale prices. Calls with any other kind of
+object among their arguments aren't cached at all (there's no telling whether it changed since the last call).
+Cached NumPy arrays are made read-only so that one page can't accidentally modify another page's results.
+
+Behind the in-memory cache there can be a ResultStore (models/store.py): results are also written to disk, and a miss in
+memory checks the disk before computing. That store survives restarts and is shared by every worker process, so a new
+process doesn't have to recompute what another one already did.
+"""
+
+# Round a single argument so that it can be used as (part of) a dictionary key (TypeError if it can't be keyed by value)
+def _quantize(value, decimals):
+    if isinstance(value, (bool, str, type(None), np.bool_)):
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return round(float(value), decimals)
+    if isinstance(value, np.ndarray) or isinstance(value, (list, tuple)):
+        try:
+            array = np.asarray(value)
+        except ValueError:
+            # Ragged sequences
+            array = None
+        if array is not None and array.dtype.kind in "fiu":
+            return (array.shape, tuple(np.round(array.astype(float), decimals).ravel()))
+        if array is not None and array.dtype.kind in "bSU":
+            return (array.shape, tuple(array.ravel().tolist()))
+        if isinstance(value, (list, tuple)):
+            return tuple(_quantize(item, decimals) for item in value)
+        raise TypeError(f"can't key an array of {array.dtype}")
+    if callable(getattr(value, "cache_state", None)):
+        # Mutable objects (a surface refitted in place) are keyed on what they hold right now, not on who they are
+        digest = hashlib.sha256()
+        _feed(digest, value.cache_state())
+        return (type(value).__name__, digest.hexdigest())
+    raise TypeError(f"can't key a {type(value).__name__} by value")
+
+# Make cached results read-only (works for arrays, and dictionaries/tuples of arrays like batch_price returns)
+def _freeze(result):
+    if isinstance(result, np.ndarray):
+        result.setflags(write = False)
+    elif isinstance(result, dict):
+        for value in result.values():
+            _freeze(value)
+    elif isinstance(result, (list, tuple)):
+        for value in result:
+            _freeze(value)
+    return result
+
+class PricingCache:
+    """
+    Parameters:
+    maxsize: maximum number of results kept before the least recently used one is evicted
+    decimals: number of decimals the float arguments are rounded to when building the key
+    store: ResultStore to keep the results on disk as well (None to only keep them in memory), or a function that
+    returns one (called the first time the store is needed, so nothing is created on disk just by importing this module)
+    """
+
+    def __init__(self, maxsize = 512, decimals = 8, store = None):
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self._store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Streamlit runs every session in its own thread, so guard the dictionary with a lock
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if callable(self._store):
+            with self._lock:
+                if callable(self._store):
+                    self._store = self._store()
+        return self._store
+
+    def key(self, name, args = (), kwargs = None, fn = None):
+        kwargs = kwargs or {}
+        if fn is not None:
+            # Same call, same key, however the arguments were passed
+            try:
+                bound = inspect.signature(fn).bind(*args, **kwargs)
+            except (TypeError, ValueError):
+                # No signature to bind to (some builtins), or a call fn itself will reject: key on the raw arguments
+                pass
+            else:
+                bound.apply_defaults()
+                args, kwargs = bound.args, bound.kwargs
+        return (
+            name,
+            tuple(_quantize(a, self.decimals) for a in args),
+            tuple(sorted((k, _quantize(v, self.decimals)) for k, v in kwargs.items())),
+        )
+
+    def get_or_compute(self, name, fn, *args, **kwargs):
+        try:
+            key = self.key(name, args, kwargs, fn)
+        except TypeError:
+            # An argument we can't key by value: compute it every time rather than risk serving a stale result
+            return fn(*args, **kwargs)
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self.misses += 1
+        # Compute outside of the lock so that one slow tree doesn't block every other session
+        result = None
+        store = self.store
+        if store is not None:
+            try:
+                store_key = store.key(name, key, code_version(fn))
+            except TypeError:
+                # An argument without a canonical form: this result only lives in memory
+                store = None
+            else:
+                result = store.get(store_key)
+        if result is None:
+            result = _freeze(fn(*args, **kwargs))
+            if store is not None:
+                try:
+                    # (results that wouldn't come back from disk exactly as they are just aren't stored)
+                    store.put(store_key, result)
+                except OSError:
+                    # A full or read-only disk only costs us the persistence, the result is still good
+                    pass
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / total if total else 0.0,
+                # Misses in memory that were found in the on-disk store (instead of being computed)
+                "disk_hits": self._store.hits if self._store is not None and not callable(self._store) else 0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+# The cache shared by every page (and every session) in this process, backed by the on-disk store shared by every process
+pricing_cache = PricingCache(store = default_store)
+
+# Wrap a pricing function so that its calls go through the cache.
+# The name defaults to the function's module + name, but pages should pass their own (their functions are redefined on every rerun).
+def cached(fn, name = None, cache = None):
+    cache = cache if cache is not None else pricing_cache
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return cache.get_or_compute(name, fn, *args, **kwargs)
+
+    return wrapper
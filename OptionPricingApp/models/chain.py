@@ -0,0 +1,194 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from models import lazy_import
+from models.binomial import _backward_induction, _lattice_setup, _with_dividends, binomial_price_batch
+from models.curves import flat_inputs
+from models.surface import volatility
+from models.profiling import profiled, section, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Parallel pricing of a whole option chain (every expiry x every strike) on the Binomial trees.
+
+Each expiry is an independent batch of trees, so the expiries are spread across a pool of worker processes. To avoid
+pickling the chain back and forth, the inputs and the output prices all live in ONE multiprocessing.shared_memory block,
+and a task is nothing but the name of the block, where each field sits in it, and an expiry number. The worker maps the
+block, reads its row of strikes/vols straight out of it and writes the prices straight into their row of the output, so
+only those few numbers cross between processes (and whatever exception a tree raises).
+
+The pool itself is started once per process (per number of workers) and reused by every call, so short chains don't pay
+for starting worker processes every time.
+
+Inside a task, the strikes of the expiry run as one batch through the same backwards induction as binomial_price_batch.
+The lattice (u, d, p and the discounting, and with them the node prices) only depends on the strike through sigma
+(and through K for Leisen-Reimer), so when the expiry has one vol for every strike (no smile) it is set up ONCE and
+shared by all of its strikes; only the payoffs differ. With a smile (sigma an array or a VolSurface) every strike gets
+its own lattice, as in binomial_price_batch.
+
+The expiries all use the same number of steps, so they cost about the same and the pool hands them out one at a time as
+workers free up. With more workers than expiries the extra workers would sit idle, so the pool is capped at the number of
+expiries (price long chains, or split very wide ones into several calls).
+"""
+
+# Per-expiry inputs (one number each) and per-contract inputs/outputs (one row of strikes each), in the shared block
+EXPIRY_FIELDS = ("S", "T", "r", "div_yield")
+CHAIN_FIELDS = ("K", "sigma", "sign", "price")
+
+# Worker pools shared by every call (one per number of workers)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Offsets of every field in the shared block (all float64)
+def _layout(expiries, strikes):
+    layout, offset = {}, 0
+    for name in EXPIRY_FIELDS + CHAIN_FIELDS:
+        shape = (expiries,) if name in EXPIRY_FIELDS else (expiries, strikes)
+        layout[name] = (offset, shape)
+        offset += 8 * int(np.prod(shape))
+    return layout, offset
+
+def _views(buffer, layout):
+    return {name: np.ndarray(shape, dtype = np.float64, buffer = buffer, offset = offset) for name, (offset, shape) in layout.items()}
+
+def _pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers = workers)
+        return pool
+
+# Pool task: map the shared block, price expiry e into it and let go of it again
+def _price_shared_expiry(name, layout, settings, e):
+    block = shared_memory.SharedMemory(name = name)
+    arrays = _views(block.buf, layout)
+    try:
+        _price_expiry(e, arrays, settings)
+    except Exception as error:
+        # The traceback holds on to views into the block, which would keep it from closing
+        traceback.clear_frames(error.__traceback__)
+        raise
+    finally:
+        arrays = None
+        block.close()
+    return e
+
+# Price every strike of expiry e, writing the prices into its row of arrays["price"]
+def _price_expiry(e, arrays, settings):
+    steps, american, lattice, dividends, spot, rate, yield_curve = settings
+    S, T, r, div_yield = (float(arrays[name][e]) for name in EXPIRY_FIELDS)
+    K, sigma, sign, out = (arrays[name][e] for name in CHAIN_FIELDS)
+
+    # Expired or zero volatility contracts: binomial_price_batch handles those cases (and writes into our row too). It
+    # gets the inputs exactly as price_chain did (spot price, curves, dividends), since it nets out the dividends itself.
+    if T <= 0 or np.any(sigma <= 0):
+        binomial_price_batch(
+            spot, K, rate, T, sigma, steps, np.where(sign > 0, "Call", "Put"), american, yield_curve, lattice, dividends, out = out
+        )
+        return e
+
+    with section("price_chain.payoff_setup"):
+        # One lattice for the whole expiry unless the vol (or, for Leisen-Reimer, the strike) changes it
+        shared = lattice != "lr" and np.all(sigma == sigma[0])
+        column = (lambda x: x[:1, np.newaxis]) if shared else (lambda x: x[:, np.newaxis])
+        probs, terminal, level_prices, steps = _lattice_setup(
+            lattice, np.full((1, 1), S), column(K), np.full((1, 1), r), np.full((1, 1), T), column(sigma),
+            np.full((1, 1), div_yield), steps
+        )
+        values = np.asfortranarray(np.maximum(sign[:, np.newaxis] * (terminal - K[:, np.newaxis]), 0))
+    if american and dividends is not None:
+        level_prices = _with_dividends(level_prices, dividends, r, T, T / steps)
+    out[:] = _backward_induction(
+        values, probs, level_prices if american else None, K[:, np.newaxis], sign[:, np.newaxis]
+    )
+    count("chain_expiries", 1)
+    return e
+
+# Define the chain pricing method
+@profiled
+def price_chain(
+    S, strikes, expiries, r, sigma, steps,
+    type = "Put",
+    american = True,
+    div_yield = 0.0,
+    lattice = "crr",
+    dividends = None,
+    workers = None
+):
+    """
+    Parameters:
+    S: spot price
+    strikes: strikes of the chain, either one list shared by every expiry or an array of shape (expiries, strikes)
+    expiries: times to expiration in years
+    r, div_yield: numbers or DiscountCurves (each expiry uses the zero rate to its own expiration)
+    sigma: a number, an array of shape (expiries, strikes) (or anything that broadcasts to it) or a VolSurface
+    steps: number of time steps of every tree
+    type: "Call", "Put" or an array of them that broadcasts to (expiries, strikes)
+    american, lattice, dividends: same as binomial_price_batch
+    workers: number of processes (default: one per CPU, at most one per expiry; 1 runs everything in this process)
+
+    Returns an array of prices of shape (expiries, strikes).
+    """
+
+    if steps < 1:
+        raise ValueError("steps must be >= 1")
+    T = np.asarray(expiries, dtype = float).ravel()
+    strikes = np.atleast_1d(np.asarray(strikes, dtype = float))
+    K = np.broadcast_to(strikes, (T.size, strikes.shape[-1]))
+    shape = K.shape
+
+    # Everything the workers need, flattened to numbers per expiry and rows per expiry
+    settings = (steps, american, lattice, dividends, float(S), r, div_yield)
+    S_net, r, div_yield = flat_inputs(np.full(T.shape, float(S)), r, T, div_yield, dividends)
+    inputs = {
+        "S": S_net, "T": T, "r": r, "div_yield": div_yield,
+        "K": K, "sigma": volatility(sigma, K, T[:, np.newaxis]), "sign": np.where(np.asarray(type) == "Call", 1.0, -1.0),
+    }
+    layout, size = _layout(*shape)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, T.size)
+
+    if workers <= 1:
+        arrays = _views(bytearray(size), layout)
+        for name, value in inputs.items():
+            arrays[name][...] = value
+        for e in range(T.size):
+            _price_expiry(e, arrays, settings)
+        return arrays["price"].copy()
+
+    block = shared_memory.SharedMemory(create = True, size = size)
+    arrays = None
+    try:
+        arrays = _views(block.buf, layout)
+        for name, value in inputs.items():
+            arrays[name][...] = value
+        # The tasks are just the block's name and an expiry number: the workers read their inputs from (and write the
+        # prices into) the block
+        pool = _pool(workers)
+        tasks = [pool.submit(_price_shared_expiry, block.name, layout, settings, e) for e in range(T.size)]
+        # Every task has to finish before the block goes away (even if one failed, the others may still be writing)
+        wait(tasks)
+        try:
+            for task in tasks:
+                task.result()
+        except BrokenProcessPool:
+            # A worker died: start a new pool next time
+            with _pools_lock:
+                if _pools.get(workers) is pool:
+                    del _pools[workers]
+            raise
+        prices = arrays["price"].copy()
+    finally:
+        # The views have to go before the block can be closed
+        arrays = None
+        block.close()
+        block.unlink()
+    return prices
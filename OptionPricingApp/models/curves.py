@@ -0,0 +1,178 @@
+import bisect
+import math
+from functools import lru_cache
+
+from models import lazy_import
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+# Most discount factors remembered per curve (time decay keeps producing new maturities, so it has to stop somewhere)
+MAX_CACHED_DISCOUNTS = 10_000
+
+"""
+Term structures (interest rate and dividend yield curves) and discrete dividend schedules.
+
+Every model takes r (and div_yield) as either a plain number (a flat rate, like before) or a DiscountCurve. A curve stores
+continuously compounded zero rates at a few maturities; in between, r(T) * T (minus the log of the discount factor) is
+interpolated linearly, which is the same as assuming flat forward rates between the points. Before the first point and
+after the last one the zero rate is flat.
+
+Curves are meant to be built ONCE and shared by a whole chain: discount_curve() hands out the same object for the same
+points, and each curve remembers the discount factors it has computed (up to MAX_CACHED_DISCOUNTS). An expiry ladder (hundreds of strikes over a few
+expiries) then only computes one discount factor per expiry instead of one per contract.
+
+DividendSchedule holds discrete cash dividends (ex-dividend time in years, amount in USD). The models use the escrowed
+dividend approach: the present value of the dividends paid before expiration is taken out of the stock price, so
+Black-Scholes prices the option on S - PV(dividends). The Binomial tree is built on that same reduced price, and the PV of
+the dividends still to come is added back to each node before checking early exercise.
+
+For the Black-Scholes formula a curve is exact (only the discount factors to expiration matter). The trees use the zero
+rates to expiration as flat rates, which is exact for European options and a (very close) approximation for American ones.
+"""
+
+
+class DiscountCurve:
+    """
+    Parameters:
+    times: increasing maturities in years (all > 0)
+    rates: continuously compounded zero rates at those maturities (as decimals)
+    """
+
+    def __init__(self, times, rates):
+        times = [float(t) for t in times]
+        rates = [float(rate) for rate in rates]
+        if not times or len(times) != len(rates):
+            raise ValueError("times and rates must be non-empty and the same length")
+        if times[0] <= 0 or any(b <= a for a, b in zip(times, times[1:])):
+            raise ValueError("times must be positive and strictly increasing")
+        self.times = times
+        self.rates = rates
+        # Interpolation nodes for -log(discount factor), starting at 0 for T = 0
+        self._nodes = [0.0] + times
+        self._log_discounts = [0.0] + [rate * t for rate, t in zip(rates, times)]
+        self._cache = {}
+
+    @classmethod
+    def flat(cls, rate):
+        return cls([1.0], [rate])
+
+    def __repr__(self):
+        return f"DiscountCurve(times = {self.times}, rates = {self.rates})"
+
+    # The points that define the curve, as plain values (what the result store and the pricing cache key it on)
+    def cache_state(self):
+        return (tuple(self.times), tuple(self.rates))
+
+    # -log(discount factor) at a single time
+    def _log_discount(self, T):
+        if T <= 0:
+            return 0.0
+        if T >= self.times[-1]:
+            return self.rates[-1] * T
+        i = bisect.bisect_right(self._nodes, T) - 1
+        weight = (T - self._nodes[i]) / (self._nodes[i + 1] - self._nodes[i])
+        return self._log_discounts[i] + weight * (self._log_discounts[i + 1] - self._log_discounts[i])
+
+    def discount(self, T):
+        """Discount factor(s) for time(s) to maturity T (a number or an array)."""
+        if isinstance(T, (int, float)):
+            factor = self._cache.get(T)
+            if factor is None:
+                # Same as the vol cache of VolSurface: start over once it is full
+                if len(self._cache) >= MAX_CACHED_DISCOUNTS:
+                    self._cache.clear()
+                factor = self._cache[T] = math.exp(-self._log_discount(T))
+            return factor
+        # Arrays: compute each distinct maturity once (a chain usually only has a handful of expiries)
+        T = np.asarray(T, dtype = float)
+        unique, inverse = np.unique(T, return_inverse = True)
+        factors = np.array([self.discount(float(t)) for t in unique])
+        return factors[inverse].reshape(T.shape)
+
+    def zero_rate(self, T):
+        """Continuously compounded zero rate(s) to maturity T (the flat rate with the same discount factor)."""
+        if isinstance(T, (int, float)):
+            return -math.log(self.discount(T)) / T if T > 0 else self.rates[0]
+        T = np.asarray(T, dtype = float)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return np.where(T > 0, -np.log(self.discount(T)) / np.where(T > 0, T, 1.0), self.rates[0])
+
+@lru_cache(maxsize = 256)
+def _cached_curve(times, rates):
+    return DiscountCurve(times, rates)
+
+# Build a curve (or reuse the one already built for the same points)
+def discount_curve(times, rates):
+    return _cached_curve(tuple(float(t) for t in times), tuple(float(rate) for rate in rates))
+
+class DividendSchedule:
+    """
+    Parameters:
+    times: ex-dividend times in years from today
+    amounts: cash dividend paid at each of those times (in USD per share)
+    """
+
+    def __init__(self, times, amounts):
+        if len(times) != len(amounts):
+            raise ValueError("times and amounts must be the same length")
+        pairs = sorted(zip((float(t) for t in times), (float(a) for a in amounts)))
+        self.times = [t for t, _ in pairs]
+        self.amounts = [a for _, a in pairs]
+
+    def __repr__(self):
+        return f"DividendSchedule(times = {self.times}, amounts = {self.amounts})"
+
+    def cache_state(self):
+        return (tuple(self.times), tuple(self.amounts))
+
+    def present_value(self, T, r, start = 0.0):
+        """
+        Value at time start of the dividends paid after start and up to (and including) T.
+        r is a number or a DiscountCurve. T and start can be numbers or arrays that broadcast together.
+        """
+        if isinstance(T, (int, float)) and isinstance(start, (int, float)):
+            total = 0.0
+            for t, amount in zip(self.times, self.amounts):
+                if start < t <= T:
+                    total += amount * discount_factor(r, t) / discount_factor(r, start)
+            return total
+        T, start = np.broadcast_arrays(np.asarray(T, dtype = float), np.asarray(start, dtype = float))
+        total = np.zeros(T.shape)
+        start_factor = discount_factor(r, start)
+        for t, amount in zip(self.times, self.amounts):
+            # (not +=, since r can be an array that broadcasts to a bigger shape than T)
+            total = total + np.where((start < t) & (t <= T), amount * discount_factor(r, t) / start_factor, 0.0)
+        return total
+
+    def rate_exposure(self, T, r):
+        """
+        How much present_value(T, r) drops when every rate moves up by 1.00 (sum of time * amount * discount factor).
+        The Black-Scholes rho adds delta times this, since a higher rate also lowers the dividends' PV.
+        """
+        if isinstance(T, (int, float)):
+            return sum(t * amount * discount_factor(r, t) for t, amount in zip(self.times, self.amounts) if 0 < t <= T)
+        T = np.asarray(T, dtype = float)
+        total = np.zeros(T.shape)
+        for t, amount in zip(self.times, self.amounts):
+            total = total + np.where((0 < t) & (t <= T), t * amount * discount_factor(r, t), 0.0)
+        return total
+
+# Discount factor for a flat rate (number or array) or a DiscountCurve
+def discount_factor(r, T):
+    if isinstance(r, DiscountCurve):
+        return r.discount(T)
+    if isinstance(r, (int, float)) and isinstance(T, (int, float)):
+        return math.exp(-r * T)
+    return np.exp(-np.asarray(r) * np.asarray(T))
+
+# Turn (possibly curve/dividend schedule) inputs into the equivalent flat inputs for an option expiring at T:
+# the stock price minus the PV of the dividends before T, the zero rate to T and the dividend yield to T
+def flat_inputs(S, r, T, div_yield = 0.0, dividends = None):
+    if dividends is not None:
+        S = S - dividends.present_value(T, r)
+    if isinstance(r, DiscountCurve):
+        r = r.zero_rate(T)
+    if isinstance(div_yield, DiscountCurve):
+        div_yield = div_yield.zero_rate(T)
+    return S, r, div_yield
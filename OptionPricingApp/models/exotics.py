@@ -0,0 +1,197 @@
+from models import lazy_import
+from models.binomial import _backward_induction, _lattice_setup, _batch_inputs
+from models.curves import flat_inputs
+from models.monte_carlo import BARRIER_TYPES
+from models.profiling import profiled, section
+from models.surface import volatility
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Exotic options on the Binomial trees: any payoff, any exercise schedule and knock-in/knock-out barriers.
+
+binomial_price only knows vanilla calls and puts (chosen by the type string) with an American or European flag. Here a
+contract is split into three independent pieces:
+
+payoff -> what you get for exercising at stock price S. Vanilla(K, type), Digital(K, type) or any function that takes an
+          array of stock prices and returns an array of payoffs (e.g. lambda S: np.maximum(S - 100, 0) ** 2)
+exercise -> "european" (at expiration only), "american" (at every step) or a list of Bermudan exercise times (in years,
+            each one rounded to the nearest step of the tree)
+barrier -> Barrier(level, kind, rebate): knocked out (or in) as soon as the stock touches the level, checked at every step
+
+Everything runs through the same backwards induction as binomial_price_batch (_backward_induction in models/binomial.py),
+which hands the values at every level to a small adjust function. That function applies the exercise schedule and the
+barrier to a whole level at once with boolean masks (which nodes are past the barrier, which contracts can exercise at this
+step), so there are no Python loops over nodes. The vanilla functions don't use this hook, so they are exactly as fast
+as before.
+
+Knock-in barriers: every contract gets a second copy of its tree (stacked under the first one, so both go through the
+same batched induction). The first copy is the option after it has been knocked in (the plain option, with the exercise
+schedule); the second is the option before it has been knocked in, which is worth the rebate at expiration, and becomes
+the first copy wherever the stock touches the barrier. That works with early exercise too (where the in-out parity
+knock-in = vanilla - knock-out doesn't).
+
+Barriers are monitored at the steps of the tree, and the tree can only put the barrier between two of its node levels,
+so the price jumps around a little as the number of steps changes (more steps = closer to a continuously monitored barrier).
+"""
+
+
+class Vanilla:
+    """
+    Parameters:
+    K: strike price (in USD)
+    type: "Call" or "Put"
+    """
+
+    def __init__(self, K, type = "Call"):
+        self.K = float(K)
+        self.type = type
+        self.sign = 1.0 if type == "Call" else -1.0
+
+    def __repr__(self):
+        return f"Vanilla(K = {self.K}, type = {self.type!r})"
+
+    def __call__(self, S):
+        return np.maximum(self.sign * (S - self.K), 0.0)
+
+class Digital:
+    """
+    Parameters:
+    K: strike price (in USD)
+    type: "Call" (pays when S > K) or "Put" (pays when S < K)
+    cash: amount paid (cash-or-nothing)
+    asset: if True, pays the stock price instead of cash (asset-or-nothing)
+    """
+
+    def __init__(self, K, type = "Call", cash = 1.0, asset = False):
+        self.K = float(K)
+        self.type = type
+        self.sign = 1.0 if type == "Call" else -1.0
+        self.cash = float(cash)
+        self.asset = asset
+
+    def __repr__(self):
+        return f"Digital(K = {self.K}, type = {self.type!r}, cash = {self.cash}, asset = {self.asset})"
+
+    def __call__(self, S):
+        return np.where(self.sign * (S - self.K) > 0, S if self.asset else self.cash, 0.0)
+
+class Barrier:
+    """
+    Parameters:
+    level: barrier level (in USD)
+    kind: "up-and-out", "down-and-out", "up-and-in" or "down-and-in"
+    rebate: paid when a knock-out option is knocked out (right away), or at expiration when a knock-in option never was
+    """
+
+    def __init__(self, level, kind = "up-and-out", rebate = 0.0):
+        if kind not in BARRIER_TYPES:
+            raise ValueError(f"kind must be one of {BARRIER_TYPES}")
+        self.level = float(level)
+        self.kind = kind
+        self.rebate = float(rebate)
+
+    def __repr__(self):
+        return f"Barrier(level = {self.level}, kind = {self.kind!r}, rebate = {self.rebate})"
+
+    @property
+    def knock_in(self):
+        return self.kind.endswith("in")
+
+    # Boolean mask of the stock prices at or past the barrier
+    def touched(self, S):
+        return S >= self.level if self.kind.startswith("up") else S <= self.level
+
+# Boolean mask (contracts, steps) of the levels each contract can be exercised at before expiration (None for European)
+def _exercise_levels(exercise, T, steps):
+    if isinstance(exercise, str):
+        if exercise == "european":
+            return None
+        if exercise == "american":
+            return np.ones((T.size, steps), dtype = bool)
+        raise ValueError("exercise must be 'european', 'american' or a list of exercise times")
+    times = np.atleast_1d(np.asarray(exercise, dtype = float))
+    levels = np.rint(times[np.newaxis, :] / T[:, np.newaxis] * steps).astype(int)
+    allowed = np.zeros((T.size, steps + 1), dtype = bool)
+    rows = np.broadcast_to(np.arange(T.size)[:, np.newaxis], levels.shape)
+    inside = (times[np.newaxis, :] >= 0) & (levels <= steps)
+    allowed[rows[inside], levels[inside]] = True
+    # Exercising at expiration is just the payoff, which the tree starts from anyway
+    return allowed[:, :steps]
+
+# Define the exotic option pricing method
+@profiled
+def exotic_price(
+    S, r, T, sigma, steps, payoff,
+    exercise = "european",
+    barrier = None,
+    div_yield = 0.0,
+    lattice = "crr"
+):
+    """
+    Parameters:
+    S, r, T, sigma, div_yield: same as binomial_price_batch (numbers or arrays that broadcast together, r and div_yield can
+    be DiscountCurves and sigma a VolSurface, looked up at the payoff's strike)
+    steps: number of time steps
+    payoff: Vanilla, Digital or any function of an array of stock prices (see above)
+    exercise: "european", "american" or a list of Bermudan exercise times (in years from today)
+    barrier: Barrier (optional)
+    lattice: "crr", "tian", "lr" or "trinomial" (Leisen-Reimer centres the tree on the payoff's K, or on S for payoffs without one)
+
+    Returns the price (a float if every input was a number, otherwise an array with the broadcast shape of the inputs).
+    """
+
+    if steps < 1:
+        raise ValueError("steps must be >= 1")
+    if barrier is not None and not isinstance(barrier, Barrier):
+        raise TypeError("barrier must be a Barrier")
+
+    K = getattr(payoff, "K", None)
+    sigma = volatility(sigma, K if K is not None else S, T)
+    S, r, div_yield = flat_inputs(np.asarray(S, dtype = float), r, np.asarray(T, dtype = float), div_yield)
+    shape, (S, K, r, T, sigma, div_yield, _) = _batch_inputs(S, K if K is not None else S, r, T, sigma, div_yield, "Call")
+    if np.any(T <= 0) or np.any(sigma <= 0):
+        raise ValueError("exotic_price needs T > 0 and sigma > 0")
+
+    n = S.size
+    with section("exotic_price.payoff_setup"):
+        probs, terminal, level_prices, steps = _lattice_setup(
+            lattice, *(x[:, np.newaxis] for x in (S, K, r, T, sigma, div_yield)), steps
+        )
+        exercise_at = _exercise_levels(exercise, T, steps)
+        values = np.broadcast_to(np.asarray(payoff(terminal), dtype = float), terminal.shape)
+        if barrier is not None and barrier.knock_in:
+            # Stack the "not knocked in yet" copy under the plain option: it pays the rebate at expiration, unless the
+            # stock ends up past the barrier (then it was knocked in right at expiration)
+            pending = np.where(barrier.touched(terminal), values, barrier.rebate)
+            values = np.vstack([values, pending])
+            probs = [np.vstack([q, q]) for q in probs]
+        elif barrier is not None:
+            values = np.where(barrier.touched(terminal), barrier.rebate, values)
+        values = np.array(values, dtype = float, order = "F")
+
+    # Exercise schedule and barrier for the values at level i (the first n rows are the contracts themselves)
+    def adjust(i, now):
+        nodes = level_prices(i)
+        option = now[:n]
+        if exercise_at is not None:
+            rows = exercise_at[:, i]
+            if rows.all():
+                np.maximum(option, payoff(nodes), out = option)
+            elif rows.any():
+                np.copyto(option, np.maximum(option, payoff(nodes)), where = rows[:, np.newaxis])
+        if barrier is not None:
+            touched = barrier.touched(nodes)
+            if barrier.knock_in:
+                np.copyto(now[n:], option, where = touched)
+            else:
+                np.copyto(option, barrier.rebate, where = touched)
+
+    _backward_induction(values, probs, adjust = adjust)
+    # With a knock-in barrier the price is the "not knocked in yet" copy (if the stock is already past the barrier, the
+    # last adjust call copied the plain option into it)
+    prices = values[n:, 0] if barrier is not None and barrier.knock_in else values[:n, 0]
+    if shape == ():
+        return float(prices[0])
+    return prices.reshape(shape)
@@ -0,0 +1,260 @@
+from models import lazy_import
+from models.binomial import binomial_greeks
+from models.profiling import profiled, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Finite-difference (Crank-Nicolson) pricing of American and European options.
+
+A Binomial tree gives the price for ONE spot price per run. Solving the Black-Scholes PDE on a grid of stock prices
+instead gives the whole value vs spot curve in one go, and delta and gamma come straight from the differences between
+neighbouring grid points.
+
+The grid: stock prices S_i = i * dS for i = 0..space_steps (up to S_max, far enough above the strike that the option
+behaves like its boundary value there) and time_steps steps from expiration back to today. Each step solves
+(I - theta * dt * L) V_new = (I + (1 - theta) * dt * L) V_old, where L is the (tridiagonal) Black-Scholes operator
+and theta = 0.5 (Crank-Nicolson). The first two steps use theta = 1 (fully implicit, a.k.a. Rannacher smoothing), otherwise
+the kink in the payoff makes gamma wiggle around the strike.
+
+Early exercise (the value can never drop below the payoff):
+"penalty" -> add a huge penalty wherever the value falls below the payoff and re-solve until that set stops changing
+             (usually 2-3 tridiagonal solves per step)
+"psor" -> projected successive over-relaxation; sweeps the even nodes, then the odd nodes (red-black ordering, so each
+          half sweep is one vectorized NumPy operation), clipping to the payoff after every sweep
+
+Vega and rho need the PDE solved with bumped volatility and rate, so the base problem and the 4 bumped ones are stacked
+into ONE big tridiagonal system (the blocks just don't touch each other) and solved with a single LAPACK call per step.
+The matrices and work buffers are built once and reused for every time step.
+"""
+
+METHODS = ("penalty", "psor")
+
+
+# Build the tridiagonal Black-Scholes operator L (lower, diagonal, upper) for every problem in the batch
+def _operator(i, r, sigma, div_yield):
+    variance = 0.5 * sigma ** 2 * i ** 2
+    drift = 0.5 * (r - div_yield) * i
+    return variance - drift, -2 * variance - r, variance + drift
+
+# Pack the (batch, nodes) diagonals into the (3, batch * nodes) layout solve_banded expects
+def _banded(lower, diag, upper, out = None):
+    if out is None:
+        out = np.zeros((3, diag.size))
+    out[0, 1:] = upper.ravel()[:-1]
+    out[1] = diag.ravel()
+    out[2, :-1] = lower.ravel()[1:]
+    return out
+
+# Value on the upper edge of the grid (S_max) with tau years left
+def _upper_boundary(S_max, K, r, tau, div_yield, sign, american):
+    if sign < 0:
+        return np.zeros_like(r)
+    value = S_max * np.exp(-div_yield * tau) - K * np.exp(-r * tau)
+    return np.maximum(value, S_max - K) if american else value
+
+# Red-black projected SOR for the stacked tridiagonal systems (lower, diag, upper are (batch, nodes) arrays)
+def _psor(V, lower, diag, upper, rhs, payoff, omega, tol, max_iter):
+    # The last node is the boundary condition, every other node gets swept
+    V[:, -1] = rhs[:, -1]
+    # The neighbours of the even nodes are odd and vice versa, so each half sweep updates all of its nodes at once
+    # (node 0 has no left neighbour, index -1 wraps around but lower is 0 there anyway)
+    sweeps = [np.arange(start, V.shape[1] - 1, 2) for start in (0, 1)]
+    for iteration in range(1, max_iter + 1):
+        change = 0.0
+        for nodes in sweeps:
+            old = V[:, nodes]
+            gauss_seidel = (rhs[:, nodes] - lower[:, nodes] * V[:, nodes - 1] - upper[:, nodes] * V[:, nodes + 1]) / diag[:, nodes]
+            new = np.maximum(old + omega * (gauss_seidel - old), payoff[:, nodes])
+            change = max(change, np.abs(new - old).max())
+            V[:, nodes] = new
+        if change < tol:
+            break
+    return iteration
+
+# Define the method that solves the PDE and returns the value curves
+@profiled
+def fd_solve(
+    K, r, T, sigma,
+    type = "Put",
+    american = True,
+    div_yield = 0.0,
+    S_max = None,
+    space_steps = 400,
+    time_steps = 200,
+    method = "penalty",
+    omega = 1.2,
+    tol = 1e-8,
+    max_iter = 500
+):
+    """
+    Parameters:
+    K, r, T, sigma, div_yield: same as binomial_price, except that r and sigma can be arrays (one PDE per entry, all
+    solved together; the other inputs are shared)
+    type: "Call" or "Put"
+    american: True for early exercise
+    S_max: top of the stock price grid (default: far enough above the strike for the given volatility)
+    space_steps, time_steps: grid size
+    method: "penalty" or "psor" (see above, only used for American options)
+    omega, tol, max_iter: PSOR relaxation factor, stopping tolerance and iteration limit (tol is also the penalty tolerance)
+
+    Returns a dictionary with:
+    S -> the grid of stock prices
+    values -> option values today, shape (len(r), len(S))
+    previous -> option values one time step after today (for theta)
+    dt -> the time step
+    iterations -> total number of early exercise iterations (PSOR sweeps or penalty solves)
+    """
+
+    from scipy.linalg import solve_banded
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    if T <= 0 or np.any(np.asarray(sigma) <= 0):
+        raise ValueError("fd_solve needs T > 0 and sigma > 0")
+    if space_steps < 3 or time_steps < 2:
+        raise ValueError("space_steps must be >= 3 and time_steps >= 2")
+
+    r, sigma = np.broadcast_arrays(np.atleast_1d(np.asarray(r, dtype = float)), np.atleast_1d(np.asarray(sigma, dtype = float)))
+    column = (slice(None), np.newaxis)
+    sign = 1.0 if type == "Call" else -1.0
+    if S_max is None:
+        # About 5 standard deviations above the strike (and never closer than 2x the strike)
+        S_max = K * max(2.0, np.exp(5 * sigma.max() * np.sqrt(T)))
+
+    i = np.arange(space_steps + 1, dtype = float)
+    S = i * (S_max / space_steps)
+    dt = T / time_steps
+    payoff = np.broadcast_to(np.maximum(sign * (S - K), 0.0), (r.size, S.size))
+    lower, diag, upper = _operator(i, r[column], sigma[column], div_yield)
+
+    # Left hand side matrices for the implicit (theta = 1) and Crank-Nicolson (theta = 0.5) steps, built once.
+    # The last row of each block is the boundary condition V = boundary value (so it doesn't touch the next block).
+    def lhs(theta):
+        L, D, U = -theta * dt * lower, 1.0 - theta * dt * diag, -theta * dt * upper
+        L[:, -1], D[:, -1], U[:, -1] = 0.0, 1.0, 0.0
+        return L, D, U
+    implicit, crank_nicolson = lhs(1.0), lhs(0.5)
+    banded = {1.0: _banded(*implicit), 0.5: _banded(*crank_nicolson)}
+
+    # Work buffers reused for every time step (PSOR works on V in place, so it needs neither the copy of the banded matrix
+    # the solver overwrites nor the penalty buffers)
+    V = np.array(payoff)
+    rhs = np.empty_like(V)
+    penalty_solve = american and method == "penalty"
+    work = np.empty_like(banded[0.5]) if not american or penalty_solve else None
+    if penalty_solve:
+        penalized = np.empty_like(V)
+        active, new_active = np.empty(V.shape, dtype = bool), np.empty(V.shape, dtype = bool)
+    count(
+        "array_bytes",
+        (3 if penalty_solve else 2) * V.nbytes + (0 if work is None else work.nbytes) + 2 * banded[0.5].nbytes + 9 * lower.nbytes
+    )
+    count("pde_steps", time_steps)
+    previous = None
+    iterations = 0
+    penalty = 1.0 / tol
+
+    for step in range(time_steps):
+        theta = 1.0 if step < 2 else 0.5
+        tau = (step + 1) * dt
+        if step == time_steps - 1:
+            previous = V.copy()
+
+        # Right hand side: V + (1 - theta) * dt * L V
+        np.multiply(V, 1.0 + (1.0 - theta) * dt * diag, out = rhs)
+        if theta < 1.0:
+            rhs[:, 1:] += (1.0 - theta) * dt * lower[:, 1:] * V[:, :-1]
+            rhs[:, :-1] += (1.0 - theta) * dt * upper[:, :-1] * V[:, 1:]
+        rhs[:, -1] = _upper_boundary(S[-1], K, r, tau, div_yield, sign, american)
+
+        if not american:
+            work[:] = banded[theta]
+            V[:] = solve_banded((1, 1), work, rhs.ravel(), overwrite_ab = True, check_finite = False).reshape(V.shape)
+        elif method == "psor":
+            iterations += _psor(V, *(implicit if theta == 1.0 else crank_nicolson), rhs, payoff, omega, tol, max_iter)
+        else:
+            # Penalty iteration: exercised nodes get a huge diagonal entry that pins them to the payoff
+            # (everything goes through the preallocated buffers, only the solver's result is a new array)
+            np.less_equal(V, payoff, out = active)
+            for _ in range(max_iter):
+                work[:] = banded[theta]
+                # penalty on the diagonal of the exercised nodes, and rhs + penalty * payoff on their right hand side
+                np.multiply(active, penalty, out = penalized)
+                np.add(work[1], penalized.reshape(-1), out = work[1])
+                np.multiply(penalized, payoff, out = penalized)
+                np.add(penalized, rhs, out = penalized)
+                V[:] = solve_banded(
+                    (1, 1), work, penalized.reshape(-1), overwrite_ab = True, overwrite_b = True, check_finite = False
+                ).reshape(V.shape)
+                iterations += 1
+                np.less(V, payoff, out = new_active)
+                if np.array_equal(new_active, active):
+                    break
+                active, new_active = new_active, active
+            np.maximum(V, payoff, out = V)
+
+    return {"S": S, "values": V, "previous": previous, "dt": dt, "iterations": iterations}
+
+# Define the method that returns the price and Greeks for a whole range of spot prices from one solve
+@profiled
+def fd_greeks(
+    S, K, r, T, sigma,
+    type = "Put",
+    american = True,
+    div_yield = 0.0,
+    space_steps = 400,
+    time_steps = 200,
+    method = "penalty",
+    vol_bump = 0.01,
+    rate_bump = 1e-4
+):
+    """
+    Parameters:
+    S: stock price(s) to report (a number or an array, e.g. the x-axis of a Greeks chart); the other inputs are numbers
+    K, r, T, sigma, type, american, div_yield: same as binomial_price
+    space_steps, time_steps, method: passed on to fd_solve
+    vol_bump, rate_bump: bump sizes used for vega and rho
+
+    Returns a dictionary with "price", "delta", "gamma", "vega", "theta" and "rho" at each S (floats if S was a number).
+    Expired or zero volatility options have no PDE to solve, so they get binomial_greeks' values.
+    """
+
+    S = np.asarray(S, dtype = float)
+    names = ["price", "delta", "gamma", "vega", "theta", "rho"]
+    if T <= 0 or sigma <= 0:
+        return binomial_greeks(S, K, r, T, sigma, 2, type, american, div_yield)
+
+    # The grid has to cover every requested spot price (with room to spare for the boundary)
+    S_max = max(K * max(2.0, np.exp(5 * sigma * np.sqrt(T))), 1.5 * S.max())
+    # ONE solve for the base problem and the bumped ones: [base, sigma + h, sigma - h, r + h, r - h]
+    sigma_down = max(sigma - vol_bump, 0.5 * sigma)
+    solution = fd_solve(
+        K,
+        np.array([r, r, r, r + rate_bump, r - rate_bump]),
+        T,
+        np.array([sigma, sigma + vol_bump, sigma_down, sigma, sigma]),
+        type, american, div_yield, S_max, space_steps, time_steps, method
+    )
+    grid, values = solution["S"], solution["values"]
+    dS = grid[1] - grid[0]
+
+    # Delta and gamma from central differences on the grid, then everything is interpolated to the requested spots
+    V = values[0]
+    delta = np.gradient(V, dS)
+    gamma = np.zeros_like(V)
+    gamma[1:-1] = (V[2:] - 2 * V[1:-1] + V[:-2]) / dS ** 2
+    gamma[0], gamma[-1] = gamma[1], gamma[-2]
+    curves = {
+        "price": V,
+        "delta": delta,
+        "gamma": gamma,
+        "vega": (values[1] - values[2]) / (sigma + vol_bump - sigma_down),
+        "theta": (solution["previous"][0] - V) / solution["dt"],
+        "rho": (values[3] - values[4]) / (2 * rate_bump),
+    }
+    result = {name: np.interp(S, grid, curves[name]) for name in names}
+    if S.ndim == 0:
+        return {name: float(values) for name, values in result.items()}
+    return result
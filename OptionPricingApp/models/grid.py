@@ -0,0 +1,208 @@
+import json
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_greeks
+from models.profiling import profiled
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Precomputed price/Greeks grid with fast interpolation lookups.
+
+Computing prices on demand is fine for Black-Scholes, but American (Binomial) prices need a whole tree each. Instead, we
+can price a grid ONCE and then interpolate. The trick that keeps the grid small is to use normalized coordinates:
+x = log(S / K) (log-moneyness), v = sigma * sqrt(T) (total volatility) and w = r * T (rate-time).
+Without dividends, price / K only depends on (x, v, w), for both the Black-Scholes formula and the American Binomial price,
+so one 3-D table covers every strike, expiry and rate.
+
+The table stores five fields: f = price / K and its derivatives f_x, f_xx, f_v and f_w. The Greeks follow from the chain rule:
+delta = K * f_x / S
+gamma = K * (f_xx - f_x) / S^2
+vega = K * f_v * sqrt(T)
+rho = K * f_w * T
+theta = -K * (f_v * sigma / (2 * sqrt(T)) + f_w * r)
+
+Lookups are multilinear (vectorized, only touches the 8 corners of each cell, so it works straight off a memory-mapped file)
+or cubic (scipy's RegularGridInterpolator). The linear lookup can also return an error bound for the price: along each axis,
+linear interpolation is off by at most 1/8 * h^2 * |second derivative|, and h^2 * second derivative is estimated from the
+second differences of the table around the cell. It is an estimate (it ignores cross terms), so treat it as a guide: the
+error is largest for small total volatility, where the payoff kink is sharp, so add points there if you need accuracy.
+
+Grids are saved as a .npy file (the table, loaded with mmap_mode="r" so startup doesn't read it) next to a small .json file
+(the axes and settings).
+"""
+
+FIELDS = ["f", "f_x", "f_xx", "f_v", "f_w"]
+# Default axes of PriceGrid.build as (first, last, number of points)
+X_AXIS = (-1.0, 1.0, 81)
+V_AXIS = (0.05, 1.5, 59)
+W_AXIS = (0.0, 0.3, 7)
+
+
+# Compute the five fields at the points of a mesh (canonical contract: K = 1, T = 1, so S = e^x, sigma = v and r = w)
+def _compute_fields(x, v, w, type, model, steps):
+    S = np.exp(x)
+    if model == "black_scholes":
+        out = batch_price(S, 1.0, w, 1.0, v, type)
+    else:
+        out = binomial_greeks(S, 1.0, w, 1.0, v, steps, type, american = True)
+    f_x = out["delta"] * S
+    return np.stack([out["price"], f_x, out["gamma"] * S ** 2 + f_x, out["vega"], out["rho"]])
+
+class PriceGrid:
+    """
+    Parameters:
+    values: array of shape (5, len(x_axis), len(v_axis), len(w_axis)) holding the fields f, f_x, f_xx, f_v, f_w
+    x_axis, v_axis, w_axis: increasing grid coordinates (log-moneyness, total volatility and rate-time)
+    meta: dictionary describing how the grid was built (model, option type, steps)
+    """
+
+    def __init__(self, values, x_axis, v_axis, w_axis, meta = None):
+        self.values = values
+        self.axes = [np.asarray(x_axis, dtype = float), np.asarray(v_axis, dtype = float), np.asarray(w_axis, dtype = float)]
+        self.meta = meta or {}
+        self._cubic = None
+
+    @classmethod
+    def build(
+        cls,
+        type = "Call",
+        model = "black_scholes",
+        x_axis = None,
+        v_axis = None,
+        w_axis = None,
+        steps = 200
+    ):
+        """
+        type: "Call" or "Put"
+        model: "black_scholes" (European) or "binomial" (American, priced with binomial_greeks)
+        x_axis, v_axis, w_axis: grid coordinates (default: evenly spaced as in X_AXIS, V_AXIS and W_AXIS)
+        steps: number of Binomial steps (only for the binomial model)
+        """
+        if model not in ("black_scholes", "binomial"):
+            raise ValueError("model must be 'black_scholes' or 'binomial'")
+        # (the defaults are built here rather than in the signature, so importing this module doesn't load NumPy)
+        x_axis = np.linspace(*X_AXIS) if x_axis is None else x_axis
+        v_axis = np.linspace(*V_AXIS) if v_axis is None else v_axis
+        w_axis = np.linspace(*W_AXIS) if w_axis is None else w_axis
+        x, v, w = np.meshgrid(x_axis, v_axis, w_axis, indexing = "ij")
+        values = _compute_fields(x, v, w, type, model, steps)
+        return cls(values, x_axis, v_axis, w_axis, {"type": type, "model": model, "steps": steps})
+
+    def save(self, path):
+        # path is the .npy file; the axes and settings go next to it in a .json file
+        path = str(path)
+        np.save(path, np.ascontiguousarray(self.values))
+        with open(_meta_path(path), "w") as f:
+            json.dump({"axes": [axis.tolist() for axis in self.axes], "meta": self.meta}, f)
+
+    @classmethod
+    def load(cls, path):
+        path = str(path)
+        with open(_meta_path(path)) as f:
+            stored = json.load(f)
+        values = np.load(path if path.endswith(".npy") else path + ".npy", mmap_mode = "r")
+        return cls(values, *stored["axes"], stored["meta"])
+
+    # Turn contract parameters into grid coordinates (NaN for anything the grid can't represent)
+    def _coordinates(self, S, K, r, T, sigma):
+        S, K, r, T, sigma = np.broadcast_arrays(*(np.asarray(a, dtype = float) for a in (S, K, r, T, sigma)))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            x = np.log(S / K)
+            v = sigma * np.sqrt(T)
+            w = r * T
+        inside = (T > 0) & (sigma > 0)
+        for axis, coordinate in zip(self.axes, (x, v, w)):
+            inside &= (coordinate >= axis[0]) & (coordinate <= axis[-1])
+        return (S, K, r, T, sigma), (x, v, w), inside
+
+    def _interpolate_linear(self, coordinates, inside, with_error):
+        lower, weights = [], []
+        for axis, coordinate in zip(self.axes, coordinates):
+            c = np.where(inside, coordinate, axis[0])
+            if axis.size == 1:
+                lower.append(np.zeros(c.shape, dtype = int))
+                weights.append(np.zeros(c.shape))
+                continue
+            i = np.clip(np.searchsorted(axis, c, side = "right") - 1, 0, axis.size - 2)
+            lower.append(i)
+            weights.append((c - axis[i]) / (axis[i + 1] - axis[i]))
+
+        fields = np.zeros((self.values.shape[0],) + inside.shape)
+        # Add up the 8 corners of each cell, weighted by how close the point is to each of them
+        for corner in range(8):
+            index, weight = [], 1.0
+            for axis_number in range(3):
+                upper = (corner >> axis_number) & 1
+                n = self.axes[axis_number].size
+                index.append(np.minimum(lower[axis_number] + upper, n - 1))
+                weight = weight * (weights[axis_number] if upper else 1.0 - weights[axis_number])
+            fields += weight * self.values[(slice(None), *index)]
+
+        error = None
+        if with_error:
+            # Second differences of f along each axis around the lower corner of the cell
+            error = np.zeros(inside.shape)
+            f = self.values[0]
+            for axis_number in range(3):
+                n = self.axes[axis_number].size
+                if n < 3:
+                    continue
+                # Use the larger of the second differences centred on either end of the cell (more conservative)
+                largest = 0.0
+                for centre in (lower[axis_number], lower[axis_number] + 1):
+                    middle = np.clip(centre, 1, n - 2)
+                    index = list(lower)
+                    neighbours = []
+                    for offset in (-1, 0, 1):
+                        index[axis_number] = middle + offset
+                        neighbours.append(f[tuple(index)])
+                    largest = np.maximum(largest, np.abs(neighbours[0] - 2 * neighbours[1] + neighbours[2]))
+                error += largest / 8
+        return fields, error
+
+    def _interpolate_cubic(self, coordinates, inside):
+        from scipy.interpolate import RegularGridInterpolator
+
+        if self._cubic is None:
+            self._cubic = [RegularGridInterpolator(self.axes, np.asarray(field), method = "cubic") for field in self.values]
+        points = np.stack([np.where(inside, c, axis[0]) for c, axis in zip(coordinates, self.axes)], axis = -1)
+        return np.stack([interpolator(points) for interpolator in self._cubic])
+
+    @profiled
+    def lookup(self, S, K, r, T, sigma, method = "linear", return_error = False):
+        """
+        Parameters (arrays that broadcast together, same meaning as in batch_price):
+        method: "linear" or "cubic"
+        return_error: if True, also return "price_error", an estimated bound on the price interpolation error (linear only)
+
+        Returns a dictionary with "price", "delta", "gamma", "vega", "theta" and "rho" (NaN outside of the grid).
+        """
+        (S, K, r, T, sigma), coordinates, inside = self._coordinates(S, K, r, T, sigma)
+        if method == "linear":
+            fields, error = self._interpolate_linear(coordinates, inside, return_error)
+        elif method == "cubic":
+            fields, error = self._interpolate_cubic(coordinates, inside), None
+        else:
+            raise ValueError("method must be 'linear' or 'cubic'")
+
+        f, f_x, f_xx, f_v, f_w = fields
+        sqrt_T = np.sqrt(np.where(inside, T, 1.0))
+        result = {
+            "price": K * f,
+            "delta": K * f_x / S,
+            "gamma": K * (f_xx - f_x) / S ** 2,
+            "vega": K * f_v * sqrt_T,
+            "theta": -K * (f_v * sigma / (2 * sqrt_T) + f_w * r),
+            "rho": K * f_w * T,
+        }
+        if return_error and error is not None:
+            result["price_error"] = K * error
+        for name in result:
+            result[name] = np.where(inside, result[name], np.nan)
+        return result
+
+def _meta_path(path):
+    return (path[:-4] if path.endswith(".npy") else path) + ".json"
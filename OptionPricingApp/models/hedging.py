@@ -0,0 +1,279 @@
+import argparse
+import sys
+import time
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_greeks
+from models.profiling import profiled, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Delta-hedging backtests: how well does hedging with a model's deltas actually work along (simulated or historical) price paths?
+
+The book holds `quantity` options (negative = we sold them) bought or sold at the model price on the first date, and
+hedges them with -quantity * delta shares, rebalanced every `rebalance_every` dates. Cash earns the risk-free rate, the
+shares earn the dividend yield, and every trade can pay a transaction cost (a fraction of the traded notional). At
+expiration the options pay off and the shares are sold. What is left is the hedging P&L of each path (in USD at expiration).
+With a perfect model and continuous rebalancing it would be 0 on every path; the spread around 0 is the hedge error.
+
+American options (binomial model with american = True) are exercised as soon as the payoff is worth at least the model
+price; the book then settles the payoff and unwinds the hedge on that path.
+
+Everything is vectorized across paths: the backtest loops over the dates only, and prices every path at once on each date.
+Black-Scholes deltas come from batch_price (greeks() for a whole array of spots). For the Binomial model a tree per path and
+date would be far too slow, so on each date the trees are priced on a grid of DELTA_GRID_POINTS spot prices covering every
+path (in one batched binomial_greeks call) and each path's price and delta are interpolated from that grid.
+
+Paths come from simulate_paths (geometric Brownian motion, optionally with a real-world drift different from r) or
+load_paths (overlapping windows of a historical price series from a local CSV file).
+
+Usage (from the OptionPricingApp folder):
+python -m models.hedging --paths 5000 --steps 252 --model binomial --realized-vol 0.25
+python -m models.hedging --csv prices.csv --steps 63 --rebalance-every 1 --cost 0.0005
+"""
+
+MODELS = ("black_scholes", "binomial")
+# Number of spot prices the Binomial trees are priced on at each rebalance date
+DELTA_GRID_POINTS = 201
+PERCENTILES = (1, 5, 50, 95, 99)
+
+
+@profiled
+def simulate_paths(S, r, T, sigma, n_paths = 10_000, n_steps = 252, mu = None, div_yield = 0.0, seed = None, antithetic = False):
+    """
+    Parameters:
+    S, r, T, sigma, div_yield: same as the Black Scholes Model (sigma here is the realized volatility of the paths)
+    n_paths: number of paths
+    n_steps: number of time steps (the paths have n_steps + 1 prices, today included)
+    mu: real-world drift (None for the risk-free rate)
+    seed: seed for reproducible paths
+    antithetic: use every random draw Z also as -Z (half the paths mirror the other half)
+
+    Returns an array of shape (n_paths, n_steps + 1).
+    """
+    if n_paths < 1 or n_steps < 1:
+        raise ValueError("n_paths and n_steps must be >= 1")
+    rng = np.random.default_rng(seed)
+    dt = T / n_steps
+    mu = r if mu is None else mu
+
+    n_draws = (n_paths + 1) // 2 if antithetic else n_paths
+    Z = rng.standard_normal((n_draws, n_steps))
+    if antithetic:
+        Z = np.concatenate([Z, -Z])[:n_paths]
+
+    # Log price paths built in place (one row per path)
+    paths = np.empty((n_paths, n_steps + 1))
+    paths[:, 0] = 0.0
+    np.cumsum((mu - div_yield - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * Z, axis = 1, out = paths[:, 1:])
+    paths += np.log(S)
+    return np.exp(paths, out = paths)
+
+def load_paths(path, n_steps, S = None, column = None, stride = 1):
+    """
+    Parameters:
+    path: CSV file with a price series (one row per date, oldest first)
+    n_steps: number of steps per path (each path is a window of n_steps + 1 consecutive prices)
+    S: rescale every window to start at this price (None keeps the historical prices)
+    column: name of the price column (default: a column called "close"/"Close", or else the last numeric column)
+    stride: number of dates between the starts of consecutive windows (1 gives overlapping windows)
+
+    Returns an array of shape (n_paths, n_steps + 1).
+    """
+    import pandas as pd
+
+    frame = pd.read_csv(path)
+    if column is None:
+        names = {name.lower(): name for name in frame.columns}
+        numeric = frame.select_dtypes("number").columns
+        if "close" in names:
+            column = names["close"]
+        elif len(numeric):
+            column = numeric[-1]
+        else:
+            raise ValueError(f"{path} has no numeric price column")
+    prices = frame[column].dropna().to_numpy(dtype = float)
+    if prices.size < n_steps + 1:
+        raise ValueError(f"{path} has {prices.size} prices, need at least n_steps + 1 = {n_steps + 1}")
+    if np.any(prices <= 0):
+        raise ValueError("prices must be positive")
+
+    # Every window of n_steps + 1 consecutive prices is one path (a view, copied below when it gets rescaled)
+    paths = np.lib.stride_tricks.sliding_window_view(prices, n_steps + 1)[::stride]
+    if S is not None:
+        return paths / paths[:, :1] * S
+    return np.array(paths)
+
+# Model price and delta of every path on one date (tau years before expiration)
+def _hedge_values(S, K, r, tau, sigma, type, model, steps, american, div_yield):
+    if model == "black_scholes" or tau <= 0:
+        out = batch_price(S, K, r, tau, sigma, type, div_yield)
+        return out["price"], out["delta"]
+    if S.size <= DELTA_GRID_POINTS:
+        out = binomial_greeks(S, K, r, tau, sigma, steps, type, american, div_yield)
+        return out["price"], out["delta"]
+    # One batch of trees on a grid covering today's spot prices (evenly spaced in log price), interpolated to each path
+    grid = np.geomspace(S.min(), S.max(), DELTA_GRID_POINTS) if S.max() > S.min() else S[:1]
+    out = binomial_greeks(grid, K, r, tau, sigma, steps, type, american, div_yield)
+    return np.interp(S, grid, out["price"]), np.interp(S, grid, out["delta"])
+
+# Define the hedging backtest
+@profiled
+def hedge_backtest(
+    paths, K, r, T, sigma,
+    type = "Call",
+    quantity = -1.0,
+    model = "black_scholes",
+    steps = 100,
+    american = False,
+    div_yield = 0.0,
+    rebalance_every = 1,
+    transaction_cost = 0.0
+):
+    """
+    Parameters:
+    paths: stock price paths, shape (n_paths, n_dates) (from simulate_paths or load_paths); the dates are evenly spaced
+    from today (first column) to expiration (last column)
+    K, r, T, div_yield: same as the Black Scholes Model
+    sigma: volatility the model prices and hedges with (compare with the realized volatility of the paths)
+    type: either "Call" or "Put"
+    quantity: number of options held (negative for a short position, the default is one option sold)
+    model: "black_scholes" or "binomial"
+    steps, american: Binomial steps and early exercise (binomial model only)
+    rebalance_every: rebalance the hedge every this many dates
+    transaction_cost: cost of each trade as a fraction of the traded notional (e.g. 0.0005 for 5 basis points)
+
+    Returns a dictionary with:
+    pnl -> hedging P&L of each path (USD at expiration)
+    premium -> model price of the option on the first date (mean over the paths)
+    mean, std -> mean and standard deviation of the P&L
+    percentiles -> {1, 5, 50, 95, 99: P&L percentile}
+    hedge_error -> standard deviation of the P&L relative to the premium (of the whole position)
+    exercised -> fraction of the paths where the option was exercised early
+    turnover -> mean traded notional per path (USD)
+    rebalances, n_paths, elapsed, paths_per_sec
+    """
+
+    if model not in MODELS:
+        raise ValueError(f"model must be one of {MODELS}")
+    if T <= 0 or sigma <= 0:
+        raise ValueError("hedge_backtest needs T > 0 and sigma > 0")
+    if rebalance_every < 1:
+        raise ValueError("rebalance_every must be >= 1")
+    paths = np.atleast_2d(np.asarray(paths, dtype = float))
+    n_paths, n_dates = paths.shape
+    if n_dates < 2:
+        raise ValueError("paths need at least 2 dates (today and expiration)")
+
+    start = time.perf_counter()
+    sign = 1.0 if type == "Call" else -1.0
+    american = american and model == "binomial"
+    dt = T / (n_dates - 1)
+    growth = np.exp(r * dt)
+    carry = np.exp(div_yield * dt) - 1.0
+
+    holdings = np.zeros(n_paths)
+    cash = np.zeros(n_paths)
+    turnover = np.zeros(n_paths)
+    alive = np.ones(n_paths, dtype = bool)
+    rebalances = 0
+
+    for j in range(n_dates - 1):
+        S = paths[:, j]
+        if j > 0:
+            # Interest on the cash and dividends on the shares held since the last date
+            cash *= growth
+            cash += holdings * S * carry
+        if j % rebalance_every:
+            continue
+
+        price, delta = _hedge_values(S, K, r, T - j * dt, sigma, type, model, steps, american, div_yield)
+        if j == 0:
+            # The options are bought (or sold) at the model price
+            premium = price
+            cash -= quantity * price
+        if american:
+            # Exercised as soon as the payoff is worth the model price: settle the payoff and unwind the hedge
+            payoff = np.maximum(sign * (S - K), 0.0)
+            exercise = alive & (payoff > 0) & (payoff >= price - 1e-10)
+            if exercise.any():
+                cash[exercise] += quantity * payoff[exercise]
+                alive &= ~exercise
+
+        # Rebalance to -quantity * delta shares (0 once the option is gone)
+        target = np.where(alive, -quantity * delta, 0.0)
+        traded = np.abs(target - holdings) * S
+        cash -= (target - holdings) * S + transaction_cost * traded
+        turnover += traded
+        holdings = target
+        rebalances += 1
+
+    # Expiration: the options still alive pay off and the shares are sold
+    S = paths[:, -1]
+    cash *= growth
+    cash += holdings * S * carry
+    cash += np.where(alive, quantity * np.maximum(sign * (S - K), 0.0), 0.0)
+    cash += holdings * S - transaction_cost * np.abs(holdings) * S
+    turnover += np.abs(holdings) * S
+    count("hedge_path_dates", n_paths * rebalances)
+
+    pnl = cash
+    elapsed = time.perf_counter() - start
+    premium_value = float(np.mean(premium))
+    std = float(np.std(pnl, ddof = 1)) if n_paths > 1 else 0.0
+    return {
+        "pnl": pnl,
+        "premium": premium_value,
+        "mean": float(np.mean(pnl)),
+        "std": std,
+        "percentiles": dict(zip(PERCENTILES, (float(p) for p in np.percentile(pnl, PERCENTILES)))),
+        "hedge_error": std / abs(quantity * premium_value) if premium_value > 0 else float("nan"),
+        "exercised": float(np.mean(~alive)),
+        "turnover": float(np.mean(turnover)),
+        "rebalances": rebalances,
+        "n_paths": n_paths,
+        "elapsed": elapsed,
+        "paths_per_sec": n_paths / elapsed,
+    }
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Backtest a delta hedge along simulated or historical price paths.")
+    parser.add_argument("--S", type = float, default = 100.0, help = "starting stock price (historical windows are rescaled to it)")
+    parser.add_argument("--K", type = float, default = 100.0, help = "strike price")
+    parser.add_argument("--r", type = float, default = 0.01, help = "risk-free rate")
+    parser.add_argument("--T", type = float, default = 1.0, help = "time to expiration in years")
+    parser.add_argument("--sigma", type = float, default = 0.2, help = "volatility the model hedges with")
+    parser.add_argument("--realized-vol", type = float, help = "volatility of the simulated paths (default: --sigma)")
+    parser.add_argument("--type", default = "Call", choices = ["Call", "Put"])
+    parser.add_argument("--model", default = "black_scholes", choices = MODELS)
+    parser.add_argument("--tree-steps", type = int, default = 100, help = "Binomial steps")
+    parser.add_argument("--american", action = "store_true", help = "American option (binomial model only)")
+    parser.add_argument("--paths", type = int, default = 5000, help = "number of simulated paths")
+    parser.add_argument("--steps", type = int, default = 252, help = "dates per path (after today)")
+    parser.add_argument("--csv", help = "historical price series to build the paths from instead of simulating them")
+    parser.add_argument("--rebalance-every", type = int, default = 1, help = "dates between rebalances")
+    parser.add_argument("--cost", type = float, default = 0.0, help = "transaction cost as a fraction of the traded notional")
+    parser.add_argument("--seed", type = int, help = "seed for the simulated paths")
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        paths = load_paths(args.csv, args.steps, args.S)
+    else:
+        realized = args.realized_vol if args.realized_vol is not None else args.sigma
+        paths = simulate_paths(args.S, args.r, args.T, realized, args.paths, args.steps, seed = args.seed)
+    result = hedge_backtest(
+        paths, args.K, args.r, args.T, args.sigma, args.type, model = args.model, steps = args.tree_steps,
+        american = args.american, rebalance_every = args.rebalance_every, transaction_cost = args.cost
+    )
+    print(f"{result['n_paths']} paths x {result['rebalances']} rebalances in {result['elapsed']:.2f} s")
+    print(f"premium {result['premium']:.4f}, P&L mean {result['mean']:.4f}, std {result['std']:.4f}, hedge error {result['hedge_error']:.2%}")
+    print("percentiles: " + ", ".join(f"{p}%: {value:.4f}" for p, value in result["percentiles"].items()))
+    if args.american:
+        print(f"exercised early on {result['exercised']:.1%} of the paths")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_price_batch
+from models.profiling import profiled
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Implied volatility: going from a market price back to the volatility that produces it (the reverse of call_price/put_price).
+
+There is no formula for this, so we solve price(sigma) = market price numerically for a whole array of quotes at once.
+Every quote gets a vectorized Newton step (sigma -= (price - quote) / vega), but we also keep a bracket [lo, hi] around
+the answer for each quote. Whenever vega is tiny (deep in/out of the money or close to expiry) or the Newton step would
+jump outside of the bracket, that quote falls back to a bisection step instead, so it can never blow up.
+
+Both solvers return a dictionary with:
+sigma -> the implied volatilities (NaN where the quote is outside of the no-arbitrage bounds)
+converged -> boolean mask of the quotes whose model price got within tol of the market price (a quote whose bracket
+             collapsed without getting there, e.g. because its vol is above SIGMA_HIGH, is NOT converged)
+iterations -> number of iterations each quote needed
+"""
+
+# Volatilities are searched for within these bounds
+SIGMA_LOW = 1e-4
+SIGMA_HIGH = 5.0
+# Below this vega, a Newton step is not trusted and we bisect instead
+VEGA_FLOOR = 1e-8
+# A quote stops once its bracket is narrower than this (in vol), whether or not its price matched
+SIGMA_TOL = 1e-12
+
+
+# Core solver shared by the Black-Scholes and Binomial versions.
+# price_and_vega(index, sigma) must return the model prices and vegas for the quotes selected by index.
+def _solve(target, sigma0, valid, price_and_vega, tol, max_iter):
+    n = target.size
+    sigma = np.where(valid, sigma0, np.nan)
+    lo = np.full(n, SIGMA_LOW)
+    hi = np.full(n, SIGMA_HIGH)
+    converged = np.zeros(n, dtype = bool)
+    iterations = np.zeros(n, dtype = int)
+
+    active = np.flatnonzero(valid)
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        sig = sigma[active]
+        price, vega = price_and_vega(active, sig)
+        diff = price - target[active]
+        iterations[active] += 1
+
+        # Shrink the bracket (price is increasing in sigma, so too expensive means sigma is too high)
+        too_high = diff > 0
+        hi[active] = np.where(too_high, sig, hi[active])
+        lo[active] = np.where(too_high, lo[active], sig)
+
+        # Newton step where we can trust it, bisection everywhere else
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            newton = sig - diff / vega
+        bisect = 0.5 * (lo[active] + hi[active])
+        use_newton = (vega > VEGA_FLOOR) & (newton > lo[active]) & (newton < hi[active])
+        new_sigma = np.where(use_newton, newton, bisect)
+
+        # A quote is done once its price matches, and gives up once the bracket has collapsed without a match (tol is a
+        # price, SIGMA_TOL a vol)
+        matched = np.abs(diff) < tol
+        done = matched | (hi[active] - lo[active] < SIGMA_TOL)
+        converged[active[matched]] = True
+        sigma[active[~done]] = new_sigma[~done]
+        active = active[~done]
+
+    return {"sigma": sigma, "converged": converged, "iterations": iterations}
+
+# Initial guess (Brenner-Subrahmanyam for at the money quotes, plus a moneyness term for the others)
+def _initial_guess(price, S, K, r, T):
+    T_safe = np.where(T > 0, T, 1.0)
+    guess = np.sqrt(2 * np.pi / T_safe) * price / S + np.sqrt(2 * np.abs(np.log(S / K) + r * T_safe) / T_safe)
+    return np.clip(guess, 0.05, 2.0)
+
+def _prepare(price, S, K, r, T, type):
+    price, S, K, r, T, type = np.broadcast_arrays(
+        np.asarray(price, dtype = float), np.asarray(S, dtype = float), np.asarray(K, dtype = float),
+        np.asarray(r, dtype = float), np.asarray(T, dtype = float), np.asarray(type)
+    )
+    return price.shape, [x.ravel() for x in (price, S, K, r, T, type)]
+
+def _reshape(result, shape):
+    return {name: values.reshape(shape) for name, values in result.items()}
+
+# Define the method for Black-Scholes implied volatility (European options)
+@profiled
+def implied_vol(price, S, K, r, T, type = "Call", tol = 1e-8, max_iter = 100):
+    """
+    Parameters (any of these can be a NumPy array, as long as they broadcast together):
+    price: market price of the option (in USD)
+    S: current stock price (in USD)
+    K: strike price (in USD)
+    r: risk-free rate (as a decimal, not a percentage)
+    T: time to expiration (in years)
+    type: either "Call" or "Put", or an array of them
+    tol: how close (in USD) the model price has to get to the market price
+    max_iter: maximum number of iterations per quote
+    """
+
+    shape, (price, S, K, r, T, type) = _prepare(price, S, K, r, T, type)
+    is_call = type == "Call"
+
+    # Quotes outside of the no-arbitrage bounds have no implied volatility
+    disc_K = K * np.exp(-r * T)
+    lower = np.where(is_call, np.maximum(S - disc_K, 0), np.maximum(disc_K - S, 0))
+    upper = np.where(is_call, S, disc_K)
+    valid = (T > 0) & (price > lower) & (price < upper)
+
+    def price_and_vega(index, sigma):
+        out = batch_price(S[index], K[index], r[index], T[index], sigma, type[index])
+        return out["price"], out["vega"]
+
+    result = _solve(price, _initial_guess(price, S, K, r, T), valid, price_and_vega, tol, max_iter)
+    return _reshape(result, shape)
+
+# Define the method for American implied volatility (using the Binomial model)
+@profiled
+def implied_vol_american(price, S, K, r, T, steps = 200, type = "Put", div_yield = 0.0, tol = 1e-6, max_iter = 50, bump = 1e-4):
+    """
+    Same parameters as implied_vol, plus the Binomial model parameters:
+    steps: number of time steps in each binomial tree
+    div_yield: continuous dividend yield
+    bump: volatility bump used for the finite difference vega (the trees have no closed form vega)
+    """
+
+    shape, (price, S, K, r, T, type) = _prepare(price, S, K, r, T, type)
+    div_yield = np.broadcast_to(np.asarray(div_yield, dtype = float), shape).ravel()
+    is_call = type == "Call"
+
+    # American options are worth at least their payoff and at most the stock (calls) or the strike (puts)
+    lower = np.maximum(np.where(is_call, S - K, K - S), 0)
+    upper = np.where(is_call, S, K)
+    valid = (T > 0) & (price > lower) & (price < upper)
+
+    def price_and_vega(index, sigma):
+        # Price the contracts at sigma, sigma + bump and sigma - bump in ONE batched tree run
+        n = index.size
+        def stacked(x):
+            return np.tile(x[index], 3)
+        sigmas = np.concatenate([sigma, sigma + bump, np.maximum(sigma - bump, 0.5 * sigma)])
+        prices = binomial_price_batch(
+            stacked(S), stacked(K), stacked(r), stacked(T), sigmas, steps,
+            stacked(type), True, stacked(div_yield)
+        )
+        vega = (prices[n:2 * n] - prices[2 * n:]) / (sigmas[n:2 * n] - sigmas[2 * n:])
+        return prices[:n], vega
+
+    result = _solve(price, _initial_guess(price, S, K, r, T), valid, price_and_vega, tol, max_iter)
+    return _reshape(result, shape)
@@ -0,0 +1,186 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models import lazy_import
+from models.black_scholes import call_price, put_price
+from models.profiling import profiled, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Monte Carlo pricing engine (European, Asian, barrier and lookback options).
+
+Instead of a formula (Black-Scholes) or a tree (Binomial), we simulate lots of possible stock price paths under the
+risk-neutral measure, average the discounted payoffs and report the standard error of that average.
+
+To keep memory bounded, paths are generated in fixed-size chunks (chunk_size paths x n_steps time steps at a time), and
+each chunk only sends back a handful of running sums. The chunks can be spread across a process pool: every chunk gets its
+own np.random.Generator, spawned from one SeedSequence, so the result for a given seed is the same no matter how many
+workers are used.
+
+Variance reduction:
+antithetic -> every random draw Z is also used as -Z (the two payoffs are averaged into one sample). The chunks are
+              rounded to an even number of paths, so only an odd n_paths leaves one draw (the last) without a mirror.
+control_variate -> the vanilla European payoff is used as a control, since we know its exact (Black-Scholes) price.
+                   For the European payoff itself that would be exact, so the discounted terminal stock price is used instead.
+"""
+
+PAYOFFS = ("european", "asian", "barrier", "lookback")
+BARRIER_TYPES = ("up-and-out", "down-and-out", "up-and-in", "down-and-in")
+
+
+# Simulate ONE chunk of paths and return the running sums needed for the price, its standard error and the control variate.
+# This has to be a top level function so that the process pool can pickle it.
+def _simulate_chunk(task):
+    (seed, n_paths, S, K, r, T, sigma, div_yield, sign, payoff, barrier, barrier_type,
+     n_steps, antithetic, control_variate) = task
+    rng = np.random.default_rng(seed)
+    dt = T / n_steps
+    drift = (r - div_yield - 0.5 * sigma ** 2) * dt
+    vol = sigma * np.sqrt(dt)
+
+    # With antithetic draws, half the paths are the mirror image of the other half (with an odd number of paths the
+    # last draw doesn't get one, so we simulate exactly n_paths)
+    pairs = n_paths // 2 if antithetic else 0
+    n_draws = n_paths - pairs
+    Z = rng.standard_normal((n_draws, n_steps))
+    if antithetic:
+        Z = np.concatenate([Z, -Z[:pairs]])
+    count("mc_paths", Z.shape[0])
+
+    # Log price paths (one row per path); the European payoff only needs the last column
+    log_paths = np.log(S) + np.cumsum(drift + vol * Z, axis = 1)
+    ST = np.exp(log_paths[:, -1])
+    disc = np.exp(-r * T)
+
+    if payoff == "european":
+        y = np.maximum(sign * (ST - K), 0)
+    else:
+        paths = np.exp(log_paths)
+        if payoff == "asian":
+            # Arithmetic average over the monitoring dates
+            y = np.maximum(sign * (paths.mean(axis = 1) - K), 0)
+        elif payoff == "lookback":
+            # Fixed strike lookback: calls pay off on the highest price, puts on the lowest
+            extreme = paths.max(axis = 1) if sign > 0 else paths.min(axis = 1)
+            y = np.maximum(sign * (extreme - K), 0)
+        else:
+            # Barrier options (monitored at every time step)
+            if barrier_type.startswith("up"):
+                hit = paths.max(axis = 1) >= barrier
+            else:
+                hit = paths.min(axis = 1) <= barrier
+            alive = ~hit if barrier_type.endswith("out") else hit
+            y = np.where(alive, np.maximum(sign * (ST - K), 0), 0.0)
+    y = disc * y
+
+    # Control variate: something with a known expected value that moves together with the payoff
+    if control_variate:
+        x = disc * ST if payoff == "european" else disc * np.maximum(sign * (ST - K), 0)
+    else:
+        x = np.zeros_like(y)
+
+    # Average the antithetic pairs so that each sample is independent (otherwise the standard error would be wrong);
+    # an unpaired last draw is a sample on its own
+    if antithetic:
+        y = np.concatenate([0.5 * (y[:pairs] + y[n_draws:]), y[pairs:n_draws]])
+        x = np.concatenate([0.5 * (x[:pairs] + x[n_draws:]), x[pairs:n_draws]])
+
+    return np.array([y.size, y.sum(), (y * y).sum(), x.sum(), (x * x).sum(), (x * y).sum()])
+
+# Define the Monte Carlo pricing method
+@profiled
+def monte_carlo_price(
+    S, K, r, T, sigma,
+    type = "Call",
+    payoff = "european",
+    barrier = None,
+    barrier_type = "up-and-out",
+    n_paths = 100_000,
+    n_steps = 252,
+    chunk_size = 10_000,
+    seed = None,
+    antithetic = False,
+    control_variate = False,
+    workers = 1,
+    div_yield = 0.0
+):
+    """
+    Parameters (the first five are the same as the Black Scholes Model):
+    type: either "Call" or "Put"
+    payoff: "european", "asian", "barrier" or "lookback"
+    barrier, barrier_type: barrier level and one of "up-and-out", "down-and-out", "up-and-in", "down-and-in" (barrier payoff only)
+    n_paths: total number of simulated paths
+    n_steps: number of monitoring dates per path (European options only need the final one, so they always use 1)
+    chunk_size: number of paths simulated at once (bounds the memory to about chunk_size x n_steps floats per worker)
+    seed: seed for reproducible results
+    antithetic, control_variate: variance reduction switches (see above)
+    workers: number of processes the chunks are spread across (1 runs everything in this process)
+    div_yield: continuous dividend yield
+
+    Returns a dictionary with the price, its standard error, the number of paths and the throughput (paths per second).
+    """
+
+    if payoff not in PAYOFFS:
+        raise ValueError(f"payoff must be one of {PAYOFFS}")
+    if payoff == "barrier" and (barrier is None or barrier_type not in BARRIER_TYPES):
+        raise ValueError(f"barrier options need a barrier level and a barrier_type from {BARRIER_TYPES}")
+    if T <= 0 or sigma <= 0:
+        raise ValueError("Monte Carlo pricing needs T > 0 and sigma > 0")
+    if n_paths < 2 or chunk_size < 2:
+        raise ValueError("n_paths and chunk_size must be >= 2")
+
+    start = time.perf_counter()
+    sign = 1.0 if type == "Call" else -1.0
+    n_steps = 1 if payoff == "european" else n_steps
+
+    # Split the paths into chunks, each with its own independent random stream (of whole antithetic pairs)
+    if antithetic:
+        chunk_size -= chunk_size % 2
+    sizes = [chunk_size] * (n_paths // chunk_size)
+    if n_paths % chunk_size:
+        sizes.append(n_paths % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [
+        (seeds[i], sizes[i], S, K, r, T, sigma, div_yield, sign, payoff, barrier, barrier_type,
+         n_steps, antithetic, control_variate)
+        for i in range(len(sizes))
+    ]
+
+    if workers is None or workers > 1:
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            sums = sum(pool.map(_simulate_chunk, tasks))
+    else:
+        sums = sum(map(_simulate_chunk, tasks))
+
+    n, sum_y, sum_y2, sum_x, sum_x2, sum_xy = sums
+    mean_y = sum_y / n
+    var_y = (sum_y2 - n * mean_y ** 2) / (n - 1)
+
+    if control_variate:
+        # Known expected value of the control (Black-Scholes with the dividend taken out of the spot price)
+        S_div = S * np.exp(-div_yield * T)
+        if payoff == "european":
+            expected_x = S_div
+        else:
+            expected_x = call_price(S_div, K, r, T, sigma) if type == "Call" else put_price(S_div, K, r, T, sigma)
+        mean_x = sum_x / n
+        var_x = (sum_x2 - n * mean_x ** 2) / (n - 1)
+        cov_xy = (sum_xy - n * mean_x * mean_y) / (n - 1)
+        # Optimal coefficient for the control (the one that removes the most variance)
+        beta = cov_xy / var_x if var_x > 0 else 0.0
+        price = mean_y - beta * (mean_x - expected_x)
+        variance = max(var_y - 2 * beta * cov_xy + beta ** 2 * var_x, 0.0)
+    else:
+        price = mean_y
+        variance = var_y
+
+    elapsed = time.perf_counter() - start
+    return {
+        "price": float(price),
+        "std_error": float(np.sqrt(variance / n)),
+        "n_paths": n_paths,
+        "elapsed": elapsed,
+        "paths_per_sec": n_paths / elapsed,
+    }
@@ -0,0 +1,162 @@
+import argparse
+import os
+import sys
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_greeks
+
+# NumPy is only loaded the first time it is used (see models/__init__.py), pandas inside the functions that use it
+np = lazy_import("numpy")
+
+"""
+Portfolio risk aggregator: prices a whole book of positions and adds up the risk per underlying.
+
+Position files can have millions of rows, so they are never loaded all at once. Instead they are streamed in chunks of
+chunk_size rows (pandas' chunked CSV reader, or pyarrow's batch reader for Parquet). Each chunk is priced with vectorized
+calls (batch_price for Black-Scholes rows, binomial_greeks for Binomial rows), reduced to one row of totals per underlying
+and then thrown away, so memory stays flat no matter how big the file is.
+
+Position file columns:
+underlying, S, K, r, T, sigma, type ("Call"/"Put"), quantity -> required
+model ("black_scholes" or "binomial"), american (True/False), steps, div_yield -> optional
+(default Black-Scholes, European, the steps argument and no dividends; empty model/american/steps cells get the defaults
+too, and anything else that isn't one of the accepted values is rejected rather than guessed)
+
+Usage (from the OptionPricingApp folder):
+python -m models.portfolio positions.csv --chunk-size 100000 --steps 200 --output risk.csv
+"""
+
+REQUIRED_COLUMNS = ["underlying", "S", "K", "r", "T", "sigma", "type", "quantity"]
+RISK_COLUMNS = ["price", "delta", "gamma", "vega", "theta", "rho"]
+MODELS = ("black_scholes", "binomial")
+# Spellings accepted in the american column (anything else is rejected, empty cells mean False)
+TRUE_VALUES = {"true", "t", "yes", "y", "1", "1.0"}
+FALSE_VALUES = {"false", "f", "no", "n", "0", "0.0", ""}
+
+
+# Stream a position file (CSV or Parquet) as pandas DataFrames of at most chunk_size rows
+def iter_position_chunks(path, chunk_size = 100_000):
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be >= 1")
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as error:
+            raise ImportError("Reading Parquet position files requires pyarrow (pip install pyarrow)") from error
+        for batch in pq.ParquetFile(path).iter_batches(batch_size = chunk_size):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(path, chunksize = chunk_size)
+
+# The model column as model names (empty cells are Black-Scholes). A typo would otherwise be priced as Black-Scholes.
+def _model_column(column):
+    models = column.fillna("black_scholes").astype(str).str.strip().to_numpy()
+    unknown = ~np.isin(models, MODELS)
+    if unknown.any():
+        raise ValueError(f"model must be one of {MODELS}, got {models[unknown][0]!r}")
+    return models
+
+# The american column as booleans. A plain bool cast would turn empty cells (NaN) and strings like "False" into True.
+def _american_column(column):
+    if column.dtype == bool:
+        return column.to_numpy()
+    text = column.fillna(False).astype(str).str.strip().str.lower()
+    unknown = ~text.isin(TRUE_VALUES | FALSE_VALUES)
+    if unknown.any():
+        raise ValueError(f"american must be True or False, got {column[unknown].iloc[0]!r}")
+    return text.isin(TRUE_VALUES).to_numpy()
+
+# The steps column as integers (empty cells get the default number of steps)
+def _steps_column(column, default):
+    import pandas as pd
+    numbers = pd.to_numeric(column, errors = "coerce")
+    values = numbers.fillna(default).to_numpy(dtype = float)
+    if (numbers.isna() & column.notna()).any() or ((values < 1) | (values != np.round(values))).any():
+        raise ValueError("steps must be whole numbers >= 1")
+    return values.astype(int)
+
+# Price one chunk of positions and return the risk per underlying (already multiplied by the quantities)
+def price_chunk(positions, steps = 200):
+    missing = [column for column in REQUIRED_COLUMNS if column not in positions.columns]
+    if missing:
+        raise ValueError(f"Position file is missing the column(s): {', '.join(missing)}")
+
+    n = len(positions)
+    model = _model_column(positions["model"]) if "model" in positions.columns else np.full(n, "black_scholes")
+    american = _american_column(positions["american"]) if "american" in positions.columns else np.zeros(n, dtype = bool)
+    row_steps = _steps_column(positions["steps"], steps) if "steps" in positions.columns else np.full(n, steps)
+    div_yield = positions["div_yield"].to_numpy(dtype = float) if "div_yield" in positions.columns else np.zeros(n)
+    S, K, r, T, sigma = (positions[column].to_numpy(dtype = float) for column in ["S", "K", "r", "T", "sigma"])
+    type = positions["type"].to_numpy(dtype = str)
+
+    risk = np.empty((n, len(RISK_COLUMNS)))
+
+    # Black-Scholes rows: one vectorized call for the whole chunk
+    closed_form = model != "binomial"
+    if closed_form.any():
+        out = batch_price(
+            S[closed_form], K[closed_form], r[closed_form], T[closed_form], sigma[closed_form], type[closed_form], div_yield[closed_form]
+        )
+        risk[closed_form] = np.column_stack([out[name] for name in RISK_COLUMNS])
+
+    # Binomial rows: one batched set of trees per (steps, american) combination
+    tree = ~closed_form
+    for n_steps in np.unique(row_steps[tree]):
+        for is_american in (False, True):
+            rows = tree & (row_steps == n_steps) & (american == is_american)
+            if not rows.any():
+                continue
+            out = binomial_greeks(S[rows], K[rows], r[rows], T[rows], sigma[rows], int(n_steps), type[rows], is_american, div_yield[rows])
+            risk[rows] = np.column_stack([out[name] for name in RISK_COLUMNS])
+
+    # Scale by the position sizes and add everything up per underlying
+    import pandas as pd
+    frame = pd.DataFrame(risk * positions["quantity"].to_numpy(dtype = float)[:, np.newaxis], columns = RISK_COLUMNS)
+    frame["positions"] = 1
+    frame["underlying"] = positions["underlying"].to_numpy()
+    return frame.groupby("underlying").sum()
+
+# Aggregate the risk of a stream of position chunks (any iterable of DataFrames, so it also works for in-memory books)
+def aggregate_chunks(chunks, steps = 200):
+    totals = None
+    for chunk in chunks:
+        chunk_totals = price_chunk(chunk, steps)
+        totals = chunk_totals if totals is None else totals.add(chunk_totals, fill_value = 0)
+    if totals is None:
+        import pandas as pd
+        return pd.DataFrame(columns = RISK_COLUMNS + ["positions"])
+    totals["positions"] = totals["positions"].astype(int)
+    return totals.rename(columns = {"price": "value"})
+
+# Define the main library entry point: portfolio value and Greeks per underlying for a position file
+def aggregate_risk(path, chunk_size = 100_000, steps = 200):
+    """
+    Parameters:
+    path: CSV or Parquet position file (see the columns above)
+    chunk_size: number of rows read and priced at a time
+    steps: number of Binomial steps for rows that don't have their own "steps" column
+
+    Returns a DataFrame indexed by underlying with the columns value, delta, gamma, vega, theta, rho and positions.
+    """
+    return aggregate_chunks(iter_position_chunks(path, chunk_size), steps)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Aggregate portfolio value and Greeks per underlying.")
+    parser.add_argument("path", help = "CSV or Parquet position file")
+    parser.add_argument("--chunk-size", type = int, default = 100_000, help = "rows priced at a time")
+    parser.add_argument("--steps", type = int, default = 200, help = "default number of Binomial steps")
+    parser.add_argument("--output", help = "write the totals to this CSV file instead of printing them")
+    args = parser.parse_args(argv)
+
+    totals = aggregate_risk(args.path, args.chunk_size, args.steps)
+    if args.output:
+        totals.to_csv(args.output)
+    else:
+        print(totals.to_string())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import contextvars
+import time
+from collections import deque
+from functools import wraps
+
+"""
+Opt-in profiling for the pricing functions: where does the time go inside a Binomial tree (setting up the payoffs vs the
+backwards induction vs the early exercise checks), or across a whole Streamlit rerun (pricing vs drawing the charts)?
+
+Nothing is recorded unless a Profiler is active:
+
+with Profiler() as profiler:
+    binomial_price(100, 100, 0.05, 1, 0.2, 1000, "Put", True)
+print(profiler.snapshot())
+
+The snapshot has, per timed function/section, the number of calls and the total, mean, p50/p90/p99 and max time in
+seconds, plus counters like the number of tree steps and the bytes of the arrays the trees allocated.
+
+The public model functions are wrapped with @profiled, and the models mark the phases inside them with section() and
+count(). When no profiler is active, each of those costs one context variable lookup (well under a microsecond, next to
+at least tens of microseconds of NumPy work), so they are left out of the scalar Black-Scholes functions, which only
+take a microsecond themselves. The active profiler is stored in a context variable, so every Streamlit session (thread)
+only sees its own calls.
+"""
+
+_active = contextvars.ContextVar("active_profiler", default = None)
+
+
+class Profiler:
+    """
+    Parameters:
+    max_samples: number of most recent timings kept per name for the percentiles (the count and total cover every call)
+    """
+
+    def __init__(self, max_samples = 10_000):
+        self.max_samples = max_samples
+        self.timings = {}
+        self.counters = {}
+        self._token = None
+
+    # Start recording in the current thread/task (Streamlit pages call start, and stop in a finally block, so that a page
+    # that raises halfway doesn't leave the profiler active)
+    def start(self):
+        self._token = _active.set(self)
+        return self
+
+    def stop(self):
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def record(self, name, seconds):
+        entry = self.timings.get(name)
+        if entry is None:
+            entry = self.timings[name] = {"calls": 0, "total": 0.0, "samples": deque(maxlen = self.max_samples)}
+        entry["calls"] += 1
+        entry["total"] += seconds
+        entry["samples"].append(seconds)
+
+    def add(self, name, amount):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+
+    def snapshot(self):
+        """
+        Returns a dictionary with:
+        timings -> {name: {"calls", "total", "mean", "p50", "p90", "p99", "max"}} (seconds)
+        counters -> {name: total} (e.g. "tree_steps", "array_bytes")
+        """
+        timings = {}
+        for name, entry in self.timings.items():
+            samples = sorted(entry["samples"])
+            def percentile(q):
+                return samples[min(int(q * len(samples)), len(samples) - 1)]
+            timings[name] = {
+                "calls": entry["calls"],
+                "total": entry["total"],
+                "mean": entry["total"] / entry["calls"],
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": samples[-1],
+            }
+        return {"timings": timings, "counters": dict(self.counters)}
+
+    # One row per timed name (slowest total first), handy for st.dataframe
+    def table(self):
+        timings = self.snapshot()["timings"]
+        rows = []
+        for name, stats in sorted(timings.items(), key = lambda item: -item[1]["total"]):
+            rows.append({
+                "name": name,
+                "calls": stats["calls"],
+                "total (ms)": stats["total"] * 1e3,
+                "mean (ms)": stats["mean"] * 1e3,
+                "p50 (ms)": stats["p50"] * 1e3,
+                "p99 (ms)": stats["p99"] * 1e3,
+            })
+        return rows
+
+# The profiler recording in this thread/task (None when profiling is off)
+def active_profiler():
+    return _active.get()
+
+# Add to a counter (tree steps, bytes allocated, ...) if a profiler is active
+def count(name, amount):
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.add(name, amount)
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+class _NoSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+_NO_SECTION = _NoSection()
+
+# Time a block of code: with section("binomial_price.backward"): ...
+def section(name):
+    profiler = _active.get()
+    return _NO_SECTION if profiler is None else _Section(profiler, name)
+
+# Decorator that times every call of a function (under "module.function" unless a name is given)
+def profiled(fn = None, name = None):
+    if fn is None:
+        def decorator(fn):
+            return profiled(fn, name)
+        return decorator
+    label = name or f"{fn.__module__.split('.')[-1]}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiler = _active.get()
+        if profiler is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.record(label, time.perf_counter() - start)
+
+    return wrapper
@@ -0,0 +1,135 @@
+from models import lazy_import
+from models.profiling import profiled, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Adaptive (level of detail) sampling for the charts on the Visualizations page.
+
+A chart doesn't need every point priced: most of a price heatmap is smooth enough that straight lines between a few
+prices are indistinguishable from the real thing, and only the area around the strike (where the payoff kink is) really
+curves. So instead of pricing a fixed grid, we price a coarse one first and then only add points where it curves.
+
+progressive_grid (heatmaps): start from a coarse (coarse x coarse) grid, then halve the spacing `levels` times. Every new
+point starts out as the bilinear interpolation of its cell, and only cells whose corners show a large second difference
+(linear interpolation is off by about 1/8 of it, same estimate as in models/grid.py) get their new points actually priced.
+It yields the grid after every level, so a page can draw the coarse version right away and the refined one when it is done.
+
+refine_curve (line charts): start from `coarse` evenly spaced points and keep splitting the intervals where the curve
+bends the most (the middle point is furthest from the straight line through its neighbours) until it is within tol or
+max_points is reached.
+
+Both only call the pricing function once per level/pass (with every new point at once), so the vectorized models stay fast.
+"""
+
+
+# The grid after each refinement level (see above). fn(x, y) must take arrays that broadcast together.
+def progressive_grid(fn, x_range, y_range, coarse = 17, levels = 3, tol = 1e-3):
+    """
+    Parameters:
+    fn: vectorized function of (x, y), e.g. lambda K, sigma: batch_price(S, K, r, T, sigma)["price"]
+    x_range, y_range: (first, last) values of the two axes
+    coarse: number of points along each axis of the first grid
+    levels: how many times the spacing is halved (the final grid has (coarse - 1) * 2^levels + 1 points per axis)
+    tol: how far off (relative to the range of the values) linear interpolation is allowed to be before a cell gets priced
+
+    Yields a dictionary per level (the first one is the coarse grid) with:
+    x, y -> the axes of the grid at that level
+    values -> array of shape (len(y), len(x)) (rows are y, like the heatmap's imshow)
+    exact -> boolean array, True where the value was priced (False where it was interpolated)
+    level -> 0 for the coarse grid, up to levels
+    priced -> total number of points priced so far
+    """
+    if coarse < 3 or levels < 0:
+        raise ValueError("coarse must be >= 3 and levels >= 0")
+    n = (coarse - 1) * 2 ** levels + 1
+    x = np.linspace(*x_range, n)
+    y = np.linspace(*y_range, n)
+    values = np.zeros((n, n))
+    exact = np.zeros((n, n), dtype = bool)
+
+    step = 2 ** levels
+    values[::step, ::step] = fn(x[::step][np.newaxis, :], y[::step][:, np.newaxis])
+    exact[::step, ::step] = True
+    priced = coarse * coarse
+    scale = max(float(np.ptp(values[::step, ::step])), 1e-12)
+    yield {"x": x[::step], "y": y[::step], "values": values[::step, ::step], "exact": exact[::step, ::step], "level": 0, "priced": priced}
+
+    for level in range(1, levels + 1):
+        known = values[::step, ::step]
+        # Largest second difference (along either axis) at each known point, then at the worst corner of each cell
+        curvature = np.zeros(known.shape)
+        curvature[:, 1:-1] = np.abs(known[:, :-2] - 2 * known[:, 1:-1] + known[:, 2:])
+        curvature[1:-1, :] = np.maximum(curvature[1:-1, :], np.abs(known[:-2] - 2 * known[1:-1] + known[2:]))
+        cells = np.maximum.reduce([curvature[:-1, :-1], curvature[1:, :-1], curvature[:-1, 1:], curvature[1:, 1:]])
+        flagged = cells / 8 > tol * scale
+
+        # Halve the spacing: every new point starts out interpolated from the corners of its cell (these are views
+        # into the full grid, so writing to them fills it in)
+        half = step // 2
+        fine = values[::half, ::half]
+        fine_exact = exact[::half, ::half]
+        fine[::2, 1::2] = (known[:, :-1] + known[:, 1:]) / 2
+        fine[1::2, ::2] = (known[:-1] + known[1:]) / 2
+        fine[1::2, 1::2] = (known[:-1, :-1] + known[1:, :-1] + known[:-1, 1:] + known[1:, 1:]) / 4
+
+        # ...and the new points inside (or on the edges of) a flagged cell get priced for real
+        touched = np.zeros(fine.shape, dtype = bool)
+        for row in range(3):
+            for column in range(3):
+                touched[row:row + fine.shape[0] - 2:2, column:column + fine.shape[1] - 2:2] |= flagged
+        rows, columns = np.nonzero(touched & ~fine_exact)
+        if rows.size:
+            fine[rows, columns] = fn(x[::half][columns], y[::half][rows])
+            fine_exact[rows, columns] = True
+            priced += rows.size
+
+        step = half
+        yield {"x": x[::step], "y": y[::step], "values": fine, "exact": fine_exact, "level": level, "priced": priced}
+    count("refine_points_priced", priced)
+
+# Run progressive_grid to the end and return its last level
+@profiled
+def refine_grid(fn, x_range, y_range, coarse = 17, levels = 3, tol = 1e-3):
+    for stage in progressive_grid(fn, x_range, y_range, coarse, levels, tol):
+        pass
+    return stage
+
+@profiled
+def refine_curve(fn, x_min, x_max, coarse = 25, max_points = 200, tol = 1e-3):
+    """
+    Parameters:
+    fn: vectorized function of x (e.g. lambda S: batch_price(S, K, r, T, sigma)["delta"])
+    x_min, x_max: range of x
+    coarse: number of evenly spaced points to start from
+    max_points: most points the curve can end up with
+    tol: how far (relative to the range of the values) a point may be from the straight line through its neighbours
+
+    Returns the x values (increasing) and fn at those x values.
+    """
+    if coarse < 3:
+        raise ValueError("coarse must be >= 3")
+    x = np.linspace(x_min, x_max, coarse)
+    y = np.asarray(fn(x), dtype = float)
+    scale = max(float(np.ptp(y)), 1e-12)
+
+    while x.size < max_points:
+        # Distance of each interior point from the chord through its neighbours
+        weight = (x[1:-1] - x[:-2]) / (x[2:] - x[:-2])
+        off_line = np.abs(y[1:-1] - (y[:-2] + weight * (y[2:] - y[:-2])))
+        # An interval gets split if either of its ends is off the line
+        interval_error = np.zeros(x.size - 1)
+        interval_error[:-1] = off_line
+        interval_error[1:] = np.maximum(interval_error[1:], off_line)
+        split = np.nonzero(interval_error > tol * scale)[0]
+        if split.size == 0:
+            break
+        # Worst intervals first if they don't all fit
+        split = split[np.argsort(-interval_error[split])][:max_points - x.size]
+        middle = (x[split] + x[split + 1]) / 2
+        order = np.argsort(np.concatenate([x, middle]), kind = "stable")
+        x = np.concatenate([x, middle])[order]
+        y = np.concatenate([y, np.asarray(fn(middle), dtype = float)])[order]
+    count("refine_points_priced", x.size)
+    return x, y
@@ -0,0 +1,120 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_price_batch
+from models.profiling import profiled
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Scenario and stress-test engine: reprices a set of contracts under a grid of market shocks and returns the P&L cube.
+
+Shocks (every combination of the four lists is one scenario):
+spot_shocks -> relative moves in the stock price (-0.1 = the stock falls 10%)
+vol_shocks -> absolute moves in volatility (0.05 = +5 vol points)
+rate_shocks -> moves in the risk-free rate in basis points (25 = +0.25%)
+time_shocks -> days that pass (the time to expiration shrinks by days / 365)
+
+European contracts are priced with the vectorized batch_price, one spot shock at a time so the temporaries stay small.
+American contracts need trees, so the scenarios are split into chunks that run on a process pool, and each chunk prices
+ALL of its scenarios x American contracts in one binomial_price_batch call.
+
+contracts is a dictionary (or DataFrame) of equally long columns: S, K, r, T, sigma, type, quantity and optionally
+american (default False) and div_yield (default 0).
+"""
+
+
+def _column(contracts, name, default = None):
+    if name in contracts:
+        return np.asarray(contracts[name])
+    if default is None:
+        raise ValueError(f"contracts is missing the column '{name}'")
+    return np.full(len(np.asarray(contracts["S"])), default)
+
+# Apply the shocks of a set of scenarios to a set of contracts (result shape: (scenarios, contracts))
+def _shock(S, r, T, sigma, scenarios):
+    spot, vol, rate, days = (scenarios[:, i][:, np.newaxis] for i in range(4))
+    return (
+        S * (1 + spot),
+        r + rate * 1e-4,
+        np.maximum(T - days / 365, 0.0),
+        np.maximum(sigma + vol, 0.0),
+    )
+
+# Price one chunk of scenarios for the American contracts (top level function so the process pool can pickle it)
+def _price_tree_chunk(task):
+    scenarios, S, K, r, T, sigma, type, div_yield, steps = task
+    S_s, r_s, T_s, sigma_s = _shock(S, r, T, sigma, scenarios)
+    shape = S_s.shape
+    return binomial_price_batch(
+        S_s, np.broadcast_to(K, shape), r_s, T_s, sigma_s, steps,
+        np.broadcast_to(type, shape), True, np.broadcast_to(div_yield, shape)
+    )
+
+# Define the scenario engine
+@profiled
+def run_scenarios(
+    contracts,
+    spot_shocks = (0.0,),
+    vol_shocks = (0.0,),
+    rate_shocks = (0.0,),
+    time_shocks = (0.0,),
+    steps = 200,
+    workers = 1,
+    scenarios_per_task = 25
+):
+    """
+    Parameters:
+    contracts: dictionary/DataFrame of contract columns (see above)
+    spot_shocks, vol_shocks, rate_shocks, time_shocks: the shock grid (see above)
+    steps: number of Binomial steps for the American contracts
+    workers: number of processes for the tree priced contracts (1 runs everything in this process)
+    scenarios_per_task: number of scenarios each process pool task prices at once
+
+    Returns a dictionary with:
+    pnl -> P&L per scenario and contract (quantity included), shape (spot, vol, rate, time, contracts)
+    total -> P&L of the whole book per scenario, shape (spot, vol, rate, time)
+    base_value -> value of each position before any shock
+    """
+
+    S, K, r, T, sigma, quantity = (_column(contracts, name).astype(float) for name in ["S", "K", "r", "T", "sigma", "quantity"])
+    type = _column(contracts, "type").astype(str)
+    american = _column(contracts, "american", False).astype(bool)
+    div_yield = _column(contracts, "div_yield", 0.0).astype(float)
+
+    grid_shape = (len(spot_shocks), len(vol_shocks), len(rate_shocks), len(time_shocks))
+    # One row per scenario (the zero shock scenario goes first, it gives us the base values)
+    scenarios = np.array([(0.0, 0.0, 0.0, 0.0)] + list(itertools.product(spot_shocks, vol_shocks, rate_shocks, time_shocks)), dtype = float)
+    values = np.empty((len(scenarios), len(S)))
+
+    # European contracts: vectorized closed form, one spot shock at a time
+    european = ~american
+    if european.any():
+        # The scenarios are ordered spot shock first, so splitting them evenly gives one block per spot shock
+        blocks = [scenarios[:1]] + np.array_split(scenarios[1:], len(spot_shocks))
+        start = 0
+        for block in blocks:
+            S_s, r_s, T_s, sigma_s = _shock(S[european], r[european], T[european], sigma[european], block)
+            values[start:start + len(block), european] = batch_price(
+                S_s, K[european], r_s, T_s, sigma_s, type[european], div_yield[european]
+            )["price"]
+            start += len(block)
+
+    # American contracts: chunks of scenarios spread across a process pool
+    if american.any():
+        columns = (S[american], K[american], r[american], T[american], sigma[american], type[american], div_yield[american])
+        chunks = [scenarios[i:i + scenarios_per_task] for i in range(0, len(scenarios), scenarios_per_task)]
+        tasks = [(chunk, *columns, steps) for chunk in chunks]
+        if workers is None or workers > 1:
+            with ProcessPoolExecutor(max_workers = workers) as pool:
+                results = list(pool.map(_price_tree_chunk, tasks))
+        else:
+            results = list(map(_price_tree_chunk, tasks))
+        values[:, american] = np.concatenate(results)
+
+    base_value = values[0] * quantity
+    pnl = (values[1:] * quantity - base_value).reshape(grid_shape + (len(S),))
+    return {"pnl": pnl, "total": pnl.sum(axis = -1), "base_value": base_value}
@@ -0,0 +1,450 @@
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from models import lazy_import
+from models.black_scholes import batch_price
+from models.binomial import binomial_price_batch, _lattice_setup, LATTICES
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Asynchronous HTTP/JSON pricing service, so other systems can use the models without importing any Python code.
+
+Calling batch_price once per contract wastes most of the time on Python overhead, so the service doesn't price requests
+one by one. Every request is put on a bounded queue, and a batcher task collects everything that arrives within a short
+window (window seconds, or until max_batch contracts have been collected) and prices it with ONE vectorized call.
+Black-Scholes batches are priced right on the event loop (they take microseconds). Binomial batches (grouped by
+steps/american/lattice, since those are shared by the whole batch) go to a worker pool so they never block the loop.
+
+Backpressure: each batcher prices at most max_inflight batches at a time, and only collects the next batch once one of
+them is done. Until then requests wait on the queue, and when the queue is full new requests are turned away straight
+away with 503 instead of piling up in memory.
+Every endpoint keeps a latency histogram (log-spaced buckets from 0.1 ms to 10 s) of every request it answered (failed
+ones included, they are also counted by status code), shown at GET /stats.
+
+Errors: a contract that can't be priced (missing fields, non-finite numbers, or a tree with an invalid probability) is
+rejected with 400 before it ever joins a batch. If a batch still fails, its requests are priced again one by one, so only
+the request that caused it gets the error. Request bodies are limited to MAX_BODY_BYTES (413 beyond that), and results
+that aren't finite numbers come back as null (JSON has no NaN).
+
+Endpoints:
+POST /price/black_scholes -> {"S": 100, "K": 100, "r": 0.01, "T": 1, "sigma": 0.2, "type": "Call"}
+                             returns {"price", "delta", "gamma", "vega", "theta", "rho"}
+POST /price/binomial -> the same fields plus optional "steps" (default 200), "american" (default false), "div_yield"
+                        (default 0) and "lattice" (default "crr"); returns {"price"}
+Both also accept {"contracts": [...]} (a list of the objects above) and then return {"results": [...]}.
+GET /stats -> latency histograms, queue depths and batch counts
+GET /health -> {"status": "ok"}
+
+Usage (from the OptionPricingApp folder):
+python -m models.service --port 8000 --workers 4
+"""
+
+CONTRACT_FIELDS = ["S", "K", "r", "T", "sigma"]
+GREEK_NAMES = ["price", "delta", "gamma", "vega", "theta", "rho"]
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+# Largest request body accepted (about 40,000 contracts)
+MAX_BODY_BYTES = 8 * 2 ** 20
+
+
+# Raised when a queue is full (the client gets a 503 and should retry later)
+class Overloaded(Exception):
+    pass
+
+class LatencyHistogram:
+    """
+    Parameters:
+    lowest, highest: edges of the first and last bucket (in seconds)
+    per_decade: number of buckets per factor of 10
+    """
+
+    def __init__(self, lowest = 1e-4, highest = 10.0, per_decade = 4):
+        self.bounds = []
+        bound = lowest
+        while bound < highest * 1.0001:
+            self.bounds.append(bound)
+            bound *= 10 ** (1 / per_decade)
+        # One extra bucket for anything slower than the last bound
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.total += seconds
+
+    # Upper bound of the bucket that holds the q-th quantile
+    def quantile(self, q):
+        count = sum(self.counts)
+        if count == 0:
+            return None
+        running = 0
+        for i, bucket in enumerate(self.counts):
+            running += bucket
+            if running >= q * count:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+
+    def snapshot(self):
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "mean": self.total / count if count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": [[bound, n] for bound, n in zip(self.bounds + [float("inf")], self.counts) if n],
+        }
+
+class Batcher:
+    """
+    Collects single requests into batches and hands them to process_batch.
+
+    Parameters:
+    process_batch: async function that takes a list of requests and returns a list of results (same order)
+    max_queue: maximum number of requests waiting (more than that raises Overloaded)
+    window: seconds to keep collecting after the first request of a batch arrives
+    max_batch: maximum number of contracts per batch
+    max_inflight: maximum number of batches being priced at once (the next batch waits on the queue until one is done)
+    """
+
+    def __init__(self, process_batch, max_queue = 10_000, window = 0.002, max_batch = 4096, max_inflight = 8):
+        self.process_batch = process_batch
+        self.queue = asyncio.Queue(maxsize = max_queue)
+        self.window = window
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self.batches = 0
+        self.contracts = 0
+        self._task = None
+        # Batches that are still being priced (asyncio only keeps weak references to tasks)
+        self._pending = set()
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    # Queue a request (a list of contracts) and wait for its results
+    async def submit(self, contracts):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((contracts, future))
+        except asyncio.QueueFull:
+            raise Overloaded(f"queue is full ({self.queue.maxsize} requests waiting)")
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free slot BEFORE taking anything off the queue, so a slow pricer leaves the requests on the
+            # (bounded) queue and new ones get turned away once it's full
+            await self._inflight.acquire()
+            try:
+                batch = [await self.queue.get()]
+            except BaseException:
+                self._inflight.release()
+                raise
+            size = len(batch[0][0])
+            deadline = loop.time() + self.window
+            # Keep collecting until the window closes or the batch is full
+            while size < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                self._inflight.release()
+                continue
+            self.batches += 1
+            self.contracts += sum(len(contracts) for contracts, _ in batch)
+            # Don't wait for the batch to finish before collecting the next one (binomial batches run in the pool)
+            task = asyncio.ensure_future(self._dispatch(batch))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            await self._finish(batch)
+        finally:
+            self._inflight.release()
+
+    async def _finish(self, batch):
+        try:
+            results = await self.process_batch([contracts for contracts, _ in batch])
+        except Exception as error:
+            if len(batch) > 1:
+                # One bad request shouldn't fail everything it was batched with: price each request on its own, so
+                # only the bad one gets the error
+                await asyncio.gather(*(self._finish([item]) for item in batch))
+                return
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+# Turn one JSON contract into a tuple of plain values (raises ValueError with a readable message if it's invalid)
+def _parse_contract(contract, binomial):
+    if not isinstance(contract, dict):
+        raise ValueError("each contract must be a JSON object")
+    missing = [name for name in CONTRACT_FIELDS if name not in contract]
+    if missing:
+        raise ValueError(f"contract is missing the field(s): {', '.join(missing)}")
+    values = [float(contract[name]) for name in CONTRACT_FIELDS]
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError(f"{', '.join(CONTRACT_FIELDS)} must be finite numbers")
+    type = contract.get("type", "Call")
+    if type not in ("Call", "Put"):
+        raise ValueError("type must be 'Call' or 'Put'")
+    if not binomial:
+        return (*values, type)
+    steps = contract.get("steps", 200)
+    # (json.loads also gives us floats like 2.7 or Infinity, which int() would truncate or choke on)
+    if isinstance(steps, bool) or not isinstance(steps, (int, float)) or not math.isfinite(steps) or steps != int(steps):
+        raise ValueError("steps must be a whole number")
+    steps = int(steps)
+    if not 1 <= steps <= 10_000:
+        raise ValueError("steps must be between 1 and 10000")
+    lattice = contract.get("lattice", "crr")
+    if lattice not in LATTICES:
+        raise ValueError(f"lattice must be one of {LATTICES}")
+    div_yield = float(contract.get("div_yield", 0.0))
+    if not math.isfinite(div_yield):
+        raise ValueError("div_yield must be a finite number")
+    S, K, r, T, sigma = values
+    if T > 0 and sigma > 0:
+        # Set up this contract's lattice on its own (a single row of about 2 * steps nodes), so a contract with an
+        # invalid probability is turned away here instead of failing the whole batch it would have joined
+        _lattice_setup(lattice, *(np.full((1, 1), x) for x in (S, K, r, T, sigma, div_yield)), steps)
+    return (*values, type, div_yield, steps, bool(contract.get("american", False)), lattice)
+
+# Price a list of Black-Scholes requests with one batch_price call
+def _price_black_scholes(requests):
+    rows = [contract for contracts in requests for contract in contracts]
+    S, K, r, T, sigma = (np.array([row[i] for row in rows]) for i in range(5))
+    out = batch_price(S, K, r, T, sigma, np.array([row[5] for row in rows]))
+    table = np.column_stack([out[name] for name in GREEK_NAMES]).tolist()
+    return _split(requests, [dict(zip(GREEK_NAMES, row)) for row in table])
+
+# Price a group of binomial contracts that share steps/american/lattice (top level function so the process pool can pickle it)
+def _price_binomial_group(S, K, r, T, sigma, type, div_yield, steps, american, lattice):
+    return binomial_price_batch(
+        np.array(S), np.array(K), np.array(r), np.array(T), np.array(sigma), steps,
+        np.array(type), american, np.array(div_yield), lattice
+    ).tolist()
+
+# Split a flat list of results back into one list per request
+def _split(requests, flat):
+    results, start = [], 0
+    for contracts in requests:
+        results.append(flat[start:start + len(contracts)])
+        start += len(contracts)
+    return results
+
+class PricingService:
+    """
+    Parameters:
+    workers: number of processes for the binomial batches (1 runs them in a thread of this process)
+    max_queue, window, max_batch, max_inflight: passed on to both batchers (see Batcher)
+    """
+
+    def __init__(self, workers = 1, max_queue = 10_000, window = 0.002, max_batch = 4096, max_inflight = 8):
+        self.workers = workers
+        self.histograms = {}
+        self.errors = {}
+        self._pool = None
+        self.batchers = {
+            "/price/black_scholes": Batcher(self._black_scholes_batch, max_queue, window, max_batch, max_inflight),
+            "/price/binomial": Batcher(self._binomial_batch, max_queue, window, max_batch, max_inflight),
+        }
+
+    async def start(self):
+        if self.workers is None or self.workers > 1:
+            # "spawn" rather than fork: forked workers would inherit the open client sockets and keep them from closing
+            self._pool = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+        for batcher in self.batchers.values():
+            batcher.start()
+
+    async def stop(self):
+        for batcher in self.batchers.values():
+            await batcher.stop()
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    async def _black_scholes_batch(self, requests):
+        return _price_black_scholes(requests)
+
+    async def _binomial_batch(self, requests):
+        loop = asyncio.get_running_loop()
+        rows = [contract for contracts in requests for contract in contracts]
+        # One tree batch per (steps, american, lattice) combination, all running in the pool at the same time
+        groups = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(row[7:], []).append(index)
+        jobs = []
+        for (steps, american, lattice), indices in groups.items():
+            columns = [[rows[i][j] for i in indices] for j in range(7)]
+            jobs.append(loop.run_in_executor(self._pool, _price_binomial_group, *columns, steps, american, lattice))
+        flat = [None] * len(rows)
+        for indices, prices in zip(groups.values(), await asyncio.gather(*jobs)):
+            for i, price in zip(indices, prices):
+                flat[i] = {"price": price}
+        return _split(requests, flat)
+
+    # Handle one parsed HTTP request and return (status, JSON payload)
+    async def handle(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return 200, {"status": "ok"}
+        if path == "/stats" and method == "GET":
+            return 200, self.stats()
+        if path not in self.batchers:
+            return 404, {"error": f"unknown endpoint {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        start = time.perf_counter()
+        status, response = await self._price(path, body)
+        # Every answered request counts towards the latency, failed ones too
+        self.histograms.setdefault(path, LatencyHistogram()).observe(time.perf_counter() - start)
+        if status != 200:
+            errors = self.errors.setdefault(path, {})
+            errors[status] = errors.get(status, 0) + 1
+        return status, response
+
+    async def _price(self, path, body):
+        try:
+            payload = json.loads(body or b"null")
+            single = not (isinstance(payload, dict) and "contracts" in payload)
+            contracts = [payload] if single else payload["contracts"]
+            if not isinstance(contracts, list) or not contracts:
+                raise ValueError("contracts must be a non-empty list")
+            parsed = [_parse_contract(contract, path == "/price/binomial") for contract in contracts]
+            results = await self.batchers[path].submit(parsed)
+        except Overloaded as error:
+            return 503, {"error": str(error)}
+        except (ValueError, TypeError, OverflowError) as error:
+            return 400, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": f"pricing failed: {error}"}
+        return 200, results[0] if single else {"results": results}
+
+    def stats(self):
+        return {
+            "latency": {path: histogram.snapshot() for path, histogram in self.histograms.items()},
+            "errors": {path: {str(status): n for status, n in errors.items()} for path, errors in self.errors.items()},
+            "queues": {
+                path: {"waiting": batcher.queue.qsize(), "max": batcher.queue.maxsize, "batches": batcher.batches, "contracts": batcher.contracts,
+                       "in_flight": len(batcher._pending), "max_in_flight": batcher.max_inflight}
+                for path, batcher in self.batchers.items()
+            },
+        }
+
+# Replace the floats JSON can't represent (NaN, infinity) with None
+def _json_safe(value):
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {name: _json_safe(item) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+def _response(status, payload):
+    data = json.dumps(_json_safe(payload), allow_nan = False).encode()
+    return f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+
+# Minimal HTTP/1.1 connection handler (keep-alive, JSON bodies with a Content-Length)
+async def _serve_connection(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if not 0 <= length <= MAX_BODY_BYTES:
+                # Don't read it at all (the connection is closed, since the body would still be on its way)
+                writer.write(_response(413, {"error": f"request body must be at most {MAX_BODY_BYTES} bytes"}))
+                await writer.drain()
+                break
+            body = await reader.readexactly(length)
+
+            status, payload = await service.handle(method, path.split("?")[0], body)
+            writer.write(_response(status, payload))
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+# Start the service and return (service, server); the caller closes the server and stops the service
+async def start_server(host = "127.0.0.1", port = 8000, **service_options):
+    service = PricingService(**service_options)
+    await service.start()
+    server = await asyncio.start_server(lambda reader, writer: _serve_connection(service, reader, writer), host, port)
+    return service, server
+
+async def _serve_forever(host, port, **service_options):
+    service, server = await start_server(host, port, **service_options)
+    print(f"Pricing service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Run the HTTP/JSON option pricing service.")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8000)
+    parser.add_argument("--workers", type = int, default = 1, help = "processes for binomial batches (1 = a thread in this process)")
+    parser.add_argument("--max-queue", type = int, default = 10_000, help = "requests allowed to wait per endpoint before returning 503")
+    parser.add_argument("--window", type = float, default = 0.002, help = "seconds to collect requests into one batch")
+    parser.add_argument("--max-batch", type = int, default = 4096, help = "maximum contracts per batch")
+    parser.add_argument("--max-inflight", type = int, default = 8, help = "batches priced at once per endpoint")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(_serve_forever(
+            args.host, args.port, workers = args.workers, max_queue = args.max_queue, window = args.window,
+            max_batch = args.max_batch, max_inflight = args.max_inflight
+        ))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
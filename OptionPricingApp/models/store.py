@@ -0,0 +1,324 @@
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+from models import lazy_import
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Persistent on-disk result store, so expensive results (Binomial prices, convergence series, exercise boundaries, rendered
+charts) survive a restart and are shared by every Streamlit worker process on the machine.
+
+Every result is stored under the hash of (function name, arguments, code version), so the same call always lands on the
+same entry no matter which process computed it. Only arguments with a canonical form are hashed: numbers, strings,
+booleans, None, arrays, tuples/lists/dictionaries of those, and objects (curves, dividend schedules, vol surfaces) that
+describe themselves with a cache_state() method. Anything else (a repr can leave out the state, or contain a memory
+address that differs in every process) raises TypeError, and such calls just aren't stored. The code version is a hash of the source of every model module plus the
+file that defines the function, so changing the code can never serve results from the old code (the old entries just
+stop being used and get evicted eventually).
+
+Layout (root is the store directory):
+root/ab/abcdef.../meta.json -> what the result looks like (a number, an array, bytes or a dictionary of those) and any
+                               plain numbers/strings it holds
+root/ab/abcdef.../0.npy ... -> one .npy file per array, opened with mmap_mode="r" (nothing is read until it is used,
+                               and every process reading the same entry shares the same pages of the OS file cache)
+
+Concurrency: an entry is written into a temporary directory and then renamed into place, which is atomic. So readers only
+ever see complete entries, and if two processes compute the same result at once, the second rename just loses (the
+entries are identical anyway). Entries are never modified after that. Eviction renames an entry away before deleting it,
+and arrays a reader already opened stay valid (on POSIX, deleted files live on until they are closed).
+
+Eviction: when the store grows past max_bytes, the least recently used entries (every read touches the entry's
+modification time) are deleted until it is back under 90% of max_bytes.
+
+pricing_cache (models/cache.py) uses the store behind its in-memory cache: a miss in memory checks the store before
+computing, and every new result is also written to the store. The store lives in the directory given by the
+OPTION_PRICER_STORE environment variable (default ~/.cache/option-pricing-app/results; an empty value turns it off),
+with a size limit of OPTION_PRICER_STORE_MB megabytes (default 512).
+"""
+
+# Fraction of max_bytes eviction brings the store back down to
+EVICT_TO = 0.9
+# Age after which an unfinished write in tmp/ is considered abandoned
+STALE_SECONDS = 3600
+# Rescan the real size of the store (other processes write to it too) after this many writes
+RESCAN_EVERY = 100
+
+
+# Hash of the source of every model module (computed once per process)
+@lru_cache(maxsize = 1)
+def _models_version():
+    folder = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".py"):
+            with open(os.path.join(folder, name), "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()
+
+@lru_cache(maxsize = 256)
+def _file_version(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ""
+
+# Code version of a function: the model sources plus the file the function itself is defined in (e.g. a page script)
+def code_version(fn):
+    try:
+        path = inspect.getsourcefile(fn)
+    except TypeError:
+        path = None
+    return _models_version()[:16] + (_file_version(os.path.abspath(path))[:16] if path else "")
+
+# Add a value to a hash (arrays by their dtype, shape and bytes, since their repr cuts long arrays short with "...")
+def _feed(digest, value):
+    if value is None or isinstance(value, (bool, int, float, str, np.bool_, np.integer, np.floating)):
+        digest.update(f"{type(value).__name__} {value!r}".encode() + b"\0")
+    elif isinstance(value, np.ndarray):
+        if value.dtype.kind not in "biufcSU":
+            raise TypeError(f"can't hash an array of {value.dtype}")
+        digest.update(f"array {value.dtype.str} {value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (tuple, list)):
+        digest.update(f"{type(value).__name__} {len(value)}".encode())
+        for item in value:
+            _feed(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f"dict {len(value)}".encode())
+        for name in sorted(value, key = repr):
+            _feed(digest, name)
+            _feed(digest, value[name])
+    elif callable(getattr(value, "cache_state", None)):
+        digest.update(f"{type(value).__name__} state".encode())
+        _feed(digest, value.cache_state())
+    else:
+        raise TypeError(f"can't hash a {type(value).__name__} (no canonical form)")
+
+# Split a result into the pieces stored in meta.json and the arrays stored as .npy files (None if it can't be stored).
+# Only what comes back EXACTLY as it went in is stored: lists and tuples would come back as arrays, and dictionary keys
+# that aren't strings as strings (JSON keys), so results like that just stay in memory.
+def _encode(result):
+    def field(value):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return {"value": value}, None
+        if isinstance(value, (np.integer, np.floating, np.bool_)):
+            return {"value": value.item()}, None
+        if isinstance(value, bytes):
+            return {"bytes": True}, np.frombuffer(value, dtype = np.uint8)
+        if isinstance(value, np.ndarray) and value.dtype.kind in "biufc":
+            # (an empty file can't be memory-mapped)
+            if value.size == 0:
+                return {"empty": value.dtype.str, "shape": list(value.shape)}, None
+            return {}, value
+        raise TypeError(f"can't store a {type(value).__name__}")
+
+    try:
+        if isinstance(result, dict):
+            if not all(isinstance(name, str) for name in result):
+                raise TypeError("dictionary keys must be strings")
+            fields = {name: field(value) for name, value in result.items()}
+            return {"kind": "dict", "fields": {name: spec for name, (spec, _) in fields.items()}}, {
+                name: array for name, (_, array) in fields.items() if array is not None
+            }
+        spec, array = field(result)
+        return {"kind": "single", "fields": {"result": spec}}, ({"result": array} if array is not None else {})
+    except (TypeError, ValueError):
+        return None, None
+
+class ResultStore:
+    """
+    Parameters:
+    root: directory of the store (created if it doesn't exist)
+    max_bytes: size limit; the least recently used entries are evicted beyond it
+    """
+
+    def __init__(self, root, max_bytes = 512 * 2 ** 20):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok = True)
+        self._lock = threading.Lock()
+        self._bytes = None
+        self._writes = 0
+
+    def __repr__(self):
+        return f"ResultStore(root = {self.root!r}, max_bytes = {self.max_bytes})"
+
+    def key(self, name, arguments, version = ""):
+        """
+        Content address of a result (arguments can be any nesting of tuples, lists, dictionaries, arrays, plain values and
+        objects with a cache_state()). Raises TypeError for anything else.
+        """
+        digest = hashlib.sha256()
+        _feed(digest, (name, arguments, version))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """The stored result (arrays memory-mapped, read-only) or None if there is no such entry."""
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            values = {}
+            for name, spec in meta["fields"].items():
+                if "value" in spec:
+                    values[name] = spec["value"]
+                    continue
+                if "empty" in spec:
+                    values[name] = np.empty(spec["shape"], dtype = spec["empty"])
+                    values[name].setflags(write = False)
+                    continue
+                array = np.load(os.path.join(path, spec["file"]), mmap_mode = "r")
+                values[name] = array.tobytes() if spec.get("bytes") else array
+            # Reading counts as using the entry (for the least recently used eviction)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            # Not there (or evicted while we were reading it)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return values if meta["kind"] == "dict" else values["result"]
+
+    def put(self, key, result):
+        """Store a result (a number, string, array, bytes, or a dictionary of those). Returns False if it can't be stored."""
+        meta, arrays = _encode(result)
+        if meta is None:
+            return False
+        path = self._path(key)
+        if os.path.isdir(path):
+            return True
+
+        # Write everything into a private temporary directory, then publish it with one atomic rename
+        staging = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+        os.makedirs(staging)
+        size = 0
+        try:
+            for number, (name, array) in enumerate(arrays.items()):
+                meta["fields"][name]["file"] = f"{number}.npy"
+                np.save(os.path.join(staging, f"{number}.npy"), np.ascontiguousarray(array))
+                size += array.nbytes
+            meta["created"] = time.time()
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+            try:
+                os.rename(staging, path)
+            except OSError:
+                # Another process published the same entry first
+                shutil.rmtree(staging, ignore_errors = True)
+                return True
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors = True)
+            raise
+
+        with self._lock:
+            self._writes += 1
+            rescan = self._bytes is None or self._writes % RESCAN_EVERY == 0
+            if not rescan:
+                self._bytes += size
+        if rescan or self._bytes > self.max_bytes:
+            self.evict()
+        return True
+
+    # Every entry with its size and last use, oldest first
+    def _entries(self):
+        entries = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or shard.name == "tmp":
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+                except OSError:
+                    continue
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Delete the least recently used entries until the store is under its size limit. Returns the number deleted."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        # Leftovers of writers that crashed halfway through (anything in tmp/ older than STALE_SECONDS)
+        for leftover in os.scandir(os.path.join(self.root, "tmp")):
+            try:
+                if leftover.stat().st_mtime < time.time() - STALE_SECONDS:
+                    shutil.rmtree(leftover.path, ignore_errors = True)
+            except OSError:
+                continue
+        if total > self.max_bytes:
+            for _, size, path in entries:
+                if total <= EVICT_TO * self.max_bytes:
+                    break
+                # Rename first, so no reader ever sees a half-deleted entry
+                trash = os.path.join(self.root, "tmp", uuid.uuid4().hex)
+                try:
+                    os.rename(path, trash)
+                except OSError:
+                    continue
+                shutil.rmtree(trash, ignore_errors = True)
+                total -= size
+                deleted += 1
+        with self._lock:
+            self._bytes = total
+        return deleted
+
+    def get_or_compute(self, name, fn, *args, **kwargs):
+        try:
+            key = self.key(name, (args, kwargs), code_version(fn))
+        except TypeError:
+            # Arguments we can't hash canonically: compute without the store
+            return fn(*args, **kwargs)
+        result = self.get(key)
+        if result is None:
+            result = fn(*args, **kwargs)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+    def clear(self):
+        for shard in os.scandir(self.root):
+            if shard.is_dir() and shard.name != "tmp":
+                shutil.rmtree(shard.path, ignore_errors = True)
+        with self._lock:
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+# The store configured by the environment (None if it is turned off or the directory can't be created).
+# This creates the directory, so pricing_cache only calls it the first time it actually needs the store.
+def default_store():
+    root = os.environ.get("OPTION_PRICER_STORE", os.path.join(os.path.expanduser("~"), ".cache", "option-pricing-app", "results"))
+    if not root:
+        return None
+    try:
+        return ResultStore(root, int(float(os.environ.get("OPTION_PRICER_STORE_MB", "512")) * 2 ** 20))
+    except OSError:
+        return None
@@ -0,0 +1,320 @@
+from models import lazy_import
+from models.curves import discount_factor
+from models.profiling import profiled, count
+
+# NumPy is only loaded the first time it is used (see models/__init__.py)
+np = lazy_import("numpy")
+
+"""
+Implied volatility surfaces: sigma as a function of strike AND expiration, instead of one number for every option.
+
+Each expiry gets its own smile, fitted to the implied vols quoted at that expiry with the (raw) SVI parameterization of
+the total implied variance w = sigma^2 * T as a function of the log-moneyness k = log(K / F), F being the forward price:
+
+w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + s^2))
+
+a -> overall level, b -> how steep the wings are, rho -> skew (-1 to 1), m -> where the smile bottoms out, s -> how rounded
+the bottom is.
+
+Arbitrage checks (on a grid of log-moneyness):
+butterfly -> the risk-neutral density implied by the smile has to be positive, which for SVI is Gatheral's
+             g(k) = (1 - k * w' / (2w))^2 - w'^2 / 4 * (1 / w + 1 / 4) + w'' / 2 >= 0
+calendar -> at any moneyness the total variance can't go DOWN as the expiration gets longer, w(k, T2) >= w(k, T1)
+
+Smoothing: the fit of each expiry penalizes a negative g, wing slopes steeper than Roger Lee's bound (b * (1 + |rho|) <= 4)
+and total variance crossing the fitted neighbouring expiries, so the slices it produces are arbitrage free wherever
+the quotes allow it (arbitrage_report() tells you when they don't).
+
+Between expiries the total variance is interpolated linearly in T at the same moneyness (which can't create calendar
+arbitrage), before the first expiry it shrinks to 0 at T = 0 and after the last one the implied vol stays flat.
+
+Incremental updates: update() only refits the expiries whose quotes changed (intraday refreshes usually touch a few
+expiries), and every other slice is left alone. Lookups are vectorized (one pass over every (K, T) pair), and the
+per-expiration setup (forward, neighbouring slices, interpolation weight) is cached until the next update.
+
+Every model takes a VolSurface wherever it takes sigma (call_price, put_price, greeks, batch_price, binomial_price, ...).
+"""
+
+SVI_PARAMS = ("a", "b", "rho", "m", "s")
+# Log-moneyness grid used by the arbitrage penalties and checks
+K_GRID = (-1.5, 1.5, 61)
+# Weight of the arbitrage penalties against the fit errors (in total variance)
+PENALTY = 1000.0
+# The penalties are soft, so they kick in slightly before g reaches 0 (otherwise the fit tends to settle just below it)
+DENSITY_MARGIN = 1e-3
+# Iteration cap of the penalized (arbitrage-free) refit of a slice
+MAX_PENALIZED_STEPS = 50
+# Most scalar vol lookups kept per surface
+MAX_CACHED_VOLS = 100_000
+
+
+# SVI total variance (params is a sequence of the 5 parameters, or 5 arrays that broadcast against k)
+def svi_total_variance(params, k):
+    a, b, rho, m, s = params
+    x = k - m
+    return a + b * (rho * x + np.sqrt(x * x + s * s))
+
+# Gatheral's g(k) (butterfly arbitrage wherever it is negative)
+def butterfly_density(params, k):
+    a, b, rho, m, s = params
+    x = k - m
+    root = np.sqrt(x * x + s * s)
+    w = a + b * (rho * x + root)
+    w1 = b * (rho + x / root)
+    w2 = b * s * s / root ** 3
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        g = (1 - k * w1 / (2 * w)) ** 2 - w1 * w1 / 4 * (1 / w + 0.25) + w2 / 2
+    # A negative total variance is no smile at all
+    return np.where(w > 0, g, -np.inf)
+
+class SVISlice:
+    """
+    One expiry of the surface.
+    T: time to expiration (in years)
+    params: the fitted (a, b, rho, m, s)
+    rmse: root mean square error of the fitted implied vols against the quotes
+    """
+
+    def __init__(self, T, params, rmse = 0.0):
+        self.T = float(T)
+        self.params = tuple(float(x) for x in params)
+        self.rmse = rmse
+
+    def __repr__(self):
+        values = ", ".join(f"{name} = {value:.6g}" for name, value in zip(SVI_PARAMS, self.params))
+        return f"SVISlice(T = {self.T}, {values})"
+
+    def total_variance(self, k):
+        return svi_total_variance(self.params, k)
+
+    def vol(self, k):
+        return np.sqrt(np.maximum(self.total_variance(k), 0.0) / self.T)
+
+# Fit one SVI slice to the total variances w at log-moneyness k.
+# lower/upper are the neighbouring (shorter/longer) expiries' slices the fit must stay between (None if there is none).
+def fit_svi(T, k, w, lower = None, upper = None, initial = None):
+    from scipy.optimize import least_squares
+
+    k = np.asarray(k, dtype = float)
+    w = np.asarray(w, dtype = float)
+    grid = np.linspace(*K_GRID)
+    floor = lower.total_variance(grid) if lower is not None else None
+    ceiling = upper.total_variance(grid) if upper is not None else None
+    # Fit errors are compared in total variance, scaled so that a typical quote weighs about 1
+    level = float(np.mean(w))
+    scale = 1.0 / max(level, 1e-12)
+
+    def fit_errors(params):
+        return (svi_total_variance(params, k) - w) * scale
+
+    # How far the smile breaks each no-arbitrage condition on the grid (all zeros if it doesn't)
+    def violations(params):
+        a, b, rho, m, s = params
+        model = svi_total_variance(params, grid)
+        # g is only defined where the variance is positive, so a negative variance gets its own (smooth) penalty
+        g = butterfly_density(params, grid)
+        penalties = [
+            np.where(model > 0, np.minimum(g - DENSITY_MARGIN, 0.0), 0.0),
+            np.minimum(model, 0.0) * scale,
+            [min(4.0 - b * (1 + abs(rho)), 0.0)],
+        ]
+        if floor is not None:
+            penalties.append(np.minimum(model - floor, 0.0) * scale)
+        if ceiling is not None:
+            penalties.append(np.minimum(ceiling - model, 0.0) * scale)
+        return np.concatenate(penalties)
+
+    def residuals(params):
+        return np.concatenate([fit_errors(params), PENALTY * violations(params)])
+
+    bounds = ([-1.0, 0.0, -0.999, -2.0, 1e-4], [max(float(w.max()), 1e-4), 4.0, 0.999, 2.0, 5.0])
+    x_scale = [level, level, 0.1, 0.1, 0.1]
+
+    # For a fixed (m, s) the smile is linear in (a, b * rho, b), so those come straight out of a linear least squares
+    # solve (the "quasi-explicit" SVI fit) and only m and s are left for the optimizer
+    def linear_fit(ms):
+        m, s = ms
+        x = k - m
+        (a, c, b), *_ = np.linalg.lstsq(np.column_stack([np.ones_like(k), x, np.sqrt(x * x + s * s)]), w, rcond = None)
+        a = min(max(a, bounds[0][0]), bounds[1][0])
+        b = min(max(b, 0.0), bounds[1][1])
+        rho = min(max(c / b, -0.999), 0.999) if b > 0 else 0.0
+        return (a, b, rho, m, s)
+
+    # Step 1: the plain fit over (m, s), with m kept inside the quoted strikes (further out, the best fit is usually a
+    # degenerate straight line). It has local minima, so it starts from a few places plus the previous fit of this expiry.
+    outer_bounds = ([float(k.min()), 0.01], [float(k.max()), 2.0])
+    lowest = float(k[np.argmin(w)])
+    starts = [(lowest, 0.1), (lowest, 0.5), (0.0, 0.2)]
+    if initial is not None:
+        starts.insert(0, (initial[3], initial[4]))
+    evaluations = 0
+    best = None
+    for start in starts:
+        start = np.clip(start, outer_bounds[0], outer_bounds[1])
+        fit = least_squares(lambda ms: fit_errors(linear_fit(ms)), start, bounds = outer_bounds)
+        evaluations += fit.nfev
+        if best is None or fit.cost < best.cost:
+            best = fit
+    params = np.clip(linear_fit(best.x), bounds[0], bounds[1])
+
+    # Step 2: only if that smile allows arbitrage, refit all 5 parameters from there with the penalties switched on
+    # (capped, the penalized problem converges slowly and the last bit of fit doesn't matter)
+    if np.any(violations(params) < 0):
+        fit = least_squares(residuals, params, bounds = bounds, x_scale = x_scale, max_nfev = MAX_PENALIZED_STEPS)
+        evaluations += fit.nfev
+        params = fit.x
+    count("svi_fit_evaluations", evaluations)
+
+    vols = np.sqrt(np.maximum(svi_total_variance(params, k), 0.0) / T)
+    rmse = float(np.sqrt(np.mean((vols - np.sqrt(w / T)) ** 2)))
+    return SVISlice(T, params, rmse)
+
+
+class VolSurface:
+    """
+    Parameters:
+    S: stock price the quotes were taken at
+    r: risk-free rate, or a DiscountCurve (used for the forwards)
+    div_yield: continuous dividend yield, or a DiscountCurve (used for the forwards)
+
+    Fill it with update({T: (strikes, implied vols), ...}) and look vols up with vol(K, T).
+    """
+
+    def __init__(self, S, r = 0.0, div_yield = 0.0):
+        self.S = float(S)
+        self.r = r
+        self.div_yield = div_yield
+        self.slices = {}
+        self.quotes = {}
+        # Per expiration lookup setup and per (K, T) scalar vols, both cleared whenever the slices change
+        self._setup_cache = {}
+        self._vol_cache = {}
+
+    def __repr__(self):
+        return f"VolSurface(S = {self.S}, expiries = {self.expiries})"
+
+    # Everything vol() depends on, as plain values (the result store and the pricing cache key surfaces on this, since
+    # the repr leaves the fitted smiles out and update() changes them in place)
+    def cache_state(self):
+        return (self.S, self.r, self.div_yield, tuple((T, self.slices[T].params) for T in self.expiries))
+
+    @property
+    def expiries(self):
+        return sorted(self.slices)
+
+    def forward(self, T):
+        return self.S * discount_factor(self.div_yield, T) / discount_factor(self.r, T)
+
+    @profiled
+    def update(self, quotes):
+        """
+        quotes: {T: (strikes, implied vols)} for the expiries that are new or changed (the other expiries are kept as they are)
+        Returns the list of expiries that were refitted.
+        """
+        changed = sorted(float(T) for T in quotes)
+        # Check every expiry before storing any of them, so bad quotes never leave the surface half updated
+        checked = {}
+        for T, (strikes, vols) in quotes.items():
+            if T <= 0:
+                raise ValueError("expiries must be > 0")
+            strikes = np.asarray(strikes, dtype = float)
+            vols = np.asarray(vols, dtype = float)
+            if strikes.shape != vols.shape or strikes.size < 5:
+                raise ValueError(f"expiry {T}: need at least 5 strikes and as many vols as strikes")
+            checked[float(T)] = (strikes, vols)
+        self.quotes.update(checked)
+
+        # Shortest first, so each fit sees its freshly fitted shorter neighbour
+        for T in changed:
+            strikes, vols = self.quotes[T]
+            expiries = sorted(self.quotes)
+            index = expiries.index(T)
+            lower = self.slices.get(expiries[index - 1]) if index > 0 else None
+            upper = self.slices.get(expiries[index + 1]) if index + 1 < len(expiries) else None
+            previous = self.slices.get(T)
+            k = np.log(strikes / self.forward(T))
+            self.slices[T] = fit_svi(T, k, vols ** 2 * T, lower, upper, previous.params if previous is not None else None)
+
+        self._setup_cache.clear()
+        self._vol_cache.clear()
+        return changed
+
+    def remove(self, T):
+        self.quotes.pop(float(T), None)
+        self.slices.pop(float(T), None)
+        self._setup_cache.clear()
+        self._vol_cache.clear()
+
+    def arbitrage_report(self, tol = 1e-6):
+        """
+        Returns a dictionary with:
+        butterfly -> {T: lowest g(k) on the grid} (negative means butterfly arbitrage)
+        calendar -> {(T1, T2): lowest w(k, T2) - w(k, T1) on the grid} for consecutive expiries (negative means calendar arbitrage)
+        arbitrage_free -> True if neither check failed by more than tol (the penalties are soft, so an arbitrage free fit can
+        still be off by ~1e-7)
+        """
+        grid = np.linspace(*K_GRID)
+        expiries = self.expiries
+        butterfly = {T: float(butterfly_density(self.slices[T].params, grid).min()) for T in expiries}
+        calendar = {}
+        for T1, T2 in zip(expiries, expiries[1:]):
+            gap = self.slices[T2].total_variance(grid) - self.slices[T1].total_variance(grid)
+            calendar[(T1, T2)] = float(gap.min())
+        arbitrage_free = all(g >= -tol for g in butterfly.values()) and all(gap >= -tol for gap in calendar.values())
+        return {"butterfly": butterfly, "calendar": calendar, "arbitrage_free": arbitrage_free}
+
+    # Forward, neighbouring slices and interpolation weight for one expiration (cached)
+    def _setup(self, T):
+        setup = self._setup_cache.get(T)
+        if setup is None:
+            expiries = self.expiries
+            index = int(np.searchsorted(expiries, T))
+            if index == 0:
+                # Before the first expiry: the total variance shrinks linearly to 0 at T = 0
+                lo = hi = expiries[0]
+                weight, ratio = 0.0, T / lo
+            elif index == len(expiries):
+                # After the last expiry: flat implied vol, so the total variance grows linearly with T
+                lo = hi = expiries[-1]
+                weight, ratio = 0.0, T / hi
+            else:
+                lo, hi = expiries[index - 1], expiries[index]
+                weight, ratio = (T - lo) / (hi - lo), 1.0
+            setup = self._setup_cache[T] = (self.forward(T), self.slices[lo].params, self.slices[hi].params, weight, ratio)
+        return setup
+
+    def total_variance(self, K, T):
+        """Total implied variance sigma^2 * T at strike(s) K and expiration(s) T (numbers or arrays that broadcast together)."""
+        if not self.slices:
+            raise ValueError("the surface has no expiries yet (call update first)")
+        K, T = np.broadcast_arrays(np.asarray(K, dtype = float), np.asarray(T, dtype = float))
+        # Each distinct expiration is set up once, then every (K, T) pair goes through SVI in one vectorized pass
+        unique, inverse = np.unique(np.maximum(T, 1e-8), return_inverse = True)
+        setups = [self._setup(float(t)) for t in unique]
+        forward, lo, hi, weight, ratio = (np.array([setup[i] for setup in setups])[inverse.reshape(T.shape)] for i in range(5))
+        k = np.log(K / forward)
+        lo_params = np.moveaxis(lo, -1, 0)
+        hi_params = np.moveaxis(hi, -1, 0)
+        w = (1 - weight) * svi_total_variance(lo_params, k) + weight * svi_total_variance(hi_params, k)
+        return np.maximum(w * ratio, 0.0)
+
+    def vol(self, K, T):
+        """Implied volatility at strike(s) K and expiration(s) T (a float if both are numbers)."""
+        if isinstance(K, (int, float)) and isinstance(T, (int, float)):
+            key = (K, T)
+            sigma = self._vol_cache.get(key)
+            if sigma is None:
+                # Keep the cache from growing forever when a long running app prices lots of different strikes
+                if len(self._vol_cache) >= MAX_CACHED_VOLS:
+                    self._vol_cache.clear()
+                sigma = self._vol_cache[key] = self.vol(np.asarray(K), np.asarray(T)).item()
+            return sigma
+        T = np.asarray(T, dtype = float)
+        # Expired options don't need a vol, so they get the one at the shortest expiry
+        T_safe = np.where(T > 0, T, self.expiries[0])
+        return np.sqrt(self.total_variance(K, T_safe) / T_safe)
+
+# The volatility the models should use: sigma itself, or the surface's vol at (K, T)
+def volatility(sigma, K, T):
+    return sigma.vol(K, T) if isinstance(sigma, VolSurface) else sigma
@@ -7,7 +7,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 # Import both Black Scholes models as well as the Binomial Model (for Convergence visualization)
 from models.black_scholes import call_price, put_price
-from models.binomial import binomial_price
+from models.binomial import binomial_convergence
+# Every price goes through the shared cache, so widget changes that don't touch the prices (like "Position") are free
+from models.cache import cached, pricing_cache
+# Opt-in profiling (where does the time go during a rerun: pricing or drawing the charts?)
+from models.profiling import Profiler, section
 
 
 # Explain to users what the purpose of this page is
@@ -28,89 +32,111 @@ K = st.sidebar.number_input("Strike Price (K)", min_value = 0.01, value = 100.0)
 r = st.sidebar.slider("Risk-free Interest Rate (r)", 0.0, 0.1, 0.01, step = 0.005)
 T = st.sidebar.slider("Time to Expiration (T in years)", 0.0, 5.0, 1.0, step = 0.1)
 sigma = st.sidebar.slider("Volatility (σ)", 0.0, 1.0, 0.2, step = 0.01)
-# The option type is binary so I used a drop down menu (selectbox instead of radio)
-
-# Calculate & Display Black-Scholes Price
-# Note: Since I made a separate function for call and put prices for BS, I need to use an if-else statement here:
-if type == "Call":
-    # Round to nearest Hundredth (since we want it in cents)
-    bs_price = round(call_price(S, K, r, T, sigma), 2)
-else:
-    bs_price = round(put_price(S, K, r, T, sigma), 2)
-# Displaying in bold (using **)
-st.subheader(f"**{type} Option Price:** :yellow[${bs_price}]")
-
-
-
-
-
-
-# PAYOFF DIAGRAM
-st.subheader("Payoff Diagram")
-
-# Choose the option position (I used st.selectbox for a drop-down menu but st.radio would have also sufficed)
-position = st.selectbox("Position", ["Long", "Short"])
-
-# Range of possible stock prices at expiration for the graph (going from -50% to +50% for simplicity)
-S_range = np.linspace(0.5 * K, 1.5 * K, 200)
-
-# Compute payoff at expiration based off of option type & position
-if type == "Call":
-    payoff = np.maximum(S_range - K, 0)
-else:
-    payoff = np.maximum(K - S_range, 0)
-if position == "Short":
-    payoff = -payoff
-
-# Plot payoffs (once again using the figures and axes for creating the plot)
-fig, ax = plt.subplots()
-ax.plot(S_range, payoff, label = f"{position} {type}")
-ax.axhline(0, color = "black", linewidth = 1)
-ax.axvline(K, color = "gray", linestyle = "--", label = "Strike Price")
-ax.set_title("Option Payoff at Expiration")
-ax.set_xlabel("Stock Price at Expiration ($)")
-ax.set_ylabel("Profit / Loss ($)")
-ax.legend()
-st.pyplot(fig)
-
-
-
-
-
-
-
-
-
-# CONVERGENCE PLOT (using Matplotlib)!!!
-st.subheader("Binomial vs Black–Scholes Convergence")
-st.write(
-    "This visualization shows how the Binomial option price converges "
-    "to the Black–Scholes price as the number of steps in the binomial tree increases."
-)
-steps_list = [2, 4, 8, 16, 32, 64, 128, 256, 512]
-# Here, I calculate the binomial price based on the number of steps and store it in a list
-bino_prices = [
-    binomial_price(S, K, r, T, sigma, steps = s, type = "Call", american = False)
-    for s in steps_list
-]
-# Instead of using plt for everything I ran the line of code below bc otherwise Streamlit would be confused
-fig, ax = plt.subplots(figsize=(8,4))
-ax.plot(steps_list, bino_prices, marker = "o", label = "Binomial Prices (European)")
-ax.axhline(bs_price, linestyle = "--", label = "Black Scholes Price")
-ax.set_xscale("log", base = 2) # Reminder that options distribution is Logarithmic!
-ax.set_xlabel("Binomial Steps") 
-ax.set_ylabel("Call Price ($)") 
-ax.set_title("Convergence of Binomial Price to Black–Scholes")
-ax.legend()
-ax.grid(True)
-st.pyplot(fig)
-
-st.info(
-    "As the number of steps in the binomial tree increases, "
-    "the Binomial model price converges to the Black–Scholes price. "
-    "This is because the binomial approach approximates the continuous-time "
-    "process assumed in Black–Scholes. "
-    "Note: The x-axis is scaled by log2 because an options distribution "
-    "is logarithmic (browse the internet if you're curious why). "
-)
-
+q = st.sidebar.slider("Dividend Yield (q)", 0.0, 0.1, 0.0, step = 0.005)
+# When the profiling panel is on, every pricing call and chart from here on is timed (it shows up at the bottom of the page)
+show_profiling = st.sidebar.checkbox("Show profiling panel", value = False)
+profiler = Profiler().start() if show_profiling else None
+try:
+    # The option type is binary so I used a drop down menu (selectbox instead of radio)
+
+    # Calculate & Display Black-Scholes Price
+    # Note: Since I made a separate function for call and put prices for BS, I need to use an if-else statement here:
+    if type == "Call":
+        # Round to nearest Hundredth (since we want it in cents)
+        bs_price = round(cached(call_price)(S, K, r, T, sigma, q), 2)
+    else:
+        bs_price = round(cached(put_price)(S, K, r, T, sigma, q), 2)
+    # Displaying in bold (using **)
+    st.subheader(f"**{type} Option Price:** :yellow[${bs_price}]")
+
+
+
+
+
+
+    # PAYOFF DIAGRAM
+    st.subheader("Payoff Diagram")
+
+    # Choose the option position (I used st.selectbox for a drop-down menu but st.radio would have also sufficed)
+    position = st.selectbox("Position", ["Long", "Short"])
+
+    # Range of possible stock prices at expiration for the graph (going from -50% to +50% for simplicity)
+    S_range = np.linspace(0.5 * K, 1.5 * K, 200)
+
+    # Compute payoff at expiration based off of option type & position
+    if type == "Call":
+        payoff = np.maximum(S_range - K, 0)
+    else:
+        payoff = np.maximum(K - S_range, 0)
+    if position == "Short":
+        payoff = -payoff
+
+    # Plot payoffs (once again using the figures and axes for creating the plot)
+    fig, ax = plt.subplots()
+    ax.plot(S_range, payoff, label = f"{position} {type}")
+    ax.axhline(0, color = "black", linewidth = 1)
+    ax.axvline(K, color = "gray", linestyle = "--", label = "Strike Price")
+    ax.set_title("Option Payoff at Expiration")
+    ax.set_xlabel("Stock Price at Expiration ($)")
+    ax.set_ylabel("Profit / Loss ($)")
+    ax.legend()
+    with section("render: payoff diagram"):
+        st.pyplot(fig)
+
+
+
+
+
+
+
+
+
+    # CONVERGENCE PLOT (using Matplotlib)!!!
+    st.subheader("Binomial vs Black–Scholes Convergence")
+    st.write(
+        "This visualization shows how the Binomial option price converges "
+        "to the Black–Scholes price as the number of steps in the binomial tree increases."
+    )
+    steps_list = [2, 4, 8, 16, 32, 64, 128, 256, 512]
+    # Here, I calculate the whole price vs steps series in one call (it shares the setup work across the step counts)
+    convergence = cached(binomial_convergence)(S, K, r, T, sigma, steps_list, type = "Call", american = False, div_yield = q, richardson = True)
+    bino_prices = convergence["prices"]
+    # Instead of using plt for everything I ran the line of code below bc otherwise Streamlit would be confused
+    fig, ax = plt.subplots(figsize=(8,4))
+    ax.plot(steps_list, bino_prices, marker = "o", label = "Binomial Prices (European)")
+    # Richardson extrapolation combines consecutive step counts to cancel out most of the error
+    ax.plot(steps_list, convergence["richardson"], marker = "x", linestyle = ":", label = "Richardson Extrapolation")
+    ax.axhline(bs_price, linestyle = "--", label = "Black Scholes Price")
+    ax.set_xscale("log", base = 2) # Reminder that options distribution is Logarithmic!
+    ax.set_xlabel("Binomial Steps") 
+    ax.set_ylabel("Call Price ($)") 
+    ax.set_title("Convergence of Binomial Price to Black–Scholes")
+    ax.legend()
+    ax.grid(True)
+    with section("render: convergence plot"):
+        st.pyplot(fig)
+
+    st.info(
+        "As the number of steps in the binomial tree increases, "
+        "the Binomial model price converges to the Black–Scholes price. "
+        "This is because the binomial approach approximates the continuous-time "
+        "process assumed in Black–Scholes. "
+        "Note: The x-axis is scaled by log2 because an options distribution "
+        "is logarithmic (browse the internet if you're curious why). "
+    )
+finally:
+    # Stop recording even if something above raised (or Streamlit stopped/reran the script), otherwise the profiler
+    # would stay active in this session's thread and keep recording every later rerun
+    if profiler is not None:
+        profiler.stop()
+
+# Show how often the shared pricing cache saved us from recomputing (useful when many people use the app at once)
+cache_stats = pricing_cache.stats()
+st.sidebar.caption(f"Pricing cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['size']} stored, {cache_stats['disk_hits']} loaded from disk)")
+
+# Profiling panel: timings of everything that ran during this rerun (results served from the cache don't show up)
+if profiler is not None:
+    with st.expander("Profiling (this rerun)", expanded = True):
+        st.dataframe(profiler.table())
+        counters = profiler.snapshot()["counters"]
+        st.caption(", ".join(f"{name}: {value:,}" for name, value in counters.items()) or "No counters recorded (everything came from the cache)")
@@ -7,8 +7,12 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 # Importing pricing models (will do convergence plot again towards the bottom)
-from models.binomial import binomial_price
+from models.binomial import binomial_price, binomial_convergence, binomial_american
 from models.black_scholes import call_price, put_price
+# Every price goes through the shared cache, so widget changes that don't touch the prices (like "Position") are free
+from models.cache import cached, pricing_cache
+# Opt-in profiling (where does the time go during a rerun: pricing or drawing the charts?)
+from models.profiling import Profiler, section
 
 
 
@@ -32,91 +36,138 @@ steps = st.sidebar.slider("Number of Steps", 1, 1024, 250, step = 1)
 # The option type and whether it's American or European are binary so I used a drop down menu (selectbox instead of radio)
 type = st.sidebar.selectbox("Option Type", ["Call", "Put"])
 american = st.sidebar.selectbox("American Option?", [True, False])
-
-
-# Calculate & Display Binomial Price
-# Round to nearest Hundredth (since we want it in cents)
-bin_price = round(binomial_price(S, K, r, T, sigma, steps, type, american), 2)
-# Displaying in bold (using **)
-st.subheader(f"**{type} Option Price:** :blue[${bin_price}]")
-
-
-
-# PAYOFF DIAGRAM (Yes I'm reusing the entire code from Black Scholes)
-st.subheader("Payoff Diagram")
-
-# Choose the option position (I used st.selectbox for a drop-down menu but st.radio would have also sufficed)
-position = st.selectbox("Position", ["Long", "Short"])
-
-# Range of possible stock prices at expiration for the graph (going from -50% to +50% for simplicity)
-S_range = np.linspace(0.5 * K, 1.5 * K, 200)
-
-# Compute payoff at expiration based off of option type & position
-if type == "Call":
-    payoff = np.maximum(S_range - K, 0)
-else:
-    payoff = np.maximum(K - S_range, 0)
-if position == "Short":
-    payoff = -payoff
-
-# Plot payoffs (once again using the figures and axes for creating the plot)
-fig, ax = plt.subplots()
-ax.plot(S_range, payoff, label = f"{position} {type}")
-ax.axhline(0, color = "black", linewidth = 1)
-ax.axvline(K, color = "gray", linestyle = "--", label = "Strike Price")
-ax.set_title("Option Payoff at Expiration")
-ax.set_xlabel("Stock Price at Expiration ($)")
-ax.set_ylabel("Profit / Loss ($)")
-ax.legend()
-st.pyplot(fig)
-
-
-
-
-
-
-
-# CONVERGENCE PLOT (using Matplotlib)!!!
-st.subheader("Binomial vs Black–Scholes Convergence")
-st.write(
-    "This visualization shows how the Binomial option price converges "
-    "to the Black–Scholes price as the number of steps in the binomial tree increases."
-)
-steps_list = [2, 4, 8, 16, 32, 64, 128, 256, 512]
-# Here, I calculate the binomial price based on the number of steps and store it in a list
-bino_prices = [
-    # To avoid the positional argument follows keyword argument error
-    binomial_price(S = S, K = K, r = r, T = T, sigma = sigma, steps = s, type = type, american = False)
-    for s in steps_list
-]
-
-# Compute Black-Scholes price (European call only for comparison) 
-# NOTE: These are the ONLY DIFFERENT LINES OF CODE compared to the Convergence Plot with Black Scholes
-if type == "Call":
-    bs_price = call_price(S, K, r, T, sigma)
-else:
-    bs_price = put_price(S, K, r, T, sigma)   # 
-
-# Instead of using plt for everything I ran the line of code below bc otherwise Streamlit would be confused
-fig, ax = plt.subplots(figsize=(8,4))
-ax.plot(steps_list, bino_prices, marker = "o", label = "Binomial Prices (European)")
-ax.axhline(bs_price, linestyle = "--", label = "Black Scholes Price")
-ax.set_xscale("log", base = 2) # Reminder that options distribution is Logarithmic!
-ax.set_xlabel("Binomial Steps") 
-ax.set_ylabel(f"{type} Price ($)")
-ax.set_title("Convergence of Binomial Price to Black–Scholes")
-ax.legend()
-ax.grid(True)
-st.pyplot(fig)
-
-st.info(
-    "As the number of steps in the binomial tree increases, "
-    "the Binomial model price converges to the Black–Scholes price. "
-    "This is because the binomial approach approximates the continuous-time "
-    "process assumed in Black–Scholes. "
-    "Note: The x-axis is scaled by log2 because an options distribution "
-    "is logarithmic (browse the internet if you're curious why). "
-)
-
-
-
+# When the profiling panel is on, every pricing call and chart from here on is timed (it shows up at the bottom of the page)
+show_profiling = st.sidebar.checkbox("Show profiling panel", value = False)
+profiler = Profiler().start() if show_profiling else None
+try:
+
+
+    # Calculate & Display Binomial Price
+    # Round to nearest Hundredth (since we want it in cents)
+    bin_price = round(cached(binomial_price)(S, K, r, T, sigma, steps, type, american), 2)
+    # Displaying in bold (using **)
+    st.subheader(f"**{type} Option Price:** :blue[${bin_price}]")
+
+
+
+    # PAYOFF DIAGRAM (Yes I'm reusing the entire code from Black Scholes)
+    st.subheader("Payoff Diagram")
+
+    # Choose the option position (I used st.selectbox for a drop-down menu but st.radio would have also sufficed)
+    position = st.selectbox("Position", ["Long", "Short"])
+
+    # Range of possible stock prices at expiration for the graph (going from -50% to +50% for simplicity)
+    S_range = np.linspace(0.5 * K, 1.5 * K, 200)
+
+    # Compute payoff at expiration based off of option type & position
+    if type == "Call":
+        payoff = np.maximum(S_range - K, 0)
+    else:
+        payoff = np.maximum(K - S_range, 0)
+    if position == "Short":
+        payoff = -payoff
+
+    # Plot payoffs (once again using the figures and axes for creating the plot)
+    fig, ax = plt.subplots()
+    ax.plot(S_range, payoff, label = f"{position} {type}")
+    ax.axhline(0, color = "black", linewidth = 1)
+    ax.axvline(K, color = "gray", linestyle = "--", label = "Strike Price")
+    ax.set_title("Option Payoff at Expiration")
+    ax.set_xlabel("Stock Price at Expiration ($)")
+    ax.set_ylabel("Profit / Loss ($)")
+    ax.legend()
+    with section("render: payoff diagram"):
+        st.pyplot(fig)
+
+
+
+
+
+
+
+    # EARLY EXERCISE BOUNDARY (only makes sense for American options)
+    if american:
+        st.subheader("Early Exercise Boundary")
+        st.write(
+            "For an American option, this is the stock price at which exercising early becomes better than holding on. "
+            "A put is exercised whenever the stock falls below the line, a call whenever it rises above it."
+        )
+        american_result = cached(binomial_american)(S, K, r, T, sigma, steps, type)
+        if np.all(np.isnan(american_result["boundary_prices"][:-1])):
+            st.info("Early exercise is never optimal for these parameters (e.g. a call on a stock without dividends).")
+        else:
+            fig, ax = plt.subplots(figsize=(8,4))
+            ax.plot(american_result["boundary_times"], american_result["boundary_prices"], label = "Exercise Boundary")
+            ax.axhline(K, color = "gray", linestyle = "--", label = "Strike Price")
+            ax.set_xlabel("Time (years)")
+            ax.set_ylabel("Critical Stock Price ($)")
+            ax.set_title(f"American {type} Early Exercise Boundary")
+            ax.legend()
+            ax.grid(True)
+            with section("render: exercise boundary"):
+                st.pyplot(fig)
+
+
+
+
+    # CONVERGENCE PLOT (using Matplotlib)!!!
+    st.subheader("Binomial vs Black–Scholes Convergence")
+    st.write(
+        "This visualization shows how the Binomial option price converges "
+        "to the Black–Scholes price as the number of steps in the binomial tree increases."
+    )
+    steps_list = [2, 4, 8, 16, 32, 64, 128, 256, 512]
+    # Different lattices (ways of building the tree) converge at very different speeds, so let the user compare them
+    lattice_names = {"crr": "Cox-Ross-Rubinstein", "tian": "Tian", "lr": "Leisen-Reimer", "trinomial": "Trinomial"}
+    lattices = st.multiselect("Lattices to compare", list(lattice_names), default = ["crr"], format_func = lattice_names.get)
+
+    # Compute Black-Scholes price (European call only for comparison) 
+    # NOTE: These are the ONLY DIFFERENT LINES OF CODE compared to the Convergence Plot with Black Scholes
+    if type == "Call":
+        bs_price = cached(call_price)(S, K, r, T, sigma)
+    else:
+        bs_price = cached(put_price)(S, K, r, T, sigma)   # 
+
+    # Instead of using plt for everything I ran the line of code below bc otherwise Streamlit would be confused
+    fig, ax = plt.subplots(figsize=(8,4))
+    for lattice in lattices:
+        # Here, I calculate the whole price vs steps series in one call (it shares the setup work across the step counts)
+        convergence = cached(binomial_convergence)(S, K, r, T, sigma, steps_list, type = type, american = False, richardson = True, lattice = lattice)
+        ax.plot(convergence["steps"], convergence["prices"], marker = "o", label = f"{lattice_names[lattice]} (European)")
+        # Richardson extrapolation combines consecutive step counts to cancel out most of the error
+        if len(lattices) == 1:
+            ax.plot(convergence["steps"], convergence["richardson"], marker = "x", linestyle = ":", label = "Richardson Extrapolation")
+    ax.axhline(bs_price, linestyle = "--", label = "Black Scholes Price")
+    ax.set_xscale("log", base = 2) # Reminder that options distribution is Logarithmic!
+    ax.set_xlabel("Binomial Steps") 
+    ax.set_ylabel(f"{type} Price ($)")
+    ax.set_title("Convergence of Binomial Price to Black–Scholes")
+    ax.legend()
+    ax.grid(True)
+    with section("render: convergence plot"):
+        st.pyplot(fig)
+
+    st.info(
+        "As the number of steps in the binomial tree increases, "
+        "the Binomial model price converges to the Black–Scholes price. "
+        "This is because the binomial approach approximates the continuous-time "
+        "process assumed in Black–Scholes. "
+        "Note: The x-axis is scaled by log2 because an options distribution "
+        "is logarithmic (browse the internet if you're curious why). "
+    )
+finally:
+    # Stop recording even if something above raised (or Streamlit stopped/reran the script), otherwise the profiler
+    # would stay active in this session's thread and keep recording every later rerun
+    if profiler is not None:
+        profiler.stop()
+
+# Show how often the shared pricing cache saved us from recomputing (useful when many people use the app at once)
+cache_stats = pricing_cache.stats()
+st.sidebar.caption(f"Pricing cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['size']} stored, {cache_stats['disk_hits']} loaded from disk)")
+
+# Profiling panel: timings of everything that ran during this rerun (results served from the cache don't show up)
+if profiler is not None:
+    with st.expander("Profiling (this rerun)", expanded = True):
+        st.dataframe(profiler.table())
+        counters = profiler.snapshot()["counters"]
+        st.caption(", ".join(f"{name}: {value:,}" for name, value in counters.items()) or "No counters recorded (everything came from the cache)")
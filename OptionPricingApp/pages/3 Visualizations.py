@@ -1,5 +1,5 @@
 # Enable Python to find modules from the parent directory (OptionPricingApp)
-import sys, os
+import sys, os, io
 sys.path.append(os.path.abspath(".."))
 
 import streamlit as st
@@ -8,8 +8,29 @@ import matplotlib.pyplot as plt
 
 # Import both Black Scholes models as well as the Binomial Model (for Convergence visualization)
 # Also import the greeks for the greeks visualization
-from models.black_scholes import call_price, put_price, greeks
+from models.black_scholes import call_price, put_price, greeks, batch_price
 from models.binomial import binomial_price
+from models.finite_difference import fd_greeks
+# Implied volatility surface (SVI smiles per expiry, with arbitrage checks)
+from models.surface import VolSurface
+# The heatmap and Greeks charts go through the shared cache (so they are only recomputed when their inputs change)
+from models.cache import pricing_cache
+# Level of detail sampling: price a coarse grid/curve first, then only add points where it curves
+from models.refine import progressive_grid, refine_curve
+# Opt-in profiling (where does the time go during a rerun: pricing or drawing the charts?)
+from models.profiling import Profiler, section
+
+# Charts are rendered ONCE per set of inputs into a PNG and kept in the shared cache, so a rerun with the same inputs
+# (or another analyst looking at the same chart) just resends the image. CHART_DPI is half of st.pyplot's default (200),
+# so the images have a quarter of the pixels to send (and draw faster) and are still sharp enough for a chart.
+CHART_DPI = 100
+
+def figure_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format = "png", dpi = CHART_DPI, bbox_inches = "tight")
+    # Close the figure, otherwise pyplot keeps every figure ever drawn around (the memory adds up on a shared server)
+    plt.close(fig)
+    return buffer.getvalue()
 
 # Page Introduction
 st.title("Option Pricing Visualizations")
@@ -20,7 +41,7 @@ Explore the interactive heatmaps and comparisons between models!
 
 # Sidebar: I will allow the user to select the option type as well as visualization
 option_type = st.sidebar.selectbox("Option Type", ["Call", "Put"])
-visualization = st.sidebar.selectbox("Choose Visualization", ["K vs. σ Heatmap", "Greeks Visualization"])
+visualization = st.sidebar.selectbox("Choose Visualization", ["K vs. σ Heatmap", "Greeks Visualization", "Volatility Surface (SVI)"])
 
 # Shared parameters for both visualizations
 S = st.sidebar.number_input("Current Asset Price (S)", min_value = 0.01, value = 100.0)
@@ -28,91 +49,207 @@ K = st.sidebar.number_input("Strike Price (K)", min_value = 0.01, value = 100.0)
 r = st.sidebar.slider("Risk-free Interest Rate (r)", 0.0, 0.1, 0.01, step = 0.005)
 T = st.sidebar.slider("Time to Expiration (T in years)", 0.0, 5.0, 1.0, step = 0.1)
 sigma = st.sidebar.slider("Volatility (σ)", 0.05, 1.0, 0.2, step=0.05)
-
-# Heatmap
-if visualization == "K vs. σ Heatmap":
-    st.subheader(f"{option_type} Option Price Heatmap (Strike Price vs Volatility)")
-    st.write("Note: The heatmap prices are determined by the Black-Scholes Model")
-
-    K_values = np.linspace(K * 0.5, K * 1.5, 100)
-    sigma_values = np.linspace(sigma * 0.5, sigma * 1.5, 100)
-    # Create the numpy array of prices of 100x100 (to reflect size of K_values and sigma_values)
-    # Note that I'm going to eventually fill in the array
-    prices = np.zeros((len(sigma_values), len(K_values)))
-
-    # I'm going to use the Black Scholes Model to determine heat map prices
-    # Using enumerate to retrive both the index and the actual values in sigma_values and K_values
-    for i, sigma in enumerate(sigma_values):
-        for j, k in enumerate(K_values):
-            if option_type == "Call":
-                prices[i, j] = call_price(S, k, r, T, sigma)
+# When the profiling panel is on, every pricing call and chart from here on is timed (it shows up at the bottom of the page)
+show_profiling = st.sidebar.checkbox("Show profiling panel", value = False)
+# Progressive rendering: a coarse chart first, then refined only where the prices curve (see models/refine.py)
+progressive = st.sidebar.checkbox("Progressive rendering", value = True)
+profiler = Profiler().start() if show_profiling else None
+try:
+
+    # Heatmap
+    if visualization == "K vs. σ Heatmap":
+        st.subheader(f"{option_type} Option Price Heatmap (Strike Price vs Volatility)")
+        st.write("Note: The heatmap prices are determined by the Black-Scholes Model")
+
+        def heatmap_figure(K_values, sigma_values, prices):
+            fig, ax = plt.subplots()
+            # Creating heatmap using .imshow(name of array, bounding box (extent = [))
+            c = ax.imshow(prices, 
+                          # bounding box
+                          extent = [K_values.min(), K_values.max(),
+                                          sigma_values.min(), sigma_values.max()],
+                          # make sure that the first index of the array [0, 0] is found on the bottom left
+                          origin = "lower", 
+                          # if I didn't have this line of code everything would be squashed (no clue why)
+                          aspect = "auto",
+                          # I decided to choose the Red, Yellow, Green color scheme (thought it was easiest to visualize) 
+                          cmap = "RdYlGn")
+            # This line maps my data values for my heatmap c (using prices for my values) to my chosen colorscheme RdYlGn
+            fig.colorbar(c, ax = ax, label = "Option Price")
+            ax.set_xlabel("Strike Price (K)")
+            ax.set_ylabel("Volatility (σ)")
+            ax.set_title(f"{option_type} Price Heatmap")
+            return fig
+
+        def draw_heatmap(S, K, r, T, sigma, option_type, progressive):
+            # Price the grid with vectorized calls (rows are volatilities, columns are strikes) by broadcasting a column of
+            # sigmas against a row of strikes. A picture doesn't need 16 digits, so float32 halves the memory (the prices
+            # are still good to well under a cent, see models/black_scholes.py)
+            def price(K_values, sigma_values):
+                return batch_price(S, K_values, r, T, sigma_values, option_type, dtype = "float32")["price"]
+
+            if progressive:
+                # Coarse 17x17 grid first (shown right away), then 3 refinements up to 129x129 that only price the cells
+                # that curve (around the strike), the rest is interpolated
+                for stage in progressive_grid(price, (K * 0.5, K * 1.5), (sigma * 0.5, sigma * 1.5)):
+                    if stage["level"] == 0:
+                        preview.image(figure_png(heatmap_figure(stage["x"], stage["y"], stage["values"])), caption = "Coarse preview (refining...)")
+                K_values, sigma_values, prices, priced = stage["x"], stage["y"], stage["values"], stage["priced"]
+            else:
+                K_values = np.linspace(K * 0.5, K * 1.5, 100)
+                sigma_values = np.linspace(sigma * 0.5, sigma * 1.5, 100)
+                prices = price(K_values[np.newaxis, :], sigma_values[:, np.newaxis])
+                priced = prices.size
+            with section("render: heatmap"):
+                png = figure_png(heatmap_figure(K_values, sigma_values, prices))
+            return {"png": png, "priced": priced, "points": prices.size}
+
+        preview = st.empty()
+        heatmap = pricing_cache.get_or_compute("visualizations.heatmap", draw_heatmap, S, K, r, T, sigma, option_type, progressive)
+        preview.image(heatmap["png"])
+        if heatmap["priced"] < heatmap["points"]:
+            st.caption(f"Priced {heatmap['priced']:,} of the {heatmap['points']:,} grid points (the rest are interpolated)")
+
+    # GREEKS VISUALIZATION
+    elif visualization == "Greeks Visualization":
+        st.subheader("Greeks Visualization")
+        st.write("Scroll down to the bottom of the parameters to select which Greek you'd like to plot.")
+
+        # Sidebar: Greek selection
+        greek_choice = st.sidebar.selectbox(
+            "Select Greek to Plot",
+            ["Delta", "Gamma", "Theta", "Vega", "Rho"]
+        )
+        # Sidebar: which model the Greeks come from (the finite difference solver also covers American options)
+        greek_model = st.sidebar.selectbox("Greeks Model", ["Black-Scholes (European)", "Finite Difference (American)"])
+
+        # Dictionary of Greek descriptions
+        greek_descriptions = {
+            "Delta": "Sensitivity of option price to underlying asset price (hedge ratio).",
+            "Gamma": "Rate of change of Delta (convexity of option value).",
+            "Theta": "Sensitivity of option price to time decay (time value erosion).",
+            "Vega": "Sensitivity of option price to volatility (volatility exposure).",
+            "Rho": "Sensitivity of option price to interest rate changes."
+        }
+
+        # Show description dynamically (after they choose the greek to plot)
+        st.write(greek_choice, ": ", greek_descriptions[greek_choice])
+
+        def draw_greek(S, K, r, T, sigma, option_type, greek_choice, greek_model, progressive):
+            name = greek_choice.lower()
+            # Making a stock price range for plotting Greeks (I'm going to make this more modest)
+            if greek_model == "Black-Scholes (European)" and progressive:
+                # 25 evenly spaced points, then more only where the curve bends (around the strike), up to 200
+                S_values, greek_values = refine_curve(lambda S_values: batch_price(S_values, K, r, T, sigma, option_type)[name], 0.5 * K, 1.5 * K)
+            elif greek_model == "Black-Scholes (European)":
+                # Compute all Greeks across S_values (one vectorized call, using the Greeks of the selected option type)
+                S_values = np.linspace(0.5 * K, 1.5 * K, 200)
+                greek_values = batch_price(S_values, K, r, T, sigma, option_type)[name]
             else:
-                prices[i, j] = put_price(S, k, r, T, sigma)
-
-    fig, ax = plt.subplots()
-    # Creating heatmap using .imshow(name of array, bounding box (extent = [))
-    c = ax.imshow(prices, 
-                  # bounding box
-                  extent = [K_values.min(), K_values.max(),
-                                  sigma_values.min(), sigma_values.max()],
-                  # make sure that the first index of the array [0, 0] is found on the bottom left
-                  origin = "lower", 
-                  # if I didn't have this line of code everything would be squashed (no clue why)
-                  aspect = "auto",
-                  # I decided to choose the Red, Yellow, Green color scheme (thought it was easiest to visualize) 
-                  cmap = "RdYlGn")
-    # This line maps my data values for my heatmap c (using prices for my values) to my chosen colorscheme RdYlGn
-    fig.colorbar(c, ax = ax, label = "Option Price")
-    ax.set_xlabel("Strike Price (K)")
-    ax.set_ylabel("Volatility (σ)")
-    ax.set_title(f"{option_type} Price Heatmap")
-    st.pyplot(fig)
-
-# GREEKS VISUALIZATION
-else:
-    st.subheader("Greeks Visualization")
-    st.write("Scroll down to the bottom of the parameters to select which Greek you'd like to plot.")
-
-    # Sidebar: Greek selection
-    greek_choice = st.sidebar.selectbox(
-        "Select Greek to Plot",
-        ["Delta", "Gamma", "Theta", "Vega", "Rho"]
-    )
-
-    # Dictionary of Greek descriptions
-    greek_descriptions = {
-        "Delta": "Sensitivity of option price to underlying asset price (hedge ratio).",
-        "Gamma": "Rate of change of Delta (convexity of option value).",
-        "Theta": "Sensitivity of option price to time decay (time value erosion).",
-        "Vega": "Sensitivity of option price to volatility (volatility exposure).",
-        "Rho": "Sensitivity of option price to interest rate changes."
-    }
-
-    # Show description dynamically (after they choose the greek to plot)
-    st.write(greek_choice, ": ", greek_descriptions[greek_choice])
-
-    # Making a stock price range for plotting Greeks (I'm going to make this more modest)
-    S_values = np.linspace(0.5 * K, 1.5 * K, 200)
-
-    # Compute all Greeks across S_values
-    all_greeks = [greeks(S, K, r, T, sigma) for S in S_values]
-
-    # Extract chosen Greek
-    greek_map = {
-        "Delta": [g["delta"] for g in all_greeks],
-        "Gamma": [g["gamma"] for g in all_greeks],
-        "Theta": [g["theta"] for g in all_greeks],
-        "Vega":  [g["vega"] for g in all_greeks],
-        "Rho":   [g["rho"] for g in all_greeks],
-    }
-    greek_values = greek_map[greek_choice]
-
-    # Plot chosen Greek
-    fig, ax = plt.subplots()
-    ax.plot(S_values, greek_values, label = greek_choice)
-    ax.axhline(0, color = "black", linewidth = 1)
-    ax.set_title(f"{greek_choice} vs Stock Price")
-    ax.set_xlabel("Stock Price ($)")
-    ax.set_ylabel(greek_choice)
-    ax.legend()
-    st.pyplot(fig)
+                # One PDE solve gives the whole curve (delta and gamma straight from the grid, vega and rho from bumped copies solved alongside)
+                S_values = np.linspace(0.5 * K, 1.5 * K, 200)
+                greek_values = fd_greeks(S_values, K, r, T, sigma, option_type, american = True)[name]
+
+            # Plot chosen Greek
+            fig, ax = plt.subplots()
+            ax.plot(S_values, greek_values, label = greek_choice)
+            ax.axhline(0, color = "black", linewidth = 1)
+            ax.set_title(f"{greek_choice} vs Stock Price ({greek_model})")
+            ax.set_xlabel("Stock Price ($)")
+            ax.set_ylabel(greek_choice)
+            ax.legend()
+            with section("render: greeks plot"):
+                return {"png": figure_png(fig), "points": S_values.size}
+
+        greek_chart = pricing_cache.get_or_compute(
+            "visualizations.greeks", draw_greek, S, K, r, T, sigma, option_type, greek_choice, greek_model, progressive
+        )
+        st.image(greek_chart["png"])
+        st.caption(f"{greek_chart['points']} points on the curve")
+
+    # VOLATILITY SURFACE
+    else:
+        st.subheader("Implied Volatility Surface (SVI)")
+        st.write(
+            "Instead of one σ for every option, each expiry gets its own volatility smile fitted to the quoted implied vols "
+            "(here sample quotes built from the sliders, with σ as the at-the-money level). The fit is checked for butterfly "
+            "and calendar arbitrage."
+        )
+        skew = st.sidebar.slider("Skew", -0.5, 0.5, -0.15, step = 0.05)
+        curvature = st.sidebar.slider("Smile Curvature", 0.0, 1.0, 0.3, step = 0.05)
+        premium = st.sidebar.slider("Short-dated Vol Premium (expiries up to 3 months)", 0.0, 0.2, 0.0, step = 0.01)
+
+        # Sample quotes: 17 strikes per expiry around the forward
+        expiries = [0.1, 0.25, 0.5, 1.0, 2.0]
+        strikes = np.linspace(0.6 * S, 1.4 * S, 17)
+        quotes = {}
+        for expiry in expiries:
+            k = np.log(strikes / (S * np.exp(r * expiry)))
+            level = sigma + (premium if expiry <= 0.25 else 0.0)
+            quotes[expiry] = (strikes, np.maximum(level + skew * k + curvature * k ** 2, 0.01))
+
+        # The surface lives in the session, so moving a slider only refits the expiries whose quotes actually changed
+        # (e.g. the short-dated premium only touches the first two expiries)
+        surface = st.session_state.get("vol_surface")
+        if surface is None or surface.S != S or surface.r != r:
+            surface = st.session_state["vol_surface"] = VolSurface(S, r)
+        changed = {
+            expiry: quote for expiry, quote in quotes.items()
+            if expiry not in surface.quotes or not np.array_equal(surface.quotes[expiry][1], quote[1])
+        }
+        refitted = surface.update(changed) if changed else []
+        st.caption(f"Refitted {len(refitted)} of {len(expiries)} expiries on this rerun")
+
+        # Fitted smiles (lines) against the quotes (dots)
+        fig, ax = plt.subplots()
+        K_fine = np.linspace(strikes.min(), strikes.max(), 200)
+        for expiry in expiries:
+            line, = ax.plot(K_fine, surface.vol(K_fine, expiry), label = f"T = {expiry}")
+            ax.scatter(strikes, quotes[expiry][1], s = 10, color = line.get_color())
+        ax.set_xlabel("Strike Price (K)")
+        ax.set_ylabel("Implied Volatility (σ)")
+        ax.set_title("Fitted SVI Smiles")
+        ax.legend()
+        with section("render: smiles"):
+            st.image(figure_png(fig))
+
+        # σ(K, T) over the whole surface in one vectorized lookup (interpolated between the expiries)
+        T_values = np.linspace(0.05, 2.0, 80)
+        surface_vols = surface.vol(K_fine[np.newaxis, :], T_values[:, np.newaxis])
+        fig, ax = plt.subplots()
+        c = ax.imshow(surface_vols, extent = [K_fine.min(), K_fine.max(), T_values.min(), T_values.max()],
+                      origin = "lower", aspect = "auto", cmap = "RdYlGn_r")
+        fig.colorbar(c, ax = ax, label = "Implied Volatility")
+        ax.set_xlabel("Strike Price (K)")
+        ax.set_ylabel("Time to Expiration (T)")
+        ax.set_title("σ(K, T)")
+        with section("render: surface"):
+            st.image(figure_png(fig))
+
+        # The selected option priced off the surface instead of the flat σ slider
+        surface_price = (call_price if option_type == "Call" else put_price)(S, K, r, T, surface)
+        st.write(f"{option_type} price with the surface's σ = {surface.vol(K, max(T, 1e-8)):.4f}: **${surface_price:.2f}**")
+
+        report = surface.arbitrage_report()
+        if report["arbitrage_free"]:
+            st.success("No butterfly or calendar arbitrage in the fitted surface.")
+        else:
+            problems = [f"butterfly at T = {expiry}" for expiry, g in report["butterfly"].items() if g < -1e-6]
+            problems += [f"calendar between T = {a} and T = {b}" for (a, b), gap in report["calendar"].items() if gap < -1e-6]
+            st.warning("The quotes leave some arbitrage the fit couldn't smooth out: " + ", ".join(problems))
+finally:
+    # Stop recording even if something above raised (or Streamlit stopped/reran the script), otherwise the profiler
+    # would stay active in this session's thread and keep recording every later rerun
+    if profiler is not None:
+        profiler.stop()
+
+# Show how often the shared pricing cache saved us from recomputing (useful when many people use the app at once)
+cache_stats = pricing_cache.stats()
+st.sidebar.caption(f"Pricing cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['size']} stored, {cache_stats['disk_hits']} loaded from disk)")
+
+# Profiling panel: timings of everything that ran during this rerun (results served from the cache don't show up)
+if profiler is not None:
+    with st.expander("Profiling (this rerun)", expanded = True):
+        st.dataframe(profiler.table())
+        counters = profiler.snapshot()["counters"]
+        st.caption(", ".join(f"{name}: {value:,}" for name, value in counters.items()) or "No counters recorded (everything came from the cache)")
@@ -39,3 +39,177 @@ print(test_binomial_euro_put_converges_to_bs())
 print(test_american_call_equals_euro_when_no_dividends())
 print(test_american_put_is_at_least_european_put())
 
+
+# Test that the batched pricer matches pricing the contracts one at a time
+import numpy as np
+from models.binomial import binomial_price_batch
+
+def test_batch_matches_single_contract_pricing():
+    S = np.array([90, 100, 110, 100, 100])
+    K = np.array([100, 100, 100, 120, 80])
+    T = np.array([1.0, 0.5, 2.0, 1.0, 0.25])
+    types = np.array(["Call", "Put", "Put", "Call", "Put"])
+    for american in [False, True]:
+        batch = binomial_price_batch(S, K, 0.05, T, 0.25, 150, types, american, div_yield = 0.02)
+        for i in range(len(S)):
+            single = binomial_price(S[i], K[i], 0.05, T[i], 0.25, 150, types[i], american, div_yield = 0.02)
+            assert abs(batch[i] - single) < 1e-10
+
+def test_batch_handles_expired_and_zero_vol_contracts():
+    prices = binomial_price_batch(100, [90, 90, 110], 0.05, [0, 1, 1], [0.2, 0, 0.2], 50, "Call")
+    assert prices[0] == 10
+    assert abs(prices[1] - binomial_price(100, 90, 0.05, 1, 0, 50)) < 1e-12
+    assert abs(prices[2] - binomial_price(100, 110, 0.05, 1, 0.2, 50)) < 1e-10
+
+# Test that the one-call convergence series matches pricing each step count separately
+from models.binomial import binomial_convergence, iter_binomial_convergence
+
+def test_convergence_series_matches_binomial_price():
+    for type in ["Call", "Put"]:
+        for american in [False, True]:
+            series = binomial_convergence(100, 95, 0.05, 1, 0.3, [2, 16, 128], type, american, div_yield = 0.01)
+            for n, price in zip(series["steps"], series["prices"]):
+                assert abs(price - binomial_price(100, 95, 0.05, 1, 0.3, n, type, american, 0.01)) < 1e-9
+
+def test_convergence_streams_and_extrapolates():
+    streamed = list(iter_binomial_convergence(100, 100, 0.01, 1, 0.2, [8, 16]))
+    assert [n for n, _ in streamed] == [8, 16]
+    series = binomial_convergence(100, 100, 0.01, 1, 0.2, [64, 128, 256, 512], richardson = True)
+    bs = call_price(100, 100, 0.01, 1, 0.2)
+    assert np.isnan(series["richardson"][0])
+    # The extrapolated price should be closer to Black-Scholes than the raw 512 step price
+    assert abs(series["richardson"][-1] - bs) < abs(series["prices"][-1] - bs)
+
+# Test the American path with the early exercise boundary
+from models.binomial import binomial_american
+
+# Independent reference: the original full-tree loop (rebuilds the node prices at every level), which also records the
+# highest node price where the put is exercised at each level
+def _reference_american_put(S, K, r, T, sigma, steps):
+    dt = T / steps
+    u = np.exp(sigma * np.sqrt(dt))
+    d = 1.0 / u
+    disc = np.exp(-r * dt)
+    p = (np.exp(r * dt) - d) / (u - d)
+    values = np.maximum(K - S * u ** np.arange(steps + 1) * d ** (steps - np.arange(steps + 1)), 0.0)
+    boundary = np.full(steps + 1, np.nan)
+    boundary[steps] = K
+    for i in range(steps - 1, -1, -1):
+        values = disc * (p * values[1:] + (1 - p) * values[:-1])
+        Sj = S * u ** np.arange(i + 1) * d ** (i - np.arange(i + 1))
+        exercise = np.maximum(K - Sj, 0.0)
+        exercised = (exercise >= values) & (exercise > 0)
+        if exercised.any():
+            boundary[i] = Sj[exercised].max()
+        values = np.maximum(values, exercise)
+    return float(values[0]), boundary
+
+def test_american_put_boundary_is_below_the_strike():
+    result = binomial_american(100, 100, 0.05, 1, 0.2, 200, "Put")
+    price, reference_boundary = _reference_american_put(100, 100, 0.05, 1, 0.2, 200)
+    assert abs(result["price"] - price) < 1e-10
+    assert np.allclose(result["boundary_prices"], reference_boundary, rtol = 1e-10, equal_nan = True)
+    boundary = result["boundary_prices"]
+    assert len(boundary) == len(result["boundary_times"]) == 201
+    assert boundary[-1] == 100
+    # Wherever the put is exercised early, it is only below the strike
+    assert np.nanmax(boundary[:-1]) < 100
+
+def test_american_call_without_dividends_skips_the_tree():
+    result = binomial_american(100, 100, 0.05, 1, 0.2, 500, "Call")
+    euro = binomial_price(100, 100, 0.05, 1, 0.2, 500, "Call", False)
+    assert abs(result["price"] - euro) < 1e-9
+    assert np.isnan(result["boundary_prices"]).all()
+    # With dividends, early exercise can pay off, so the boundary shows up (above the strike)
+    dividends = binomial_american(100, 100, 0.05, 1, 0.2, 200, "Call", div_yield = 0.08)
+    assert np.nanmin(dividends["boundary_prices"]) >= 100
+
+# With no volatility the American price is the better of exercising now and the discounted payoff, on every path
+def test_american_zero_volatility():
+    for type, S, K in [("Put", 90, 100), ("Put", 100, 90), ("Call", 110, 100)]:
+        price = binomial_american(S, K, 0.05, 1, 0.0, 100, type)["price"]
+        assert price == binomial_price(S, K, 0.05, 1, 0.0, 100, type, True)
+        assert price == float(binomial_price_batch(S, K, 0.05, 1, 0.0, 100, type, True))
+        assert price >= max((1 if type == "Call" else -1) * (S - K), 0)
+    # Deep in the money put: exercising right away beats waiting for the (discounted) strike
+    assert binomial_price(90, 100, 0.05, 1, 0.0, 100, "Put", True) == 10
+    assert binomial_price(90, 100, 0.05, 1, 0.0, 100, "Put", False) < 10
+
+# Test the tree Greeks against the Black-Scholes Greeks (European) and bump-and-reprice (American)
+from models.binomial import binomial_greeks
+from models.black_scholes import batch_price
+
+def test_european_tree_greeks_match_black_scholes():
+    tree = binomial_greeks(100, 100, 0.05, 1, 0.2, 1000, "Put")
+    bs = batch_price(100, 100, 0.05, 1, 0.2, "Put")
+    assert set(tree) == set(bs)
+    for name, tolerance in [("delta", 1e-3), ("gamma", 1e-3), ("vega", 0.1), ("theta", 0.02), ("rho", 0.05)]:
+        assert abs(tree[name] - bs[name]) < tolerance
+
+def test_american_tree_greeks_match_bumped_prices():
+    S = np.array([90.0, 100.0, 110.0])
+    tree = binomial_greeks(S, 100, 0.05, 1, 0.2, 400, "Put", american = True)
+    for i in range(len(S)):
+        h = 0.5
+        up = binomial_price(S[i] + h, 100, 0.05, 1, 0.2, 400, "Put", True)
+        down = binomial_price(S[i] - h, 100, 0.05, 1, 0.2, 400, "Put", True)
+        assert abs(tree["delta"][i] - (up - down) / (2 * h)) < 0.01
+        rho = (binomial_price(S[i], 100, 0.051, 1, 0.2, 400, "Put", True)
+               - binomial_price(S[i], 100, 0.049, 1, 0.2, 400, "Put", True)) / 0.002
+        assert abs(tree["rho"][i] - rho) < 0.5
+
+# Zero volatility American contracts: the same price as binomial_price (never below intrinsic), with matching Greeks
+def test_american_zero_volatility_greeks():
+    S = np.array([80.0, 100.0, 120.0])
+    greeks = binomial_greeks(S, 100, 0.05, 1, 0.0, 200, "Put", american = True)
+    for i in range(len(S)):
+        assert greeks["price"][i] == binomial_price(S[i], 100, 0.05, 1, 0.0, 200, "Put", True)
+    # Deep in the money: exercised right away, so it moves one for one with S and doesn't decay
+    assert greeks["price"][0] == 20 and greeks["delta"][0] == -1 and greeks["theta"][0] == 0
+    european = binomial_greeks(S, 100, 0.05, 1, 0.0, 200, "Put")
+    assert european["price"][0] < 20 and european["theta"][0] > 0
+    assert greeks["price"][2] == european["price"][2] == 0
+
+# Test the other lattices (Tian, Leisen-Reimer and trinomial)
+from models.binomial import binomial_convergence, LATTICES
+
+def test_leisen_reimer_converges_much_faster_than_crr():
+    bs = put_price(100, 100, 0.05, 1, 0.2)
+    lr = binomial_price(100, 100, 0.05, 1, 0.2, 51, "Put", lattice = "lr")
+    crr = binomial_price(100, 100, 0.05, 1, 0.2, 512, "Put")
+    assert abs(lr - bs) < abs(crr - bs)
+    assert abs(lr - bs) < 1e-3
+
+def test_all_lattices_agree_for_american_options():
+    prices = [binomial_price(100, 110, 0.05, 1, 0.3, 500, "Put", True, lattice = lattice) for lattice in LATTICES]
+    assert max(prices) - min(prices) < 0.01
+
+def test_convergence_series_for_each_lattice():
+    bs = call_price(100, 95, 0.03, 0.5, 0.25)
+    for lattice in LATTICES:
+        series = binomial_convergence(100, 95, 0.03, 0.5, 0.25, [16, 64, 256], "Call", lattice = lattice)
+        assert abs(series["prices"][-1] - bs) < 0.02
+        # The closed form series matches the tree itself
+        n = series["steps"][1]
+        assert abs(series["prices"][1] - binomial_price(100, 95, 0.03, 0.5, 0.25, n, "Call", lattice = lattice)) < 1e-9
+    # Leisen-Reimer only uses odd step counts
+    assert list(binomial_convergence(100, 95, 0.03, 0.5, 0.25, [16, 64], lattice = "lr")["steps"]) == [17, 65]
+
+# Test the float32 trees against float64 (and writing the prices into a caller-supplied buffer)
+def test_binomial_batch_float32():
+    S = np.linspace(80, 120, 21)
+    double = binomial_price_batch(S, 100, 0.05, 1, 0.2, 500, "Put", True)
+    buffer = np.empty(21, dtype = np.float32)
+    single = binomial_price_batch(S, 100, 0.05, 1, 0.2, 500, "Put", True, dtype = "float32", out = buffer)
+    assert single is buffer
+    assert np.abs(single - double).max() < 1e-4
+    # Every lattice within the relative error documented for 500 steps (the precision note in models/binomial.py)
+    S = np.linspace(50, 150, 11)[:, np.newaxis]
+    sigma = np.array([0.1, 0.5])[:, np.newaxis, np.newaxis]
+    T = np.array([0.1, 2.0])
+    bounds = {"crr": 1.9e-5, "tian": 1.3e-5, "lr": 2.1e-5, "trinomial": 1.1e-5}
+    for lattice, bound in bounds.items():
+        for type in ["Call", "Put"]:
+            double = binomial_price_batch(S, 100, 0.03, T, sigma, 500, type, True, lattice = lattice)
+            single = binomial_price_batch(S, 100, 0.03, T, sigma, 500, type, True, lattice = lattice, dtype = "float32")
+            assert (np.abs(single - double) / np.maximum(double, 1)).max() < bound
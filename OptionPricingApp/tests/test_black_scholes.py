@@ -20,4 +20,118 @@ def test_put_call_parity(S, K, r, T, sigma):
 
 # Should get no AssertionErrors no matter what the parameters are
 test_put_call_parity(100, 100, 0.05, 1, 0.2)
-test_put_call_parity(50, 200, 0.03, 4, 0)
\ No newline at end of file
+test_put_call_parity(50, 200, 0.03, 4, 0)
+
+# Test the vectorized batch pricer against the scalar functions
+import numpy as np
+from models.black_scholes import greeks, batch_price
+
+def test_batch_price_matches_scalar_functions():
+    K = np.linspace(50, 150, 11)
+    calls = batch_price(100, K, 0.05, 1, 0.2, "Call")
+    puts = batch_price(100, K, 0.05, 1, 0.2, "Put")
+    for i, k in enumerate(K):
+        assert abs(calls["price"][i] - call_price(100, k, 0.05, 1, 0.2)) < 1e-10
+        assert abs(puts["price"][i] - put_price(100, k, 0.05, 1, 0.2)) < 1e-10
+        g = greeks(100, k, 0.05, 1, 0.2)
+        for name in ["delta", "gamma", "vega", "theta", "rho"]:
+            assert abs(calls[name][i] - g[name]) < 1e-10
+    # Put delta is just call delta - 1
+    assert np.allclose(puts["delta"], calls["delta"] - 1)
+
+def test_batch_price_mixed_types_and_edge_cases():
+    S = np.array([100, 100, 100, 100, 120, 80])
+    T = np.array([1, 1, 0, 0, 1, 1])
+    sigma = np.array([0.2, 0.2, 0.2, 0.2, 0, 0])
+    types = np.array(["Call", "Put", "Call", "Put", "Call", "Put"])
+    out = batch_price(S, 100, 0.03, T, sigma, types)
+    assert abs(out["price"][0] - call_price(100, 100, 0.03, 1, 0.2)) < 1e-10
+    assert abs(out["price"][1] - put_price(100, 100, 0.03, 1, 0.2)) < 1e-10
+    # Expired contracts are worth their payoff with zero Greeks
+    assert out["price"][2] == 0 and out["price"][3] == 0 and out["delta"][2] == 0
+    # Zero volatility contracts are worth their discounted intrinsic value
+    assert abs(out["price"][4] - call_price(120, 100, 0.03, 1, 0)) < 1e-10
+    assert abs(out["price"][5] - put_price(80, 100, 0.03, 1, 0)) < 1e-10
+    assert out["delta"][4] == 1 and out["delta"][5] == -1
+    assert np.all(np.isfinite(out["gamma"]))
+
+# Test the fast cold start: pricing one option in a fresh process shouldn't load NumPy or SciPy at all
+import subprocess
+
+def test_scalar_pricing_does_not_load_numpy_or_scipy():
+    code = (
+        "import sys\n"
+        "from models import call_price\n"
+        "call_price(100.0, 100.0, 0.05, 1.0, 0.2)\n"
+        "print([name for name in ('numpy', 'scipy') if type(sys.modules.get(name)).__name__ == 'module'])"
+    )
+    app_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd = app_folder, capture_output = True, text = True, check = True)
+    assert output.stdout.strip() == "[]"
+
+def test_scalar_functions_still_accept_arrays():
+    S = np.array([90.0, 100.0, 110.0])
+    assert np.allclose(call_price(S, 100, 0.05, 1, 0.2), batch_price(S, 100, 0.05, 1, 0.2)["price"])
+    assert np.allclose(greeks(S, 100, 0.05, 1, 0.2)["delta"], batch_price(S, 100, 0.05, 1, 0.2)["delta"])
+
+# The first use of the lazily imported NumPy can happen in several threads at once (Streamlit runs every session in its own thread)
+def test_lazy_numpy_is_thread_safe():
+    code = (
+        "from concurrent.futures import ThreadPoolExecutor\n"
+        "from models.black_scholes import batch_price\n"
+        "with ThreadPoolExecutor(8) as pool:\n"
+        "    prices = list(pool.map(lambda k: float(batch_price([100.0], k, 0.05, 1.0, 0.2)['price'][0]), range(90, 110)))\n"
+        "print(len(prices))"
+    )
+    app_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    for _ in range(3):
+        output = subprocess.run([sys.executable, "-c", code], cwd = app_folder, capture_output = True, text = True)
+        assert output.returncode == 0, output.stderr
+        assert output.stdout.strip() == "20"
+
+# Test float32 mode (within the documented error bounds) and caller-supplied output buffers
+def test_batch_price_float32_and_out_buffers():
+    K = np.linspace(50, 150, 101)
+    double = batch_price(100, K, 0.05, 1, 0.2, "Put")
+    single = batch_price(100, K, 0.05, 1, 0.2, "Put", dtype = "float32")
+    assert single["price"].dtype == np.float32
+    assert np.abs(single["price"] - double["price"]).max() < 5e-5
+    assert np.abs(single["delta"] - double["delta"]).max() < 5e-6
+
+    buffer = np.empty(101)
+    result = batch_price(100, K, 0.05, 1, 0.2, "Put", out = {"price": buffer})
+    assert result["price"] is buffer
+    assert np.allclose(buffer, double["price"])
+    # Buffers with the wrong shape or dtype are rejected instead of silently reallocated
+    try:
+        batch_price(100, K, 0.05, 1, 0.2, "Put", out = {"price": np.empty(100)})
+        assert False
+    except ValueError:
+        pass
+
+# Edge cases the plain-number path has to price like the formula's limit (and like batch_price) instead of raising
+def test_scalar_edge_cases():
+    assert call_price(0.0, 100, 0.05, 1, 0.2) == 0
+    assert abs(put_price(0.0, 100, 0.05, 1, 0.2) - 100 * math.exp(-0.05)) < 1e-12
+    assert call_price(100, 0.0, 0.05, 1, 0.2) == 100
+    assert put_price(100, 0.0, 0.05, 1, 0.2) == 0
+    flat = greeks(100, 100, 0.05, 1, 0.0)
+    batch = batch_price(100, 100, 0.05, 1, 0.0)
+    for name in ["delta", "gamma", "vega", "theta", "rho"]:
+        assert abs(flat[name] - float(batch[name])) < 1e-12
+    assert flat["delta"] == 1.0 and flat["vega"] == 0.0
+    assert greeks(0.0, 100, 0.05, 1, 0.2)["delta"] == 0.0
+
+# float32 stays within the bounds documented in the precision note (on a sample of the same input ranges)
+def test_batch_price_float32_documented_bounds():
+    rng = np.random.default_rng(7)
+    n = 100_000
+    S, K = rng.uniform(50, 150, n), rng.uniform(50, 150, n)
+    r, sigma = rng.uniform(0, 0.1, n), rng.uniform(0.05, 1, n)
+    T = np.exp(rng.uniform(np.log(1 / 365), np.log(2), n))
+    type = np.where(rng.random(n) < 0.5, "Call", "Put")
+    double = batch_price(S, K, r, T, sigma, type)
+    single = batch_price(S, K, r, T, sigma, type, dtype = "float32")
+    bounds = {"price": 4e-5, "delta": 8.5e-6, "gamma": 3.7e-5, "vega": 7.8e-5, "theta": 8.6e-4, "rho": 1.2e-4}
+    for name, bound in bounds.items():
+        assert np.abs(single[name] - double[name]).max() < bound
@@ -0,0 +1,78 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+
+from models.cache import PricingCache, cached
+from models.binomial import binomial_price
+from models.black_scholes import batch_price, call_price
+from models.surface import VolSurface
+
+# Test that repeated (and nearly identical) calls are served from the cache
+def test_hits_misses_and_quantized_keys():
+    cache = PricingCache(maxsize = 10)
+    price = cached(binomial_price, cache = cache)
+    first = price(100, 100, 0.1 + 0.2, 1, 0.2, 64)
+    second = price(100, 100, 0.3, 1, 0.2, 64)
+    assert first == second
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+# Test that positional, keyword and default forms of the same call share one entry
+def test_keys_ignore_how_arguments_are_passed():
+    cache = PricingCache()
+    price = cached(binomial_price, cache = cache)
+    first = price(100, 100, 0.05, 1, 0.2, 64, "Put")
+    assert price(100, 100, 0.05, 1, 0.2, 64, type = "Put") == first
+    assert price(S = 100, K = 100, r = 0.05, T = 1, sigma = 0.2, steps = 64, type = "Put") == first
+    price(100, 100, 0.05, 1, 0.2, 64)
+    assert price(100, 100, 0.05, 1, 0.2, 64, "Call", american = False) == price(100, 100, 0.05, 1, 0.2, 64)
+    assert cache.stats()["hits"] == 4 and cache.stats()["misses"] == 2
+
+# Test that a surface refitted in place gets a new entry, and that objects that can't be keyed by value aren't cached
+def test_mutable_arguments_are_keyed_by_value():
+    cache = PricingCache()
+    price = cached(call_price, cache = cache)
+    strikes = np.linspace(70, 130, 9)
+    surface = VolSurface(100, 0.05)
+    surface.update({1.0: (strikes, np.full(9, 0.2))})
+    before = price(100, 100, 0.05, 1, surface)
+    surface.update({1.0: (strikes, np.full(9, 0.4))})
+    after = price(100, 100, 0.05, 1, surface)
+    assert after == call_price(100, 100, 0.05, 1, surface) and after > before + 5
+    assert price(100, 100, 0.05, 1, surface) == after
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    calls = []
+    count_calls = cached(lambda x: calls.append(x) or len(calls), name = "calls", cache = cache)
+    marker = object()
+    assert count_calls(marker) == 1 and count_calls(marker) == 2
+    assert cache.stats()["size"] == 2
+
+def test_lru_eviction():
+    cache = PricingCache(maxsize = 2)
+    square = cached(lambda x: x * x, name = "square", cache = cache)
+    square(1)
+    square(2)
+    square(1)  # 1 is now the most recently used, so 2 gets evicted next
+    square(3)
+    assert cache.stats()["size"] == 2
+    square(1)
+    assert cache.stats()["hits"] == 2
+    square(2)
+    assert cache.stats()["misses"] == 4
+
+def test_cached_arrays_are_read_only():
+    cache = PricingCache()
+    out = cached(batch_price, cache = cache)(100, np.linspace(90, 110, 5), 0.01, 1, 0.2)
+    assert not out["price"].flags.writeable
+
+# Test that importing the cache (and the grid and portfolio modules) doesn't load NumPy or pandas
+import subprocess
+
+def test_imports_stay_lazy():
+    code = (
+        "import sys\n"
+        "import models.cache, models.grid, models.portfolio\n"
+        "print([name for name in ('numpy', 'pandas', 'scipy') if type(sys.modules.get(name)).__name__ == 'module'])"
+    )
+    app_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, "-c", code], cwd = app_folder, capture_output = True, text = True, check = True)
+    assert output.stdout.strip() == "[]"
@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import numpy as np
+
+# Import functions from the models I created
+from models.chain import price_chain
+from models.binomial import binomial_price_batch
+from models.curves import DividendSchedule
+
+STRIKES = np.linspace(80, 120, 9)
+EXPIRIES = np.array([0.1, 0.25, 0.5, 1.0])
+
+# Same prices as binomial_price_batch on the whole grid, in this process and on a pool of workers
+def test_chain_matches_batch():
+    for lattice in ["crr", "lr", "trinomial"]:
+        expected = binomial_price_batch(100, STRIKES, 0.03, EXPIRIES[:, np.newaxis], 0.25, 100, "Put", True, 0.01, lattice)
+        for workers in [1, 2]:
+            prices = price_chain(100, STRIKES, EXPIRIES, 0.03, 0.25, 100, "Put", True, 0.01, lattice, workers = workers)
+            assert prices.shape == (4, 9)
+            assert np.allclose(prices, expected, rtol = 0, atol = 1e-12)
+
+# A vol per strike (every strike gets its own lattice), mixed calls and puts, and discrete dividends
+def test_chain_smile_types_and_dividends():
+    sigma = 0.2 + 0.002 * np.abs(STRIKES - 100) + 0.01 * EXPIRIES[:, np.newaxis]
+    types = np.where(STRIKES > 100, "Call", "Put")
+    dividends = DividendSchedule([0.2, 0.6], [1.0, 1.0])
+    expected = binomial_price_batch(100, STRIKES, 0.03, EXPIRIES[:, np.newaxis], sigma, 100, types, True, dividends = dividends)
+    prices = price_chain(100, STRIKES, EXPIRIES, 0.03, sigma, 100, types, dividends = dividends, workers = 2)
+    assert np.allclose(prices, expected, rtol = 0, atol = 1e-12)
+
+# An expired row is worth the payoff
+def test_chain_expired_expiry():
+    prices = price_chain(100, STRIKES, [0.0, 0.5], 0.03, 0.25, 50, "Call", workers = 1)
+    assert np.allclose(prices[0], np.maximum(100 - STRIKES, 0))
+
+# A single strike, zero-vol expiries with dividends (early exercise sees the dividends still to come) and a reused pool
+def test_chain_edge_cases_and_pool_reuse():
+    from models import chain
+    single = price_chain(100, 100, EXPIRIES, 0.03, 0.25, 50, workers = 1)
+    assert single.shape == (4, 1)
+    assert np.allclose(single[:, 0], binomial_price_batch(100, 100, 0.03, EXPIRIES, 0.25, 50, "Put", True))
+    dividends = DividendSchedule([0.3], [5.0])
+    sigma = np.where(EXPIRIES[:, np.newaxis] < 0.3, 0.0, 0.25) + 0 * STRIKES
+    expected = binomial_price_batch(100, STRIKES, 0.03, EXPIRIES[:, np.newaxis], sigma, 50, "Put", True, dividends = dividends)
+    prices = price_chain(100, STRIKES, EXPIRIES, 0.03, sigma, 50, dividends = dividends, workers = 2)
+    assert np.allclose(prices, expected, rtol = 0, atol = 1e-12)
+    pool = chain._pools[2]
+    price_chain(100, STRIKES, EXPIRIES, 0.03, 0.25, 50, workers = 2)
+    assert chain._pools[2] is pool
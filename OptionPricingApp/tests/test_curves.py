@@ -0,0 +1,60 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import math
+import numpy as np
+
+# Import functions from the models I created
+from models.curves import DiscountCurve, DividendSchedule, discount_curve
+from models.black_scholes import call_price, put_price, greeks, batch_price
+from models.binomial import binomial_price, binomial_american, binomial_greeks
+
+# A flat curve must give exactly the same prices as the plain flat rate (in both models)
+def test_flat_curve_matches_flat_rate():
+    flat = DiscountCurve.flat(0.05)
+    assert abs(call_price(100, 100, flat, 1, 0.2) - call_price(100, 100, 0.05, 1, 0.2)) < 1e-12
+    assert abs(binomial_price(100, 100, flat, 1, 0.2, 200, "Put", True) - binomial_price(100, 100, 0.05, 1, 0.2, 200, "Put", True)) < 1e-10
+    T = np.array([0.25, 0.5, 1.0, 3.0])
+    assert np.allclose(flat.discount(T), np.exp(-0.05 * T))
+
+# Zero rates are interpolated through the points (flat forwards in between), and the same points give the same cached curve
+def test_curve_interpolation_and_cache():
+    curve = discount_curve([1, 2], [0.03, 0.05])
+    assert curve is discount_curve((1.0, 2.0), (0.03, 0.05))
+    assert abs(curve.zero_rate(1.0) - 0.03) < 1e-12
+    assert abs(curve.zero_rate(0.5) - 0.03) < 1e-12
+    # Halfway between the points, -log(DF) is halfway between 0.03 and 0.10
+    assert abs(curve.discount(1.5) - math.exp(-0.065)) < 1e-12
+    assert abs(curve.zero_rate(4.0) - 0.05) < 1e-12
+    # A whole ladder only works out one discount factor per expiration
+    T = np.repeat([0.5, 1.0, 1.5], 100)
+    curve.discount(T)
+    assert {0.5, 1.0, 1.5} <= set(curve._cache)
+    # Time decay keeps asking for new maturities, but the cache stays bounded
+    from models.curves import MAX_CACHED_DISCOUNTS
+    fresh = DiscountCurve([1, 2], [0.03, 0.05])
+    for day in range(MAX_CACHED_DISCOUNTS + 500):
+        fresh.discount(2.0 - day / 365 / 24)
+    assert len(fresh._cache) <= MAX_CACHED_DISCOUNTS
+
+# Discrete dividends: European prices agree between Black-Scholes and the tree, and put-call parity holds with the dividends' PV
+def test_discrete_dividends():
+    dividends = DividendSchedule([0.25, 0.75], [1.0, 1.0])
+    curve = discount_curve([0.5, 1, 2], [0.03, 0.04, 0.045])
+    for r in [0.05, curve]:
+        call = call_price(100, 100, r, 1, 0.2, 0.01, dividends)
+        put = put_price(100, 100, r, 1, 0.2, 0.01, dividends)
+        pv = dividends.present_value(1.0, r)
+        df = curve.discount(1.0) if r is curve else math.exp(-0.05)
+        assert abs((call - put) - ((100 - pv) * math.exp(-0.01) - 100 * df)) < 1e-10
+        assert abs(binomial_price(100, 100, r, 1, 0.2, 2000, "Call", False, 0.01, dividends = dividends) - call) < 2e-3
+        # The batched Black-Scholes prices (and rho, which includes the dividends' PV moving with the rate) match too
+        batch = batch_price(100, 100, r, np.array([1.0, 1.0]), 0.2, np.array(["Call", "Put"]), 0.01, dividends)
+        assert np.allclose(batch["price"], [call, put])
+        tree = binomial_greeks(100, 100, r, 1, 0.2, 1000, "Call", False, 0.01, dividends = dividends)
+        assert abs(tree["rho"] - greeks(100, 100, r, 1, 0.2, 0.01, dividends)["rho"]) < 0.05
+    # A dividend makes early exercise of an American call worthwhile (just before the stock drops)
+    big = DividendSchedule([0.5], [5.0])
+    american = binomial_american(100, 100, 0.05, 1, 0.2, 500, "Call", dividends = big)["price"]
+    assert american > call_price(100, 100, 0.05, 1, 0.2, dividends = big) + 0.1
+    assert abs(binomial_price(100, 100, 0.05, 1, 0.2, 500, "Call", True, dividends = big) - american) < 1e-10
@@ -0,0 +1,50 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import math
+import numpy as np
+from scipy.stats import norm
+
+# Import functions from the models I created
+from models.exotics import exotic_price, Vanilla, Digital, Barrier
+from models.binomial import binomial_price_batch
+
+S, r, T, sigma = 100.0, 0.05, 1.0, 0.2
+
+# A vanilla payoff through the exotic framework gives exactly the vanilla tree price, on every lattice
+def test_vanilla_matches_binomial():
+    for lattice in ["crr", "tian", "lr", "trinomial"]:
+        for american in [False, True]:
+            exotic = exotic_price(S, r, T, sigma, 200, Vanilla(100, "Put"), "american" if american else "european", lattice = lattice)
+            vanilla = float(binomial_price_batch(S, 100, r, T, sigma, 200, "Put", american, lattice = lattice))
+            assert abs(exotic - vanilla) < 1e-10
+
+# Knock-in + knock-out = vanilla (European, no rebate), and a knock-out is worth less than the vanilla
+def test_barrier_in_out_parity():
+    vanilla = exotic_price(S, r, T, sigma, 500, Vanilla(100))
+    for level, kind in [(90, "down"), (120, "up")]:
+        knock_out = exotic_price(S, r, T, sigma, 500, Vanilla(100), barrier = Barrier(level, f"{kind}-and-out"))
+        knock_in = exotic_price(S, r, T, sigma, 500, Vanilla(100), barrier = Barrier(level, f"{kind}-and-in"))
+        assert abs(knock_in + knock_out - vanilla) < 1e-10
+        assert 0 < knock_out < vanilla
+    # Already past the barrier: knocked out is just the rebate, knocked in is the vanilla
+    assert exotic_price(85, r, T, sigma, 200, Vanilla(100), barrier = Barrier(90, "down-and-out", rebate = 2.0)) == 2.0
+    assert abs(exotic_price(85, r, T, sigma, 200, Vanilla(100), barrier = Barrier(90, "down-and-in")) - exotic_price(85, r, T, sigma, 200, Vanilla(100))) < 1e-12
+
+# Bermudan exercise is worth between the European and the American, and more dates are worth more
+def test_bermudan_between_european_and_american():
+    payoff = Vanilla(100, "Put")
+    european = exotic_price(S, r, T, sigma, 400, payoff)
+    american = exotic_price(S, r, T, sigma, 400, payoff, "american")
+    quarterly = exotic_price(S, r, T, sigma, 400, payoff, [0.25, 0.5, 0.75])
+    monthly = exotic_price(S, r, T, sigma, 400, payoff, np.arange(1, 12) / 12)
+    assert european < quarterly < monthly < american
+
+# Digitals converge to the closed form, custom payoffs and arrays of inputs work
+def test_digital_and_custom_payoffs():
+    d2 = (math.log(S / 100) + (r - 0.5 * sigma ** 2) * T) / (sigma * math.sqrt(T))
+    assert abs(exotic_price(S, r, T, sigma, 500, Digital(100), lattice = "lr") - math.exp(-r * T) * norm.cdf(d2)) < 1e-3
+    spots = np.array([90.0, 100.0, 110.0])
+    squared = exotic_price(spots, r, T, sigma, 200, lambda x: np.maximum(x - 100, 0) ** 2)
+    assert squared.shape == (3,) and np.all(np.diff(squared) > 0)
+    assert np.allclose(exotic_price(spots, r, T, sigma, 200, Vanilla(100)), binomial_price_batch(spots, 100, r, T, sigma, 200))
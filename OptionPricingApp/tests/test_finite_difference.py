@@ -0,0 +1,41 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import numpy as np
+
+# Import functions from the models I created
+from models.finite_difference import fd_greeks, fd_solve
+from models.binomial import binomial_price
+from models.black_scholes import batch_price
+
+# Test the European solution against the Black-Scholes formula (price AND Greeks, across a whole range of spots)
+def test_european_curve_matches_black_scholes():
+    S = np.linspace(60, 140, 41)
+    fd = fd_greeks(S, 100, 0.05, 1, 0.2, "Call", american = False)
+    bs = batch_price(S, 100, 0.05, 1, 0.2, "Call")
+    for name, tolerance in [("price", 5e-3), ("delta", 1e-3), ("gamma", 1e-4), ("vega", 0.05), ("theta", 0.02), ("rho", 0.02)]:
+        assert np.abs(fd[name] - bs[name]).max() < tolerance
+
+# Test the American put against a fine Binomial tree (both early exercise methods)
+def test_american_put_matches_binomial():
+    tree = binomial_price(100, 100, 0.05, 1, 0.2, 2000, "Put", True)
+    for method in ["penalty", "psor"]:
+        fd = fd_greeks(100, 100, 0.05, 1, 0.2, "Put", american = True, method = method)
+        assert isinstance(fd["price"], float)
+        assert abs(fd["price"] - tree) < 2e-3
+    # Deep in the money the put is exercised right away, so it is worth exactly its payoff
+    deep = fd_greeks(60, 100, 0.05, 1, 0.2, "Put", american = True)
+    assert abs(deep["price"] - 40) < 1e-6
+    assert abs(deep["delta"] + 1) < 1e-6
+
+def test_american_call_with_dividends_matches_binomial():
+    tree = binomial_price(100, 100, 0.03, 1, 0.25, 2000, "Call", True, div_yield = 0.06)
+    fd = fd_greeks(100, 100, 0.03, 1, 0.25, "Call", american = True, div_yield = 0.06)
+    assert abs(fd["price"] - tree) < 5e-3
+
+def test_solve_returns_one_curve_per_problem():
+    solution = fd_solve(100, [0.01, 0.05], 1, 0.2, "Put", space_steps = 200, time_steps = 50)
+    assert solution["values"].shape == (2, 201)
+    # A higher rate makes the put cheaper everywhere
+    assert np.all(solution["values"][1] <= solution["values"][0] + 1e-12)
+    assert np.all(solution["values"] >= np.maximum(100 - solution["S"], 0) - 1e-12)
@@ -0,0 +1,40 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+
+from models.black_scholes import batch_price
+from models.binomial import binomial_price_batch
+from models.grid import PriceGrid
+
+# Test that grid lookups are close to the exact Black-Scholes prices and Greeks
+def test_black_scholes_grid_lookup():
+    grid = PriceGrid.build("Call", x_axis = np.linspace(-0.5, 0.5, 101), v_axis = np.linspace(0.1, 0.8, 71), w_axis = np.linspace(0, 0.1, 5))
+    K = np.linspace(80, 120, 9)
+    exact = batch_price(100, K, 0.03, 1, 0.3, "Call")
+    for method in ["linear", "cubic"]:
+        lookup = grid.lookup(100, K, 0.03, 1, 0.3, method = method)
+        assert np.allclose(lookup["price"], exact["price"], atol = 0.02)
+        assert np.allclose(lookup["delta"], exact["delta"], atol = 0.01)
+        assert np.allclose(lookup["theta"], exact["theta"], atol = 0.05)
+    # Outside of the grid there is no answer
+    assert np.isnan(grid.lookup(100, 10, 0.03, 1, 0.3)["price"])
+
+def test_error_bound_and_memory_mapped_round_trip(tmp_path):
+    grid = PriceGrid.build("Put", x_axis = np.linspace(-0.5, 0.5, 41), v_axis = np.linspace(0.1, 0.8, 29), w_axis = np.linspace(0, 0.1, 5))
+    K = np.linspace(70, 140, 50)
+    lookup = grid.lookup(100, K, 0.05, 0.5, 0.4, return_error = True)
+    exact = batch_price(100, K, 0.05, 0.5, 0.4, "Put")["price"]
+    assert np.all(np.abs(lookup["price"] - exact) <= lookup["price_error"] + 1e-9)
+
+    path = str(tmp_path / "grid.npy")
+    grid.save(path)
+    loaded = PriceGrid.load(path)
+    assert isinstance(loaded.values, np.memmap)
+    assert np.allclose(loaded.lookup(100, K, 0.05, 0.5, 0.4)["price"], lookup["price"])
+
+def test_american_grid_matches_trees():
+    grid = PriceGrid.build("Put", "binomial", x_axis = np.linspace(-0.4, 0.4, 33), v_axis = np.linspace(0.1, 0.6, 11),
+                           w_axis = np.linspace(0, 0.1, 3), steps = 100)
+    K = np.array([90.0, 100.0, 110.0])
+    trees = binomial_price_batch(100, K, 0.05, 1, 0.3, 100, "Put", True)
+    assert np.allclose(grid.lookup(100, K, 0.05, 1, 0.3)["price"], trees, atol = 0.05)
@@ -0,0 +1,49 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+import pandas as pd
+
+from models.black_scholes import call_price
+from models.hedging import simulate_paths, load_paths, hedge_backtest
+
+# Hedging with the right volatility: the P&L averages out to about 0, and rebalancing 4x as often halves its spread
+def test_hedge_error_shrinks_with_rebalancing():
+    paths = simulate_paths(100, 0.02, 1, 0.2, 4000, 200, seed = 7, mu = 0.08)
+    daily = hedge_backtest(paths, 100, 0.02, 1, 0.2)
+    weekly = hedge_backtest(paths[:, ::4], 100, 0.02, 1, 0.2)
+    assert abs(daily["premium"] - call_price(100, 100, 0.02, 1, 0.2)) < 1e-10
+    assert abs(daily["mean"]) < 0.05
+    assert 1.6 < weekly["std"] / daily["std"] < 2.4
+    # Same thing when the 4x less frequent hedge runs on the daily paths
+    assert abs(hedge_backtest(paths, 100, 0.02, 1, 0.2, rebalance_every = 4)["std"] - weekly["std"]) < 0.1 * weekly["std"]
+
+# Selling options at too low a volatility loses money on average, and transaction costs only ever cost money
+def test_wrong_volatility_and_costs():
+    paths = simulate_paths(100, 0.01, 0.5, 0.3, 2000, 100, seed = 3)
+    cheap = hedge_backtest(paths, 100, 0.01, 0.5, 0.2)
+    assert cheap["mean"] < -1.0
+    costly = hedge_backtest(paths, 100, 0.01, 0.5, 0.2, transaction_cost = 0.001)
+    assert np.all(costly["pnl"] < cheap["pnl"])
+    assert costly["turnover"] > 0
+
+# Binomial deltas (interpolated from the per-date grid of trees) hedge about as well as Black-Scholes for European options,
+# and American puts get exercised on some paths
+def test_binomial_hedge():
+    paths = simulate_paths(100, 0.05, 0.5, 0.25, 300, 40, seed = 11)
+    bs = hedge_backtest(paths, 100, 0.05, 0.5, 0.25, "Put")
+    tree = hedge_backtest(paths, 100, 0.05, 0.5, 0.25, "Put", model = "binomial", steps = 100)
+    assert abs(tree["premium"] - bs["premium"]) < 0.02
+    assert np.abs(tree["pnl"] - bs["pnl"]).mean() < 0.05
+    american = hedge_backtest(paths, 90, 0.05, 0.5, 0.25, "Put", model = "binomial", steps = 100, american = True)
+    assert 0 < american["exercised"] < 1
+    assert abs(american["mean"]) < 0.1
+
+# Historical windows from a CSV price series, rescaled to start at S
+def test_load_paths(tmp_path):
+    prices = 50 * np.exp(np.cumsum(np.full(30, 0.01)))
+    path = tmp_path / "prices.csv"
+    pd.DataFrame({"date": range(30), "Close": prices}).to_csv(path, index = False)
+    paths = load_paths(str(path), 10, S = 100)
+    assert paths.shape == (20, 11)
+    assert np.allclose(paths[:, 0], 100) and np.allclose(paths[:, -1], 100 * np.exp(0.1))
+    assert load_paths(str(path), 10, stride = 5).shape == (4, 11)
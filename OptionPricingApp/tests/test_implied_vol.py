@@ -0,0 +1,42 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+
+from models.black_scholes import call_price, batch_price
+from models.binomial import binomial_price_batch
+from models.implied_vol import implied_vol, implied_vol_american
+
+# Test that pricing with a volatility and then solving for it gives the same volatility back
+def test_implied_vol_round_trip():
+    K = np.linspace(70, 130, 25)
+    sigma = np.linspace(0.1, 0.8, 25)
+    types = np.where(K < 100, "Put", "Call")
+    prices = batch_price(100, K, 0.02, 0.75, sigma, types)["price"]
+    result = implied_vol(prices, 100, K, 0.02, 0.75, types)
+    assert result["converged"].all()
+    assert np.allclose(result["sigma"], sigma, atol = 1e-6)
+    assert (result["iterations"] >= 1).all()
+
+def test_implied_vol_scalar_and_arbitrage_violations():
+    price = call_price(100, 100, 0.05, 1, 0.3)
+    assert abs(implied_vol(price, 100, 100, 0.05, 1)["sigma"] - 0.3) < 1e-6
+    # A call can't be worth more than the stock or less than its discounted intrinsic value
+    result = implied_vol(np.array([150, 0.0]), 100, [100, 50], 0.05, 1)
+    assert np.isnan(result["sigma"]).all()
+    assert not result["converged"].any()
+
+def test_american_implied_vol_round_trip():
+    K = np.array([90, 100, 110])
+    sigma = np.array([0.3, 0.25, 0.2])
+    prices = binomial_price_batch(100, K, 0.05, 1, sigma, 100, "Put", True)
+    result = implied_vol_american(prices, 100, K, 0.05, 1, steps = 100)
+    assert result["converged"].all()
+    assert np.allclose(result["sigma"], sigma, atol = 1e-4)
+
+# A quote whose vol is above the search range is reported as not converged (its bracket collapses at SIGMA_HIGH
+# without the price ever matching)
+def test_vol_above_the_bracket_is_not_converged():
+    prices = batch_price(100, 100, 0.02, 1.0, np.array([0.3, 6.0]))["price"]
+    result = implied_vol(prices, 100, 100, 0.02, 1.0)
+    assert list(result["converged"]) == [True, False]
+    assert abs(result["sigma"][0] - 0.3) < 1e-8 and result["sigma"][1] > 4.99
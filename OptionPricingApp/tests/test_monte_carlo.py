@@ -0,0 +1,44 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+from models.black_scholes import call_price, put_price
+from models.monte_carlo import monte_carlo_price
+from models.profiling import Profiler
+
+# Test that the European Monte Carlo price lands within a few standard errors of Black-Scholes
+def test_european_matches_black_scholes():
+    for type, bs in [("Call", call_price(100, 100, 0.05, 1, 0.2)), ("Put", put_price(100, 100, 0.05, 1, 0.2))]:
+        mc = monte_carlo_price(100, 100, 0.05, 1, 0.2, type, n_paths = 200_000, seed = 1)
+        assert abs(mc["price"] - bs) < 4 * mc["std_error"]
+        assert mc["paths_per_sec"] > 0
+
+def test_variance_reduction_shrinks_standard_error():
+    plain = monte_carlo_price(100, 100, 0.05, 1, 0.2, payoff = "asian", n_steps = 50, n_paths = 20_000, seed = 2)
+    reduced = monte_carlo_price(100, 100, 0.05, 1, 0.2, payoff = "asian", n_steps = 50, n_paths = 20_000, seed = 2,
+                                antithetic = True, control_variate = True)
+    assert reduced["std_error"] < plain["std_error"] / 2
+    # Averaging lowers the volatility, so an Asian call is cheaper than a European call
+    assert reduced["price"] < call_price(100, 100, 0.05, 1, 0.2)
+
+def test_results_do_not_depend_on_the_number_of_workers():
+    kwargs = dict(payoff = "barrier", barrier = 130, barrier_type = "up-and-out", n_steps = 20,
+                  n_paths = 8_000, chunk_size = 2_000, seed = 3)
+    serial = monte_carlo_price(100, 100, 0.05, 1, 0.2, **kwargs)
+    parallel = monte_carlo_price(100, 100, 0.05, 1, 0.2, workers = 2, **kwargs)
+    assert serial["price"] == parallel["price"]
+
+def test_knock_in_plus_knock_out_is_vanilla():
+    kwargs = dict(payoff = "barrier", barrier = 90, n_steps = 20, n_paths = 20_000, seed = 4)
+    knock_in = monte_carlo_price(100, 100, 0.05, 1, 0.2, "Put", barrier_type = "down-and-in", **kwargs)
+    knock_out = monte_carlo_price(100, 100, 0.05, 1, 0.2, "Put", barrier_type = "down-and-out", **kwargs)
+    vanilla = monte_carlo_price(100, 100, 0.05, 1, 0.2, "Put", n_paths = 20_000, seed = 4)
+    assert abs(knock_in["price"] + knock_out["price"] - vanilla["price"]) < 4 * vanilla["std_error"]
+
+# Test that antithetic sampling simulates exactly n_paths, even with odd chunk sizes and an odd number of paths
+def test_antithetic_path_count():
+    for n_paths, chunk_size in [(1_000, 333), (1_001, 250), (7, 3)]:
+        with Profiler() as profiler:
+            mc = monte_carlo_price(100, 100, 0.05, 1, 0.2, n_paths = n_paths, chunk_size = chunk_size, seed = 5,
+                                   antithetic = True)
+        assert profiler.snapshot()["counters"]["mc_paths"] == n_paths
+        assert mc["n_paths"] == n_paths and mc["std_error"] > 0
@@ -0,0 +1,66 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+import pandas as pd
+
+from models.black_scholes import batch_price
+from models.binomial import binomial_greeks
+from models.portfolio import aggregate_risk, aggregate_chunks
+
+POSITIONS = pd.DataFrame({
+    "underlying": ["AAPL", "AAPL", "MSFT", "MSFT", "AAPL"],
+    "S": [100, 100, 200, 200, 100],
+    "K": [95, 105, 200, 190, 100],
+    "r": [0.05] * 5,
+    "T": [0.5, 1.0, 0.25, 1.0, 0.75],
+    "sigma": [0.2, 0.25, 0.3, 0.3, 0.2],
+    "type": ["Call", "Put", "Call", "Put", "Put"],
+    "quantity": [10, -5, 3, 2, 7],
+    "model": ["black_scholes", "black_scholes", "binomial", "binomial", "binomial"],
+    "american": [False, False, True, True, False],
+})
+
+# Test that the streamed totals match pricing every position by hand
+def test_totals_match_position_by_position_pricing(tmp_path):
+    path = tmp_path / "positions.csv"
+    POSITIONS.to_csv(path, index = False)
+    totals = aggregate_risk(str(path), chunk_size = 2, steps = 100)
+
+    expected = {"AAPL": np.zeros(6), "MSFT": np.zeros(6)}
+    names = ["price", "delta", "gamma", "vega", "theta", "rho"]
+    for _, row in POSITIONS.iterrows():
+        if row["model"] == "binomial":
+            out = binomial_greeks(row["S"], row["K"], row["r"], row["T"], row["sigma"], 100, row["type"], row["american"])
+        else:
+            out = batch_price(row["S"], row["K"], row["r"], row["T"], row["sigma"], row["type"])
+        expected[row["underlying"]] += row["quantity"] * np.array([float(out[name]) for name in names])
+
+    for underlying, values in expected.items():
+        got = totals.loc[underlying, ["value", "delta", "gamma", "vega", "theta", "rho"]].to_numpy(dtype = float)
+        assert np.allclose(got, values)
+    assert totals.loc["AAPL", "positions"] == 3
+
+def test_chunk_size_does_not_change_the_answer():
+    one_chunk = aggregate_chunks([POSITIONS], steps = 50)
+    many_chunks = aggregate_chunks([POSITIONS.iloc[i:i + 1] for i in range(len(POSITIONS))], steps = 50)
+    assert np.allclose(one_chunk.to_numpy(dtype = float), many_chunks.to_numpy(dtype = float))
+
+# Empty or string cells in the model, american and steps columns (as they come out of hand-edited CSV files)
+def test_american_and_steps_columns_are_parsed():
+    from models.portfolio import price_chunk
+    messy = POSITIONS.copy()
+    messy["american"] = [None, "False", "true", "TRUE", float("nan")]
+    messy["steps"] = [None, 50, 100, float("nan"), 100]
+    messy["model"] = [None, "black_scholes", " binomial", "binomial", "binomial"]
+    clean = POSITIONS.copy()
+    clean["american"] = [False, False, True, True, False]
+    clean["steps"] = [100, 50, 100, 100, 100]
+    assert np.allclose(price_chunk(messy, steps = 100).to_numpy(), price_chunk(clean).to_numpy())
+    for column, value in [("american", "maybe"), ("steps", 2.5), ("model", "binomail")]:
+        bad = POSITIONS.copy()
+        bad[column] = value
+        try:
+            price_chunk(bad)
+            assert False, f"a {column} of {value!r} should be rejected"
+        except ValueError:
+            pass
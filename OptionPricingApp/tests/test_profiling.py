@@ -0,0 +1,60 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import threading
+
+# Import functions from the models I created
+from models.profiling import Profiler, active_profiler, section, count
+from models.binomial import binomial_price, binomial_price_batch
+from models.black_scholes import batch_price
+
+def test_nothing_is_recorded_when_profiling_is_off():
+    profiler = Profiler()
+    binomial_price(100, 100, 0.05, 1, 0.2, 50, "Put", True)
+    assert active_profiler() is None
+    assert profiler.snapshot() == {"timings": {}, "counters": {}}
+
+def test_binomial_phases_and_counters():
+    with Profiler() as profiler:
+        assert active_profiler() is profiler
+        binomial_price(100, 100, 0.05, 1, 0.2, 200, "Put", True)
+        binomial_price(100, 100, 0.05, 1, 0.2, 100, "Put", False)
+    assert active_profiler() is None
+    snapshot = profiler.snapshot()
+    timings = snapshot["timings"]
+    assert timings["binomial.binomial_price"]["calls"] == 2
+    assert timings["binomial.binomial_american"]["calls"] == 1
+    for name in ["binomial_american.payoff_setup", "backward_induction.continuation", "backward_induction.exercise_checks",
+                 "binomial_price.payoff_setup", "binomial_price.backward_induction"]:
+        assert timings[name]["calls"] == 1
+    # The phases of the American tree can't take longer than the whole call
+    american = timings["backward_induction.continuation"]["total"] + timings["backward_induction.exercise_checks"]["total"]
+    assert american <= timings["binomial.binomial_american"]["total"]
+    assert snapshot["counters"]["tree_steps"] == 300
+    # Levels 0 to 199 of the American tree have 1 to 200 nodes
+    assert snapshot["counters"]["tree_nodes"] == 200 * 201 // 2
+    assert snapshot["counters"]["array_bytes"] > 0
+
+def test_percentiles_table_and_reset():
+    profiler = Profiler()
+    for seconds in [0.001 * i for i in range(1, 101)]:
+        profiler.record("fake", seconds)
+    profiler.add("widgets", 3)
+    stats = profiler.snapshot()["timings"]["fake"]
+    assert stats["calls"] == 100
+    assert abs(stats["total"] - 5.05) < 1e-9
+    assert abs(stats["p50"] - 0.051) < 1e-12 and abs(stats["p99"] - 0.1) < 1e-12 and stats["max"] == 0.1
+    assert profiler.table()[0]["name"] == "fake"
+    profiler.reset()
+    assert profiler.snapshot() == {"timings": {}, "counters": {}}
+
+def test_profilers_only_see_their_own_thread():
+    with Profiler() as profiler:
+        # Another thread (another Streamlit session) pricing at the same time doesn't end up in this profiler
+        other = threading.Thread(target = batch_price, args = (100, 100, 0.05, 1, 0.2))
+        other.start()
+        other.join()
+        with section("mine"):
+            count("things", 2)
+    assert list(profiler.snapshot()["timings"]) == ["mine"]
+    assert profiler.snapshot()["counters"] == {"things": 2}
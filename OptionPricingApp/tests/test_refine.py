@@ -0,0 +1,37 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+
+from models.black_scholes import batch_price
+from models.refine import progressive_grid, refine_grid, refine_curve
+
+# The refined heatmap is close to pricing every point, while pricing only a small part of them
+def test_refine_grid_matches_full_grid():
+    def price(K, sigma):
+        return batch_price(100, K, 0.01, 1, sigma, "Call")["price"]
+    stages = list(progressive_grid(price, (50, 150), (0.1, 0.3), coarse = 17, levels = 3))
+    assert [stage["values"].shape for stage in stages] == [(17, 17), (33, 33), (65, 65), (129, 129)]
+    final = stages[-1]
+    full = price(final["x"][np.newaxis, :], final["y"][:, np.newaxis])
+    assert np.abs(final["values"] - full).max() < 1e-3 * np.ptp(full) * 2
+    assert final["priced"] < 0.1 * full.size
+    # Every point marked exact really was priced, and refine_grid gives the last stage
+    assert np.allclose(final["values"][final["exact"]], full[final["exact"]])
+    assert np.array_equal(refine_grid(price, (50, 150), (0.1, 0.3))["values"], final["values"])
+
+# A flat surface never gets refined, everything past the coarse grid is interpolated
+def test_flat_grid_is_not_refined():
+    stage = refine_grid(lambda x, y: x + 2 * y, (0, 1), (0, 1), coarse = 5, levels = 2)
+    assert stage["priced"] == 25
+    assert np.allclose(stage["values"], stage["x"][np.newaxis, :] + 2 * stage["y"][:, np.newaxis])
+
+# Curves only get extra points where they bend and stay within tolerance everywhere
+def test_refine_curve():
+    def gamma(S):
+        return batch_price(S, 100, 0.01, 1, 0.2)["gamma"]
+    S, values = refine_curve(gamma, 50, 150, coarse = 25, max_points = 200, tol = 1e-3)
+    # Fewer points than the evenly spaced 200 the page used to plot
+    assert np.all(np.diff(S) > 0) and S.size < 200
+    assert np.allclose(values, gamma(S))
+    fine = np.linspace(50, 150, 2001)
+    assert np.abs(np.interp(fine, S, values) - gamma(fine)).max() < 2e-3 * np.ptp(values)
@@ -0,0 +1,42 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+import numpy as np
+
+from models.black_scholes import call_price, put_price
+from models.binomial import binomial_price
+from models.scenarios import run_scenarios
+
+CONTRACTS = {
+    "S": [100, 100, 50],
+    "K": [100, 110, 45],
+    "r": [0.03, 0.03, 0.03],
+    "T": [1.0, 0.5, 0.25],
+    "sigma": [0.2, 0.3, 0.4],
+    "type": ["Call", "Put", "Put"],
+    "quantity": [10, -5, 4],
+    "american": [False, False, True],
+}
+
+# Test the P&L cube against repricing each contract by hand
+def test_pnl_cube_matches_manual_repricing():
+    result = run_scenarios(CONTRACTS, spot_shocks = [-0.1, 0.1], vol_shocks = [0, 0.05], rate_shocks = [0, 50],
+                           time_shocks = [0, 30], steps = 100)
+    assert result["pnl"].shape == (2, 2, 2, 2, 3)
+    assert result["total"].shape == (2, 2, 2, 2)
+
+    # Spot -10%, +5 vol points, +50bp, 30 days later
+    i = (0, 1, 1, 1)
+    T_call, T_put, T_amer = 1 - 30 / 365, 0.5 - 30 / 365, 0.25 - 30 / 365
+    expected = [
+        10 * (call_price(90, 100, 0.035, T_call, 0.25) - call_price(100, 100, 0.03, 1, 0.2)),
+        -5 * (put_price(90, 110, 0.035, T_put, 0.35) - put_price(100, 110, 0.03, 0.5, 0.3)),
+        4 * (binomial_price(45, 45, 0.035, T_amer, 0.45, 100, "Put", True) - binomial_price(50, 45, 0.03, 0.25, 0.4, 100, "Put", True)),
+    ]
+    assert np.allclose(result["pnl"][i], expected)
+    assert np.isclose(result["total"][i], sum(expected))
+
+def test_zero_shock_has_zero_pnl_and_workers_agree():
+    serial = run_scenarios(CONTRACTS, spot_shocks = [0, 0.05], steps = 50, scenarios_per_task = 1)
+    assert np.allclose(serial["pnl"][0], 0)
+    parallel = run_scenarios(CONTRACTS, spot_shocks = [0, 0.05], steps = 50, workers = 2, scenarios_per_task = 1)
+    assert np.allclose(serial["pnl"], parallel["pnl"])
@@ -0,0 +1,169 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import asyncio
+import json
+
+# Import functions from the models I created
+from models.service import start_server, Batcher, Overloaded, MAX_BODY_BYTES, _response
+from models.black_scholes import call_price, put_price
+from models.binomial import binomial_price
+
+# Send one HTTP request to the service and return (status, decoded JSON)
+async def _request(port, method, path, payload = None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+# Start a service on a free port, run the test coroutine against it and shut everything down
+def _with_service(test, **options):
+    async def run():
+        service, server = await start_server("127.0.0.1", 0, **options)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await test(service, port)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+    return asyncio.run(run())
+
+def test_single_requests_match_the_models():
+    async def test(service, port):
+        status, bs = await _request(port, "POST", "/price/black_scholes", {"S": 100, "K": 105, "r": 0.02, "T": 0.5, "sigma": 0.3, "type": "Put"})
+        assert status == 200
+        assert abs(bs["price"] - put_price(100, 105, 0.02, 0.5, 0.3)) < 1e-10
+        assert set(bs) == {"price", "delta", "gamma", "vega", "theta", "rho"}
+        status, tree = await _request(port, "POST", "/price/binomial", {"S": 100, "K": 105, "r": 0.02, "T": 0.5, "sigma": 0.3, "type": "Put", "steps": 150, "american": True})
+        assert status == 200
+        assert abs(tree["price"] - binomial_price(100, 105, 0.02, 0.5, 0.3, 150, "Put", True)) < 1e-10
+    _with_service(test)
+
+def test_concurrent_requests_are_batched():
+    async def test(service, port):
+        strikes = [80 + i * 0.2 for i in range(200)]
+        responses = await asyncio.gather(*(
+            _request(port, "POST", "/price/black_scholes", {"S": 100, "K": k, "r": 0.01, "T": 1, "sigma": 0.2}) for k in strikes
+        ))
+        for k, (status, result) in zip(strikes, responses):
+            assert status == 200
+            assert abs(result["price"] - call_price(100, k, 0.01, 1, 0.2)) < 1e-10
+        queue = service.stats()["queues"]["/price/black_scholes"]
+        assert queue["contracts"] == 200
+        # Far fewer batches than requests
+        assert queue["batches"] < 50
+        status, stats = await _request(port, "GET", "/stats")
+        assert stats["latency"]["/price/black_scholes"]["count"] == 200
+    _with_service(test, window = 0.01)
+
+def test_contract_lists_and_bad_requests():
+    async def test(service, port):
+        contracts = [{"S": 100, "K": 100, "r": 0.01, "T": 1, "sigma": 0.2, "steps": steps} for steps in (50, 100)]
+        status, result = await _request(port, "POST", "/price/binomial", {"contracts": contracts})
+        assert status == 200 and len(result["results"]) == 2
+        assert abs(result["results"][1]["price"] - binomial_price(100, 100, 0.01, 1, 0.2, 100)) < 1e-10
+        assert (await _request(port, "POST", "/price/black_scholes", {"S": 100}))[0] == 400
+        assert (await _request(port, "POST", "/price/black_scholes", {"S": 100, "K": 100, "r": 0, "T": 1, "sigma": 0.2, "type": "Straddle"}))[0] == 400
+        # steps has to be a whole number (not truncated, and Infinity is a bad request rather than a crash)
+        for steps in (2.7, "200", True):
+            assert (await _request(port, "POST", "/price/binomial", dict(contracts[0], steps = steps)))[0] == 400
+        assert (await _request(port, "POST", "/price/binomial", dict(contracts[0], steps = 50.0)))[0] == 200
+        for body in (b'{"S": 100, "K": 100, "r": 0, "T": 1, "sigma": 0.2, "steps": Infinity}', b'{"S": 1e999999, "K": 100, "r": 0, "T": 1, "sigma": 0.2}'):
+            assert (await service.handle("POST", "/price/binomial", body))[0] == 400
+        assert (await _request(port, "POST", "/price/heston", {}))[0] == 404
+        assert (await _request(port, "GET", "/health"))[1] == {"status": "ok"}
+    _with_service(test)
+
+# Backpressure: once the queue is full, new requests are turned away instead of waiting
+def test_full_queue_rejects_requests():
+    async def test():
+        async def process(requests):
+            return requests
+        batcher = Batcher(process, max_queue = 1)
+        waiting = asyncio.ensure_future(batcher.submit([("contract",)]))
+        await asyncio.sleep(0)
+        try:
+            await batcher.submit([("another",)])
+            assert False, "the second request should have been rejected"
+        except Overloaded:
+            pass
+        # Once the batcher runs, the queued request goes through
+        batcher.start()
+        assert await waiting == [("contract",)]
+        await batcher.stop()
+    asyncio.run(test())
+
+# Backpressure under load: a slow pricer holds the next batch back, so the queue fills up and requests get turned away
+def test_running_batcher_rejects_when_overloaded():
+    async def test():
+        running = []
+        most = []
+        async def process(requests):
+            running.append(1)
+            most.append(len(running))
+            await asyncio.sleep(0.05)
+            running.pop()
+            return requests
+        batcher = Batcher(process, max_queue = 1, window = 0.001, max_inflight = 1)
+        batcher.start()
+        requests = []
+        for i in range(20):
+            requests.append(asyncio.ensure_future(batcher.submit([i])))
+            await asyncio.sleep(0.005)
+        results = await asyncio.gather(*requests, return_exceptions = True)
+        rejected = [result for result in results if isinstance(result, Overloaded)]
+        assert len(rejected) >= 10
+        assert all(result == [i] for i, result in enumerate(results) if not isinstance(result, Overloaded))
+        assert max(most) == 1
+        await batcher.stop()
+    asyncio.run(test())
+
+# A bad contract is turned away on its own, and never fails the valid requests batched with it
+def test_bad_contract_does_not_fail_its_batch():
+    async def test(service, port):
+        good = {"S": 100, "K": 100, "r": 0.01, "T": 1, "sigma": 0.2, "steps": 50}
+        # p > 1: the rate grows the stock faster than the up move
+        bad = {"S": 100, "K": 100, "r": 0.5, "T": 1, "sigma": 0.01, "steps": 10}
+        (good_status, result), (bad_status, error) = await asyncio.gather(
+            _request(port, "POST", "/price/binomial", good), _request(port, "POST", "/price/binomial", bad)
+        )
+        assert good_status == 200 and abs(result["price"] - binomial_price(100, 100, 0.01, 1, 0.2, 50)) < 1e-10
+        assert bad_status == 400 and "probability" in error["error"]
+        assert (await _request(port, "POST", "/price/black_scholes", {"S": 100, "K": 100, "r": 0, "T": 1, "sigma": float("nan")}))[0] == 400
+        # Failed requests show up in the latency histogram and the error counts
+        stats = service.stats()
+        assert stats["latency"]["/price/binomial"]["count"] == 2
+        assert stats["errors"]["/price/binomial"] == {"400": 1}
+    _with_service(test, window = 0.01)
+
+# If a batch fails anyway, its requests are priced one by one and only the failing one gets the error
+def test_failed_batch_is_split_up():
+    async def test():
+        async def process(requests):
+            if any(contracts == ["bad"] for contracts in requests):
+                raise ValueError("bad contract")
+            return requests
+        batcher = Batcher(process, window = 0.01)
+        batcher.start()
+        results = await asyncio.gather(batcher.submit(["good"]), batcher.submit(["bad"]), return_exceptions = True)
+        assert results[0] == ["good"] and isinstance(results[1], ValueError)
+        assert batcher.batches == 1
+        await batcher.stop()
+    asyncio.run(test())
+
+# Oversized bodies are refused without being read, and non-finite results are sent as null
+def test_body_limit_and_non_finite_results():
+    async def test(service, port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /price/black_scholes HTTP/1.1\r\nContent-Length: {MAX_BODY_BYTES + 1}\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        assert response.startswith(b"HTTP/1.1 413")
+    _with_service(test)
+    assert json.loads(_response(200, {"price": float("nan"), "results": [float("inf"), 1.0]}).partition(b"\r\n\r\n")[2]) == {"price": None, "results": [None, 1.0]}
@@ -0,0 +1,124 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models.store import ResultStore
+from models.cache import PricingCache, cached
+from models.binomial import binomial_american
+from models.black_scholes import call_price
+from models.surface import VolSurface
+
+# Results come back the same as they went in (arrays memory-mapped and read-only)
+def test_round_trip(tmp_path):
+    store = ResultStore(tmp_path)
+    result = binomial_american(100, 100, 0.05, 1, 0.2, 200, "Put")
+    result["png"] = b"\x89PNG fake"
+    result["empty"] = np.zeros(0)
+    key = store.key("binomial_american", (100, 100, 0.05, 1, 0.2, 200, "Put"))
+    assert store.get(key) is None
+    assert store.put(key, result)
+    loaded = store.get(key)
+    assert loaded["price"] == result["price"]
+    assert np.array_equal(loaded["boundary_prices"], result["boundary_prices"], equal_nan = True)
+    assert isinstance(loaded["boundary_prices"], np.memmap) and not loaded["boundary_prices"].flags.writeable
+    assert loaded["png"] == result["png"] and loaded["empty"].shape == (0,)
+    # Plain numbers work too, things that aren't numbers/arrays just aren't stored
+    assert store.put(store.key("number", ()), 1.5) and store.get(store.key("number", ())) == 1.5
+    assert not store.put(store.key("object", ()), object())
+    # A different code version is a different entry
+    assert store.key("binomial_american", (1,), "v1") != store.key("binomial_american", (1,), "v2")
+
+# A "restarted" process (a new in-memory cache on the same store) loads the results instead of recomputing them
+def test_pricing_cache_uses_store(tmp_path):
+    calls = []
+    def slow_square(x):
+        calls.append(x)
+        return np.arange(x) ** 2
+    first = PricingCache(store = ResultStore(tmp_path))
+    cached(slow_square, name = "square", cache = first)(5)
+    second = PricingCache(store = ResultStore(tmp_path))
+    out = cached(slow_square, name = "square", cache = second)(5)
+    assert calls == [5]
+    assert np.array_equal(out, np.arange(5) ** 2)
+    assert second.stats()["disk_hits"] == 1
+
+# Results that wouldn't come back from disk exactly as they are (tuples, non-string keys, ragged sequences) stay in
+# memory only, and a cache miss returns the same thing either way
+def test_only_exact_round_trips_are_stored(tmp_path):
+    store = ResultStore(tmp_path)
+    for result in [(1.0, 2.0), [np.arange(3)], {1: 2.0}, (np.arange(3), np.arange(5))]:
+        assert not store.put(store.key("result", (repr(result),)), result)
+        cache = PricingCache(store = store)
+        out = cached(lambda: result, name = "result", cache = cache)()
+        assert out is result
+        assert PricingCache(store = store).get_or_compute("result", lambda: result) is result
+    assert store.stats()["entries"] == 0
+
+# Surfaces are keyed on their fitted smiles (not their repr, which leaves them out), and arguments without a canonical
+# form aren't stored at all
+def test_keys_follow_surface_state(tmp_path):
+    strikes = np.linspace(70, 130, 9)
+    low, high = VolSurface(100, 0.05), VolSurface(100, 0.05)
+    low.update({1.0: (strikes, np.full(9, 0.2))})
+    high.update({1.0: (strikes, np.full(9, 0.4))})
+    assert repr(low) == repr(high)
+    first = cached(call_price, name = "call", cache = PricingCache(store = ResultStore(tmp_path)))(100, 100, 0.05, 1, low)
+    second = cached(call_price, name = "call", cache = PricingCache(store = ResultStore(tmp_path)))(100, 100, 0.05, 1, high)
+    assert first == call_price(100, 100, 0.05, 1, low) and second == call_price(100, 100, 0.05, 1, high)
+    assert second > first + 5
+    store = ResultStore(tmp_path)
+    try:
+        store.key("object", (object(),))
+        assert False, "objects without a canonical form can't be hashed"
+    except TypeError:
+        pass
+    assert store.get_or_compute("object", lambda x: 1.5, object()) == 1.5
+    assert store.stats()["entries"] == 2
+
+# The default store is only created on first use, not when models.cache is imported
+def test_default_store_is_created_lazily(tmp_path):
+    created = []
+    def make_store():
+        created.append(True)
+        return ResultStore(tmp_path / "store")
+    cache = PricingCache(store = make_store)
+    assert not created and cache.stats()["disk_hits"] == 0 and not (tmp_path / "store").exists()
+    cache.get_or_compute("number", lambda: 2.5)
+    assert created == [True] and (tmp_path / "store").exists()
+    cache.get_or_compute("another", lambda: 3.5)
+    assert created == [True]
+
+# Beyond max_bytes the least recently used entries go first
+def test_size_based_eviction(tmp_path):
+    store = ResultStore(tmp_path)
+    keys = [store.key("block", (i,)) for i in range(3)]
+    for i, key in enumerate(keys):
+        store.put(key, np.full(1000, float(i)))
+        os.utime(store._path(key), (1000 + i, 1000 + i))
+    # Room for 3 entries and a half (each is 8000 bytes of data plus the .npy header and meta.json)
+    store.max_bytes = int(store.stats()["bytes"] / 3 * 3.5)
+    # Reading entry 0 makes it the most recently used, so adding a 4th entry evicts entry 1
+    assert store.get(keys[0]) is not None
+    store.put(store.key("block", (3,)), np.full(1000, 3.0))
+    assert store.get(keys[1]) is None
+    assert store.get(keys[0]) is not None and store.get(keys[2]) is not None
+    assert store.stats()["bytes"] <= store.max_bytes
+
+def _write(args):
+    root, i = args
+    store = ResultStore(root)
+    # Every process writes the same shared entry and one of its own
+    store.put(store.key("shared", ()), np.arange(10_000, dtype = float))
+    store.put(store.key("own", (i,)), np.full(100, float(i)))
+    return float(store.get(store.key("shared", ())).sum())
+
+# Several processes writing at once: every entry ends up complete, with one copy of the shared one
+def test_concurrent_writers(tmp_path):
+    with ProcessPoolExecutor(max_workers = 4) as pool:
+        sums = list(pool.map(_write, [(str(tmp_path), i) for i in range(8)]))
+    assert sums == [float(np.arange(10_000).sum())] * 8
+    store = ResultStore(tmp_path)
+    assert store.stats()["entries"] == 9
+    assert os.listdir(os.path.join(tmp_path, "tmp")) == []
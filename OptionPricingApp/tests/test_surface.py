@@ -0,0 +1,85 @@
+import sys, os
+sys.path.append(os.path.abspath(".."))
+
+import numpy as np
+
+# Import functions from the models I created
+from models.surface import VolSurface, svi_total_variance
+from models.black_scholes import call_price, put_price, batch_price
+from models.binomial import binomial_price
+
+EXPIRIES = [0.25, 0.5, 1.0]
+STRIKES = np.linspace(70, 130, 13)
+
+# Quotes generated from known SVI smiles (same shape, level growing with T, so there is no arbitrage in them)
+def svi_quotes(S = 100.0, r = 0.02, level = 0.04):
+    quotes = {}
+    for T in EXPIRIES:
+        k = np.log(STRIKES / (S * np.exp(r * T)))
+        w = svi_total_variance((level * T, 0.1 * T, -0.4, 0.05, 0.2), k)
+        quotes[T] = (STRIKES, np.sqrt(w / T))
+    return quotes
+
+# The fit recovers the quoted vols, and the surface is arbitrage free
+def test_fit_recovers_svi_quotes():
+    surface = VolSurface(100, 0.02)
+    quotes = svi_quotes()
+    surface.update(quotes)
+    assert surface.expiries == EXPIRIES
+    for T, (strikes, vols) in quotes.items():
+        assert surface.slices[T].rmse < 1e-3
+        assert np.allclose(surface.vol(strikes, np.full(strikes.shape, T)), vols, atol = 2e-3)
+    assert surface.arbitrage_report()["arbitrage_free"]
+    # Between expiries the total variance is interpolated linearly (at the same moneyness)
+    forward = lambda T: 100 * np.exp(0.02 * T)
+    at_the_money = [surface.total_variance(forward(T), T) for T in [0.5, 0.75, 1.0]]
+    assert abs(at_the_money[1] - (at_the_money[0] + at_the_money[2]) / 2) < 1e-12
+
+# Changing one expiry's quotes only refits that expiry
+def test_incremental_update():
+    surface = VolSurface(100, 0.02)
+    surface.update(svi_quotes())
+    before = dict(surface.slices)
+    strikes, vols = svi_quotes(level = 0.05)[0.5]
+    assert surface.update({0.5: (strikes, vols)}) == [0.5]
+    assert surface.slices[0.25] is before[0.25] and surface.slices[1.0] is before[1.0]
+    assert surface.slices[0.5] is not before[0.5]
+    # Lookups see the new slice (the caches were cleared)
+    assert surface.vol(100.0, 0.5) > before[0.5].vol(np.log(100 / (100 * np.exp(0.01)))) + 0.001
+
+# Every model takes the surface wherever it takes sigma
+def test_models_accept_surface():
+    surface = VolSurface(100, 0.02)
+    surface.update(svi_quotes())
+    sigma = surface.vol(90.0, 0.5)
+    assert abs(call_price(100, 90, 0.02, 0.5, surface) - call_price(100, 90, 0.02, 0.5, sigma)) < 1e-12
+    assert abs(put_price(100, 90, 0.02, 0.5, surface) - put_price(100, 90, 0.02, 0.5, sigma)) < 1e-12
+    assert abs(binomial_price(100, 90, 0.02, 0.5, surface, 200, "Put", True) - binomial_price(100, 90, 0.02, 0.5, sigma, 200, "Put", True)) < 1e-12
+    K = np.array([80.0, 100.0, 120.0])
+    T = np.array([0.25, 0.75, 1.0])
+    batch = batch_price(100, K, 0.02, T, surface)
+    assert np.allclose(batch["price"], [call_price(100, k, 0.02, t, surface.vol(k, t)) for k, t in zip(K, T)])
+
+# Quotes with calendar arbitrage (the longer expiry has LESS total variance) get smoothed: the longer slice is lifted to
+# stay above the shorter one, at the cost of fitting its own quotes
+def test_calendar_arbitrage_is_smoothed():
+    surface = VolSurface(100, 0.0)
+    strikes = np.linspace(70, 130, 13)
+    surface.update({0.5: (strikes, np.full(13, 0.30)), 1.0: (strikes, np.full(13, 0.15))})
+    report = surface.arbitrage_report()
+    assert report["arbitrage_free"]
+    assert report["calendar"][(0.5, 1.0)] >= -1e-6
+    assert surface.slices[1.0].rmse > 0.03
+
+# A bad expiry rejects the whole update, without storing the good expiries that came with it
+def test_bad_quotes_leave_the_surface_unchanged():
+    surface = VolSurface(100, 0.02)
+    surface.update(svi_quotes())
+    before = dict(surface.quotes)
+    strikes, vols = svi_quotes(level = 0.05)[0.5]
+    try:
+        surface.update({0.5: (strikes, vols), 0.75: (strikes[:3], vols[:3])})
+        assert False, "the update should have been rejected"
+    except ValueError:
+        pass
+    assert surface.quotes == before and sorted(surface.slices) == EXPIRIES